@@ -1,14 +1,16 @@
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
-from folium.plugins import HeatMap
+import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-import time
 import json
 import os
 
+from src.analysis import geo, projection, risk_surface, spread_velocity
+from src.processing import point_store
+from src.visualization import layers, playback
+
 # 1. Page Configuration
 st.set_page_config(page_title="PineGuard Strategic Analysis", layout="wide")
 
@@ -36,6 +38,7 @@ module = st.sidebar.radio("Select System Mode", ["Historical Observation", "Stra
 if 'obs_year' not in st.session_state: st.session_state.obs_year = 1984
 if 'proj_year' not in st.session_state: st.session_state.proj_year = 2026
 if 'playing' not in st.session_state: st.session_state.playing = False
+growth_model = "linear"
 
 # Color configurations
 if module == "Historical Observation":
@@ -49,6 +52,8 @@ else:
     st.sidebar.subheader("Projection Settings")
     year = st.sidebar.slider("Projection Year", 2026, 2045, value=st.session_state.proj_year)
     st.session_state.proj_year = year
+    growth_model = st.sidebar.selectbox("Growth Model", list(projection.MODELS) + ["auto"],
+                                        format_func=lambda m: "Best fit (AIC)" if m == "auto" else m.capitalize())
     point_color = "#00D4FF"
     heatmap_gradient = {0.1: '#01012b', 0.3: '#0000FF', 0.6: '#00D4FF', 1.0: '#FFFFFF'}
     mode_tag = "STRATEGIC PROJECTION"
@@ -56,10 +61,7 @@ else:
 # Play Logic
 btn_col1, btn_col2 = st.sidebar.columns(2)
 if btn_col1.button("Play"):
-    if module == "Historical Observation": st.session_state.obs_year = 1984
-    else: st.session_state.proj_year = 2026
     st.session_state.playing = True
-    st.rerun()
 
 if btn_col2.button("Pause"):
     st.session_state.playing = False
@@ -67,67 +69,140 @@ if btn_col2.button("Pause"):
 show_heatmap = st.sidebar.checkbox("Enable Heatmap", value=True)
 map_style = st.sidebar.selectbox("Base Layer", ["Satellite (Google)", "Terrain (OSM)"])
 
-# --- NEW: Direct File Loading Functions (No API needed) ---
-def load_local_data(target_year):
-    """Reads processed JSON files directly from the data/processed folder"""
-    file_path = os.path.join("data", "processed", f"stress_{target_year}.json")
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return None
-
-def get_historical_stats():
-    """Generates statistics from local files for model training"""
-    stats = []
-    for y in range(1984, 2026):
-        data = load_local_data(y)
-        if data:
-            stats.append({"year": y, "outbreak_count": data["outbreak_count"]})
-    return pd.DataFrame(stats)
+# --- Cached Data Layer ---
+# Streamlit re-executes this script on every interaction and Play tick. Everything below is
+# memoised on a fingerprint of data/processed, so reruns only pay for rendering.
+HIST_YEARS = range(1984, 2026)
+PROJ_YEARS = range(2026, 2046)
+CENTER = [37.1174, -119.6043]
+
+def data_fingerprint():
+    """Changes whenever the point store or the JSON export in data/processed changes"""
+    manifest = os.path.join(point_store.STORE_DIR, point_store.MANIFEST)
+    mtime = os.stat(manifest).st_mtime_ns if os.path.exists(manifest) else None
+    return json.dumps([mtime, point_store.json_sources()], sort_keys=True)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_store(fingerprint):
+    """Opens the columnar point store once (memory-mapped, rebuilt from JSON if stale)"""
+    return point_store.open_store()
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def get_historical_stats(fingerprint):
+    """Annual outbreak counts from the store manifest for model training"""
+    store = load_store(fingerprint)
+    if store is None:
+        return pd.DataFrame()
+    return pd.DataFrame([{"year": y, "outbreak_count": store.outbreak_count(y)} for y in HIST_YEARS if y in store.years])
+
+@st.cache_resource(show_spinner="Fitting projection...", max_entries=8)
+def load_projection(fingerprint, model):
+    """Trend fit, prediction intervals and projected points, read from the cached artifact in data/processed/projection"""
+    return projection.load_projection(load_store(fingerprint), model=model)
+
+def risk_level(count):
+    if count < 15: return "STABLE", "#28A745"
+    if count < 80: return "WATCH", "#FFC107"
+    return "ALERT", "#DC3545"
+
+def year_view(lats, lons, scores, count, spread):
+    """Column arrays plus derived analytics for one year (no per-point Python objects)"""
+    cols = {"latitude": np.asarray(lats, dtype=np.float64), "longitude": np.asarray(lons, dtype=np.float64),
+            "stress_score": np.asarray(scores, dtype=np.float64)}
+    top = geo.hotspots(cols["latitude"], cols["longitude"], cols["stress_score"], k=1)
+    return {"count": count, "hotspot": top[0] if top else None, "risk": risk_level(count),
+            "velocity": spread["front_velocity_km_yr"], "spread": spread, "columns": cols}
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def historical_analytics(fingerprint):
+    """Per-year derived analytics (hotspot, risk level, velocity) computed once for every year"""
+    store = load_store(fingerprint)
+    if store is None:
+        return {}
+    # Measured spread metrics (KD-tree nearest prior-year distances), cached in data/processed/velocity.json
+    spread = spread_velocity.compute_velocity(store)
+    rows = {}
+    for y in HIST_YEARS:
+        if y not in store.years:
+            continue
+        cols = store.year_columns(y)
+        rows[y] = year_view(cols["latitude"], cols["longitude"], cols["stress_score"], store.outbreak_count(y), spread[y])
+    return rows
+
+@st.cache_resource(show_spinner=False, max_entries=128)
+def projected_year(fingerprint, model, target_year):
+    """Projected anomalies for one future year, read from the projection artifact (seeded per year, so reproducible)"""
+    summary, proj_store = load_projection(fingerprint, model)
+    i = summary["years"].index(target_year)
+    cols = proj_store.year_columns(target_year)
+    lats, lons, scores = cols["latitude"], cols["longitude"], cols["stress_score"]
+    # Same velocity metric as the observations, measured against the previous (projected or observed) year
+    analytics = historical_analytics(fingerprint)
+    if target_year - 1 in analytics:
+        prior = analytics[target_year - 1]
+    elif target_year - 1 >= PROJ_YEARS[0]:
+        prior = projected_year(fingerprint, model, target_year - 1)
+    else:
+        prior = None
+    spread = spread_velocity.year_metrics(
+        lats, lons, scores, prior=tuple(prior["columns"].values()) if prior else None,
+        prior_metrics=prior["spread"] if prior else None)
+    view = year_view(lats, lons, scores, summary["count"][i], spread)
+    view["interval"] = (summary["lower"][i], summary["upper"][i])
+    return view
+
+@st.cache_resource(show_spinner="Computing risk surface...", max_entries=8)
+def load_risk_surface(fingerprint, module, model):
+    """Per-year weighted kernel density rasters (binned + FFT), cached as one compressed npz"""
+    if module == "Historical Observation":
+        return risk_surface.load_surfaces(load_store(fingerprint))
+    _, proj_store = load_projection(fingerprint, model)
+    return risk_surface.load_surfaces(proj_store, os.path.join(projection.PROJECTION_DIR, model, "risk_surface.npz"))
+
+@st.cache_resource(show_spinner="Preparing playback frames...", max_entries=8)
+def playback_html(fingerprint, module, map_style, model):
+    """Every year's heat layer rendered once into a self-contained page that animates client-side"""
+    if module == "Historical Observation":
+        analytics = historical_analytics(fingerprint)
+        year_columns = [(y, analytics[y]["columns"]) for y in HIST_YEARS if y in analytics]
+        gradient = {0.2: '#0000FF', 0.4: '#00FFFF', 0.6: '#FFFF00', 0.9: '#FF0000'}
+    else:
+        year_columns = [(y, projected_year(fingerprint, model, y)["columns"]) for y in PROJ_YEARS]
+        gradient = {0.1: '#01012b', 0.3: '#0000FF', 0.6: '#00D4FF', 1.0: '#FFFFFF'}
+    tiles = 'https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}' if map_style == "Satellite (Google)" else 'OpenStreetMap'
+    labels, frames = playback.build_frames(year_columns)
+    return playback.render_html(playback.playback_map(labels, frames, CENTER, tiles, gradient))
 
 try:
-    # 1. Train Model using local data
-    df_stats = get_historical_stats()
+    # 1. Load cached data layer (I/O and model fitting only happen when data/processed changes)
+    fingerprint = data_fingerprint()
+    df_stats = get_historical_stats(fingerprint)
     if df_stats.empty:
         st.error("Data repository not found. Ensure 'data/processed/' contains the JSON files.")
         st.stop()
-        
-    model = LinearRegression().fit(df_stats[['year']], df_stats['outbreak_count'])
-    
-    center = [37.1174, -119.6043]
+
+    center = CENTER
     display_year = st.session_state.obs_year if module == "Historical Observation" else st.session_state.proj_year
 
-    # 2. Logic for loading or predicting data
+    # 2. Look up precomputed or projected data
     if module == "Historical Observation":
-        data = load_local_data(display_year)
-        if data:
-            locations = data["locations"]
-            count = data["outbreak_count"]
-        else:
+        view = historical_analytics(fingerprint).get(display_year)
+        if view is None:
             st.warning(f"No local data found for year {display_year}")
-            locations, count = [], 0
+            view = year_view([], [], [], 0, spread_velocity.year_metrics([], [], []))
     else:
-        # Prediction Logic
-        count = int(model.predict([[display_year]])[0])
-        np.random.seed(display_year)
-        spread = 0.08 + (display_year - 2025) * 0.005
-        lats = np.random.uniform(center[0]-spread, center[0]+spread, count)
-        lons = np.random.uniform(center[1]-spread, center[1]+spread, count)
-        scores = np.random.uniform(0.4, 0.9, count)
-        locations = [{"latitude": lat, "longitude": lon, "stress_score": score} for lat, lon, score in zip(lats, lons, scores)]
+        view = projected_year(fingerprint, growth_model, display_year)
 
     # --- Analytics & Dashboard ---
-    hotspot = max(locations, key=lambda x: x['stress_score']) if locations else None
-    velocity = 1.2 + (display_year - 1984) * 0.05 if display_year > 1984 else 0.0
-
-    if count < 15: risk_lvl, risk_col = "STABLE", "#28A745"
-    elif count < 80: risk_lvl, risk_col = "WATCH", "#FFC107"
-    else: risk_lvl, risk_col = "ALERT", "#DC3545"
+    cols, count, hotspot, velocity = view["columns"], view["count"], view["hotspot"], view["velocity"]
+    risk_lvl, risk_col = view["risk"]
+    interval = view.get("interval")
+    count_label = f"{count}" if interval is None else f"{count} <span style='font-size:0.9rem;color:#8B949E;'>({interval[0]:.0f}&ndash;{interval[1]:.0f})</span>"
 
     st.markdown(f"""
         <div class="metric-container">
             <div class="metric-card"><div class="metric-label">Observation Year</div><div class="metric-value">{display_year}</div></div>
-            <div class="metric-card"><div class="metric-label">Anomalies Detected</div><div class="metric-value">{count}</div></div>
+            <div class="metric-card"><div class="metric-label">Anomalies Detected</div><div class="metric-value">{count_label}</div></div>
             <div class="metric-card"><div class="metric-label">Spread Velocity</div><div class="metric-value">{velocity:.1f} km/yr</div></div>
             <div class="metric-card">
                 <div class="metric-label">Security Status</div>
@@ -139,44 +214,45 @@ try:
     col_map, col_data = st.columns([3, 1.2])
 
     with col_map:
-        tiles = 'https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}' if map_style == "Satellite (Google)" else 'OpenStreetMap'
-        m = folium.Map(location=center, zoom_start=10, tiles=tiles, attr='PineGuard GIS')
+        if st.session_state.playing:
+            # Client-side playback: all frames are shipped once, no rerun per frame
+            html = playback_html(fingerprint, module, map_style, growth_model)
+            if hasattr(st, "iframe"):
+                st.iframe(html, width=900, height=550)
+            else:
+                components.html(html, width=900, height=550)
+        else:
+            tiles = 'https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}' if map_style == "Satellite (Google)" else 'OpenStreetMap'
+            m = folium.Map(location=center, zoom_start=10, tiles=tiles, attr='PineGuard GIS')
         
-        heat_data = [[l["latitude"], l["longitude"], l["stress_score"]] for l in locations]
-        if show_heatmap and heat_data:
-            HeatMap(heat_data, radius=18, blur=15, gradient=heatmap_gradient, min_opacity=0.3).add_to(m)
+            has_points = len(cols["latitude"]) > 0
+            if show_heatmap and has_points:
+                # Precomputed density raster as an image overlay, no per-render density work in the browser
+                surface = load_risk_surface(fingerprint, module, growth_model)
+                if surface is not None and display_year in surface:
+                    layers.add_risk_overlay(m, surface, display_year, heatmap_gradient)
         
-        for l in locations:
-            folium.CircleMarker([l["latitude"], l["longitude"]], radius=3, color=point_color, fill=True, weight=1).add_to(m)
+            # One data-driven layer instead of a CircleMarker per point (canvas above the threshold)
+            if has_points:
+                layers.add_point_layer(m, cols["latitude"], cols["longitude"], cols["stress_score"],
+                                       color=point_color, radius=3,
+                                       popup_template="<b>Stress Score:</b> {score}<br><i>Lat: {lat}<br>Lon: {lon}</i>")
         
-        if hotspot:
-            folium.Marker(
-                [hotspot["latitude"], hotspot["longitude"]],
-                icon=folium.Icon(color="white", icon_color=risk_col, icon="warning-sign"),
-                tooltip="Primary Critical Hotspot"
-            ).add_to(m)
+            if hotspot:
+                folium.Marker(
+                    [hotspot["latitude"], hotspot["longitude"]],
+                    icon=folium.Icon(color="white", icon_color=risk_col, icon="warning-sign"),
+                    tooltip="Primary Critical Hotspot"
+                ).add_to(m)
             
-        st_folium(m, width=900, height=550, key=f"map_{module}_{display_year}")
+            st_folium(m, width=900, height=550, key=f"map_{module}_{display_year}")
 
     with col_data:
         st.subheader("Inventory Registry")
-        df_display = pd.DataFrame(locations).rename(columns={'latitude':'LAT','longitude':'LON','stress_score':'SCORE'})
+        df_display = pd.DataFrame(cols).rename(columns={'latitude':'LAT','longitude':'LON','stress_score':'SCORE'})
         st.dataframe(df_display.style.format("{:.4f}"), height=400)
         csv = df_display.to_csv(index=False).encode('utf-8')
         st.download_button("Export Dataset (CSV)", csv, f"pineguard_{mode_tag}_{display_year}.csv", "text/csv", use_container_width=True)
 
-    # Play Engine
-    if st.session_state.playing:
-        time.sleep(0.4)
-        if module == "Historical Observation" and st.session_state.obs_year < 2025:
-            st.session_state.obs_year += 1
-            st.rerun()
-        elif module == "Strategic Projection" and st.session_state.proj_year < 2045:
-            st.session_state.proj_year += 1
-            st.rerun()
-        else:
-            st.session_state.playing = False
-            st.rerun()
-
 except Exception as e:
     st.error(f"Operational Error: {e}")
\ No newline at end of file
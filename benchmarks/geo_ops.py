@@ -0,0 +1,92 @@
+"""
+地理计算基准: 旧的逐点 Python 实现 (iterrows / math / max(dict)) vs src.analysis.geo 的向量化实现。
+运行: python -m benchmarks.geo_ops [--sizes 10000 1000000] [--iterrows-max 10000]
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import geo
+
+CENTER_LAT, CENTER_LON = 37.11, -119.74
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    """原 dashboard.haversine_distance 的标量实现"""
+    R = 6371000
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+def legacy_max_dist_iterrows(df):
+    max_dist = 0
+    for _, row in df.iterrows():
+        max_dist = max(max_dist, scalar_haversine(CENTER_LAT, CENTER_LON, row['Latitude'], row['Longitude']))
+    return max_dist
+
+
+def legacy_max_dist_loop(lat, lon):
+    return max(scalar_haversine(CENTER_LAT, CENTER_LON, a, o) for a, o in zip(lat.tolist(), lon.tolist()))
+
+
+def legacy_hotspot(locations):
+    return max(locations, key=lambda x: x['stress_score'])
+
+
+def legacy_centroid(lat, lon, w):
+    return (sum(a * s for a, s in zip(lat.tolist(), w.tolist())) / w.sum(),
+            sum(o * s for o, s in zip(lon.tolist(), w.tolist())) / w.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--iterrows-max", type=int, default=10000, help="iterrows 版本最多测到多少个点 (太慢)")
+    args = parser.parse_args()
+
+    geo.convex_hull([0.0, 0.0, 1.0], [0.0, 1.0, 0.0])  # 预热 scipy 导入，不计入耗时
+    print(f"{'points':>8} {'operation':<22} {'legacy s':>10} {'numpy s':>10} {'speedup':>9}")
+    for n in args.sizes:
+        rng = np.random.default_rng(0)
+        lat = CENTER_LAT + rng.uniform(-0.2, 0.2, n)
+        lon = CENTER_LON + rng.uniform(-0.2, 0.2, n)
+        score = rng.uniform(0.05, 0.95, n)
+        df = pd.DataFrame({"Latitude": lat, "Longitude": lon})
+        locations = [{"latitude": a, "longitude": o, "stress_score": s}
+                     for a, o, s in zip(lat.tolist(), lon.tolist(), score.tolist())]
+
+        cases = [
+            ("max extent (loop)", (legacy_max_dist_loop, lat, lon), (geo.max_extent, lat, lon, CENTER_LAT, CENTER_LON)),
+            ("hotspot", (legacy_hotspot, locations), (geo.hotspots, lat, lon, score, 1)),
+            ("weighted centroid", (legacy_centroid, lat, lon, score), (geo.weighted_centroid, lat, lon, score)),
+        ]
+        if n <= args.iterrows_max:
+            cases.insert(0, ("max extent (iterrows)", (legacy_max_dist_iterrows, df),
+                             (geo.max_extent, lat, lon, CENTER_LAT, CENTER_LON)))
+        for name, legacy, vectorised in cases:
+            legacy_s, _ = timed(*legacy)
+            numpy_s, _ = timed(*vectorised)
+            print(f"{n:>8} {name:<22} {legacy_s:>10.4f} {numpy_s:>10.4f} {legacy_s / max(numpy_s, 1e-9):>8.0f}x")
+
+        for name, fn in (("bearing", lambda: geo.bearing(CENTER_LAT, CENTER_LON, lat, lon)),
+                         ("convex hull", lambda: geo.convex_hull(lat, lon)),
+                         ("top-10 hotspots", lambda: geo.top_k(score, 10)),
+                         ("summarize", lambda: geo.summarize(lat, lon, score))):
+            numpy_s, _ = timed(fn)
+            print(f"{n:>8} {name:<22} {'-':>10} {numpy_s:>10.4f} {'':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+地图构建耗时与 HTML 大小基准: 逐点 CircleMarker (旧方式) vs layers.add_point_layer 各模式。
+运行: python -m benchmarks.map_rendering [--sizes 1000 10000 100000] [--legacy-max 10000]
+"""
+import argparse
+import time
+
+import folium
+import numpy as np
+
+from src.visualization import layers
+from src.visualization.dashboard import POPUP_TEMPLATE, get_color
+
+CENTER = [37.11, -119.74]
+
+
+def synthetic_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (CENTER[0] + rng.uniform(-0.15, 0.15, n), CENTER[1] + rng.uniform(-0.15, 0.15, n),
+            rng.uniform(0.05, 0.4, n))
+
+
+def build_legacy(lat, lon, score):
+    """旧版 dashboard: 每个点一个 CircleMarker + 一段弹窗 HTML"""
+    m = folium.Map(location=CENTER, zoom_start=11)
+    for a, o, s in zip(lat, lon, score):
+        popup_html = POPUP_TEMPLATE.format(score=f"{s:.4f}", lat=a, lon=o)
+        folium.CircleMarker(location=[a, o], radius=8, color=get_color(s), fill=True, fill_color=get_color(s),
+                            fill_opacity=0.9, popup=folium.Popup(popup_html, max_width=300)).add_to(m)
+    return m
+
+
+def build_layer(lat, lon, score, mode):
+    m = folium.Map(location=CENTER, zoom_start=11)
+    layers.add_point_layer(m, lat, lon, score, mode=mode, color='orange', color_steps=[(0.28, 'red')],
+                           radius=8, weight=3, fill_opacity=0.9, popup_template=POPUP_TEMPLATE)
+    return m
+
+
+def measure(build, *args):
+    t0 = time.perf_counter()
+    m = build(*args)
+    t1 = time.perf_counter()
+    html = m.get_root().render()
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1, len(html.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="旧方式最多测到多少个点 (太慢)")
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'mode':>8} {'build s':>9} {'render s':>9} {'HTML MB':>9} {'B/point':>8}")
+    for n in args.sizes:
+        lat, lon, score = synthetic_points(n)
+        runs = [("legacy", build_legacy, ())] if n <= args.legacy_max else []
+        runs += [(mode, build_layer, (mode,)) for mode in ("svg", "canvas", "cluster")]
+        for name, build, extra in runs:
+            build_s, render_s, size = measure(build, lat, lon, score, *extra)
+            print(f"{n:>8} {name:>8} {build_s:>9.3f} {render_s:>9.3f} {size / 1e6:>9.2f} {size / n:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
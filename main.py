@@ -1,25 +1,204 @@
-from fastapi import FastAPI, HTTPException
-import json
 import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from src.analysis import geo, projection, risk_surface, spread_velocity
+from src.api import formats
+from src.api.jobs import JobQueue, QueueFull
+from src.api.year_index import YearIndex
 
-app = FastAPI()
 DATA_DIR = "data/processed"
 
+# 启动时加载全部年份；之后按文件 mtime 自动失效重载
+year_index = YearIndex(DATA_DIR)
+year_index.refresh(force=True)
+
+# 按需分析任务在独立进程池里执行，处理函数只负责提交/查询
+job_queue = JobQueue()
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # 关闭 (包括 --reload 重载) 时结束分析进程池，避免留下孤儿工作进程
+    job_queue.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+def is_not_modified(request: Request, etag, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    return request.headers.get("if-modified-since") == last_modified
+
+def cached_response(request: Request, cached):
+    """带 ETag / Last-Modified 的预序列化响应；客户端缓存仍有效时返回 304"""
+    headers = {"ETag": cached.etag, "Last-Modified": cached.last_modified, "Cache-Control": "no-cache"}
+    if is_not_modified(request, cached.etag, cached.last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @app.get("/analyze/{year}")
-def get_analysis(year: str):
-    file_path = os.path.join(DATA_DIR, f"stress_{year}.json")
-    if not os.path.exists(file_path):
+def get_analysis(year: str, request: Request, format: str = None):
+    """按 Accept (或 ?format=) 协商 json / ndjson / packed / arrow / parquet，按 Accept-Encoding 协商 gzip / zstd"""
+    entry = year_index.get(year)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Data not found")
-    with open(file_path, "r") as f:
-        return json.load(f)
+    fmt = formats.negotiate_format(request.headers.get("accept"), format)
+    if fmt is None:
+        raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(formats.available_formats())}")
+    encoding = formats.negotiate_encoding(request.headers.get("accept-encoding"))
+
+    etag = formats.variant_etag(entry.etag, fmt, encoding)
+    headers = {"ETag": etag, "Last-Modified": entry.last_modified, "Cache-Control": "no-cache",
+               "Vary": "Accept, Accept-Encoding"}
+    if is_not_modified(request, etag, entry.last_modified):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if fmt == "ndjson":
+        chunks = formats.iter_compress(formats.iter_ndjson(entry), encoding)
+        return StreamingResponse(chunks, media_type=formats.MEDIA_TYPES[fmt], headers=headers)
+    return Response(content=entry.encoded(fmt, encoding), media_type=formats.MEDIA_TYPES[fmt], headers=headers)
 
 @app.get("/stats/annual_outbreak_counts")
-def get_annual_outbreak_counts():
-    all_stats = []
-    for year in range(1984, 2026):
-        file_path = os.path.join(DATA_DIR, f"stress_{year}.json")
-        if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                data = json.load(f)
-                all_stats.append({"year": year, "outbreak_count": data["outbreak_count"]})
-    return all_stats
\ No newline at end of file
+def get_annual_outbreak_counts(request: Request):
+    return cached_response(request, year_index.annual_stats())
+
+_velocity_cache = {"version": None, "metrics": {}}
+
+@app.get("/stats/spread_velocity")
+def get_spread_velocity():
+    """逐年扩散指标 (前沿速度、回转半径增长等)；数据版本不变时直接返回内存结果"""
+    version = year_index.refresh()
+    if _velocity_cache["version"] != version:
+        metrics = spread_velocity.compute_velocity(year_index.store) if year_index.store is not None else {}
+        _velocity_cache.update(version=version, metrics=metrics)
+    return [{"year": y, **{k: v for k, v in m.items() if k != "key"}} for y, m in sorted(_velocity_cache["metrics"].items())]
+
+_projection_cache = {"version": None, "models": {}}
+
+def load_projection(model):
+    """(summary, PointStore)；数据版本不变时复用内存中已打开的预测结果"""
+    if model not in projection.MODELS and model != "auto":
+        raise HTTPException(status_code=400, detail=f"model must be one of: {', '.join(projection.MODELS)}, auto")
+    version = year_index.refresh()
+    if _projection_cache["version"] != version:
+        _projection_cache.update(version=version, models={})
+    if model not in _projection_cache["models"]:
+        if year_index.store is None:
+            raise HTTPException(status_code=404, detail="Data not found")
+        _projection_cache["models"][model] = projection.load_projection(year_index.store, model=model)
+    return _projection_cache["models"][model]
+
+@app.get("/projection")
+def get_projection(model: str = "linear"):
+    """2026-2045 的预测数量与预测区间 (拟合参数、置信水平一并返回)"""
+    summary, _ = load_projection(model)
+    years = [{"year": y, "outbreak_count": c, "expected": e, "lower": lo, "upper": hi}
+             for y, c, e, lo, hi in zip(summary["years"], summary["count"], summary["expected"],
+                                        summary["lower"], summary["upper"])]
+    return {k: summary[k] for k in ("model", "fitted_model", "params", "aic", "confidence", "seed")} | {"years": years}
+
+@app.get("/projection/{year}")
+def get_projection_year(year: int, model: str = "linear"):
+    summary, store = load_projection(model)
+    if year not in store.years:
+        raise HTTPException(status_code=404, detail="Projection not found")
+    i = summary["years"].index(year)
+    cols = store.year_columns(year)
+    locations = [{"latitude": la, "longitude": lo, "stress_score": sc} for la, lo, sc in
+                 zip(cols["latitude"].tolist(), cols["longitude"].tolist(), cols["stress_score"].tolist())]
+    return {"year": year, "outbreak_count": summary["count"][i], "lower": summary["lower"][i],
+            "upper": summary["upper"][i], "locations": locations}
+
+_risk_cache = {"version": None, "surfaces": {}}
+
+def load_risk_surface(year, model):
+    """观测年份用观测栅格，2026 年以后用对应预测模型的栅格；同一数据版本内只加载一次"""
+    version = year_index.refresh()
+    if _risk_cache["version"] != version:
+        _risk_cache.update(version=version, surfaces={})
+    key = None if year_index.store is not None and year in year_index.store.years else model
+    if key not in _risk_cache["surfaces"]:
+        if key is None:
+            surface = risk_surface.load_surfaces(year_index.store)
+        else:
+            _, store = load_projection(model)
+            surface = risk_surface.load_surfaces(store, os.path.join(projection.PROJECTION_DIR, model, "risk_surface.npz"))
+        _risk_cache["surfaces"][key] = surface
+    return _risk_cache["surfaces"][key]
+
+@app.get("/risk")
+def get_risk(lat: float, lon: float, year: int, model: str = "linear"):
+    """某坐标在某年的加权核密度 (stress_score / km²) 与 0-1 归一化风险，直接查预先算好的栅格"""
+    surface = load_risk_surface(year, model)
+    if surface is None or year not in surface:
+        raise HTTPException(status_code=404, detail="Data not found")
+    density, risk = surface.value_at(lat, lon, year)
+    return {"year": year, "latitude": lat, "longitude": lon, "density": density, "risk": risk,
+            "in_grid": surface.cell(lat, lon) is not None, "bandwidth_km": surface.bandwidth_km}
+
+@app.get("/query/bbox")
+def query_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+               start_year: int = None, end_year: int = None):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    index = year_index.spatial()
+    idx = index.query_bbox(min_lat, min_lon, max_lat, max_lon, start_year, end_year)
+    return {"count": len(idx), "locations": index.records(idx)}
+
+@app.get("/query/radius")
+def query_radius(lat: float, lon: float, radius_km: float, start_year: int = None, end_year: int = None):
+    if radius_km < 0:
+        raise HTTPException(status_code=400, detail="radius_km must be non-negative")
+    index = year_index.spatial()
+    idx, dist = index.query_radius(lat, lon, radius_km, start_year, end_year)
+    return {"count": len(idx), "locations": index.records(idx, dist)}
+
+class AnalyzeRegionRequest(BaseModel):
+    lat: float = 37.11
+    lon: float = -119.74
+    radius_km: float = 15.0
+    filters: dict = None
+
+@app.post("/analyze_region", status_code=202)
+def submit_analyze_region(req: AnalyzeRegionRequest):
+    if req.radius_km <= 0:
+        raise HTTPException(status_code=400, detail="radius_km must be positive")
+    try:
+        job = job_queue.submit(req.lat, req.lon, req.radius_km, req.filters)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    # 命中结果缓存时直接返回 200
+    return JSONResponse(job.describe(), status_code=200 if job.status == "done" else 202,
+                        headers={"Location": f"/jobs/{job.id}"})
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.describe()
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done":
+        return JSONResponse(job.describe(), status_code=202)
+    return {"job_id": job.id, "count": len(job.result), "locations": job.result.to_list()}
+
+@app.get("/analyze/{year}/summary")
+def get_year_summary(year: str, k: int = 5):
+    """质心、外包框、最远扩散距离/方位、凸包面积和前 k 个热点 (全部向量化计算)"""
+    entry = year_index.get(year)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Data not found")
+    summary = geo.summarize(entry.latitude, entry.longitude, entry.stress_score, k=max(0, min(k, 100)))
+    return {"year": entry.key, "outbreak_count": entry.outbreak_count, **summary}
@@ -1,38 +1,123 @@
-import json
+import argparse
 import os
-import random
-
-def generate_industrial_data():
-    """生成 1984-2025 年工业级模拟监测数据"""
-    os.makedirs('data/processed', exist_ok=True)
-    center_lat, center_lon = 37.1174, -119.6043
-    
-    for year in range(1984, 2026):
-        # 扩散逻辑：后期扩散速度加快，模拟生态灾害特征
-        if year < 2000:
-            num_points = max(2, (year - 1983)) 
-            spread_range = 0.04 + (year - 1984) * 0.002
-        else:
-            num_points = 18 + (year - 2000) * 4 
-            spread_range = 0.08 + (year - 2000) * 0.005
-        
-        locations = []
-        for i in range(num_points):
-            locations.append({
-                "latitude": round(center_lat + random.uniform(-spread_range, spread_range), 6),
-                "longitude": round(center_lon + random.uniform(-spread_range, spread_range), 6),
-                "stress_score": round(random.uniform(0.35, 0.95), 4)
-            })
-        
-        result = {
-            "year": str(year),
-            "outbreak_count": len(locations),
-            "locations": locations
-        }
-        
-        with open(f'data/processed/stress_{year}.json', 'w') as f:
-            json.dump(result, f, indent=4)
-    print(f"✅ Success: 42 years of spatial data generated.")
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.analysis import risk_surface
+from src.processing import point_store
+
+CENTER = (37.1174, -119.6043)
+FORMATS = ("columnar", "json")
+# 多站点模式下，其余站点的中心分布在主站点 ±SITE_SPREAD_DEG 范围内
+SITE_SPREAD_DEG = 0.15
+SCORE_RANGE = (0.35, 0.95)
+
+
+def legacy_point_count(year):
+    """原始数据的逐年点数: 2000 年前缓慢增长，之后每年增加 4 个"""
+    if year < 2000:
+        return max(2, (year - 1983))
+    return 18 + (year - 2000) * 4
+
+
+def spread_range(year):
+    # 扩散逻辑：后期扩散速度加快，模拟生态灾害特征
+    if year < 2000:
+        return 0.04 + (year - 1984) * 0.002
+    return 0.08 + (year - 2000) * 0.005
+
+
+def site_centers(sites, seed):
+    """站点 0 为主中心，其余站点由 (seed, 站点号) 确定，与年份无关"""
+    centers = [CENTER]
+    for site in range(1, sites):
+        offset = np.random.default_rng([seed, 0, site]).uniform(-SITE_SPREAD_DEG, SITE_SPREAD_DEG, 2)
+        centers.append((CENTER[0] + offset[0], CENTER[1] + offset[1]))
+    return centers
+
+
+def _generate_year(task):
+    """
+    一个年份的全部点位 (在子进程中执行)。每个 (年份, 站点) 使用独立的 Generator 流，
+    因此结果与 worker 数量、执行顺序无关。
+    """
+    year, n_points, centers, seed = task
+    per_site = np.full(len(centers), n_points // len(centers), dtype=np.int64)
+    per_site[:n_points % len(centers)] += 1
+    spread = spread_range(year)
+    lats, lons, scores = [], [], []
+    for site, ((lat0, lon0), n) in enumerate(zip(centers, per_site.tolist())):
+        rng = np.random.default_rng([seed, year, site + 1])
+        lats.append(np.round(lat0 + rng.uniform(-spread, spread, n), 6))
+        lons.append(np.round(lon0 + rng.uniform(-spread, spread, n), 6))
+        scores.append(np.round(rng.uniform(SCORE_RANGE[0], SCORE_RANGE[1], n), 4))
+    return year, np.concatenate(lats), np.concatenate(lons), np.concatenate(scores)
+
+
+def generate_industrial_data(points_per_year=None, sites=1, start_year=1984, end_year=2025, workers=None,
+                             fmt="json", seed=None, data_dir=point_store.DATA_DIR):
+    """
+    生成 start_year-end_year 年工业级模拟监测数据。
+    points_per_year 为 None 时沿用原来的逐年点数；否则每年生成该数量的点，平均分配到 sites 个站点。
+    fmt="json" 写列式存储并导出兼容的 stress_{year}.json；fmt="columnar" 只写列式存储 (适合百万级点数)。
+    相同 seed 的结果完全可复现；seed 为 None 时随机选取并打印出来。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"未知的输出格式: {fmt} (可选 {', '.join(FORMATS)})")
+    if sites < 1 or start_year > end_year:
+        raise ValueError("sites 至少为 1，且 start_year 不能晚于 end_year")
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 63))
+        print(f"🎲 随机种子: {seed}")
+    os.makedirs(data_dir, exist_ok=True)
+    centers = site_centers(sites, seed)
+    years = range(start_year, end_year + 1)
+    tasks = [(y, legacy_point_count(y) if points_per_year is None else int(points_per_year), centers, seed)
+             for y in years]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_generate_year, tasks))
+    else:
+        results = [_generate_year(t) for t in tasks]
+
+    year_col = np.concatenate([np.full(r[1].size, r[0], dtype=np.int16) for r in results])
+    lats, lons, scores = (np.concatenate([r[i] for r in results]) for i in (1, 2, 3))
+    store_dir = os.path.join(data_dir, os.path.basename(point_store.STORE_DIR))
+    counts = {r[0]: int(r[1].size) for r in results}
+
+    if fmt == "json":
+        # 列式存储是主数据；stress_{year}.json 作为兼容导出
+        point_store.write_store(year_col, lats, lons, scores, store_dir, counts=counts)
+        store = point_store.PointStore(store_dir)
+        point_store.export_json(store, data_dir)
+    else:
+        # 记录已有 JSON 的签名，避免 open_store 认为存储过期而用旧 JSON 覆盖新数据
+        point_store.write_store(year_col, lats, lons, scores, store_dir, counts=counts,
+                                sources=point_store.json_sources(data_dir))
+        store = point_store.PointStore(store_dir)
+    # 逐年风险密度栅格 (app 的热力叠加层和 /risk 查询直接读取)
+    risk_surface.build_surfaces(store, os.path.join(data_dir, os.path.basename(risk_surface.RISK_PATH)))
+    print(f"✅ Success: {len(counts)} years of spatial data generated ({year_col.size} points, {sites} site(s), seed {seed}).")
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成模拟监测数据 (默认与原始数据规模一致；可用于压力测试)")
+    parser.add_argument("--points-per-year", type=int, default=None, help="每年的点数 (默认沿用原来的逐年增长)")
+    parser.add_argument("--sites", type=int, default=1, help="暴发站点数量")
+    parser.add_argument("--start-year", type=int, default=1984)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--workers", type=int, default=None, help="进程数 (默认 CPU 核数，1 表示不用进程池)")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="json: 同时导出 stress_{year}.json")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子 (相同种子结果完全一致)")
+    parser.add_argument("--data-dir", default=point_store.DATA_DIR)
+    args = parser.parse_args(argv)
+    generate_industrial_data(args.points_per_year, args.sites, args.start_year, args.end_year, args.workers,
+                             args.format, args.seed, args.data_dir)
+
 
 if __name__ == "__main__":
-    generate_industrial_data()
\ No newline at end of file
+    main()
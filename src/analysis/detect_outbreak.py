@@ -1,9 +1,15 @@
 import rasterio
 from rasterio.warp import transform as warp_transform
+from rasterio.windows import Window
 import numpy as np
 import pandas as pd
 import os
 
+from src.analysis.patches import extract_patches
+from src.analysis.results import OutbreakPixels
+from src.analysis.streaming_stats import RunningStats
+from src.processing import band_cache
+
 # === 路径配置 (保持不变) ===
 # 注意：在 API 模式下，我们通常使用相对路径或环境变量，这里暂时保持相对路径
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -20,6 +26,22 @@ OCT_NIR  = os.path.join(IMG_DIR, "SJER_B08_10m.jp2")
 OCT_SWIR = os.path.join(IMG_DIR, "SJER_B11_20m.jp2")
 OCT_RED  = os.path.join(IMG_DIR, "SJER_B04_10m.jp2") 
 
+# 过滤器与阈值参数 (保持你调教好的完美参数)
+DEFAULT_FILTERS = {
+    "veg_ndvi_min": 0.45,        # 5月 NDVI 下限 (植被)
+    "veg_red_max": 0.18,         # 5月红光上限 (排除亮地表)
+    "structure_ndvi_min": 0.30,  # 10月 NDVI 下限 (树冠结构仍在)
+    "water_ndwi_max": 0.25,      # 排除水体
+    "sand_ndwi_min": 0.0,        # 排除沙地
+    "soil_swir_max": 0.25,       # 排除亮土
+    "delta_min": 0.05,           # 有效 ΔNDWI 区间
+    "delta_max": 0.40,
+    "threshold_floor": 0.08,     # 动态阈值的上下限
+    "threshold_cap": 0.3,
+    "threshold_method": "sigma",    # "sigma": mean + 2σ；"percentile": 按分位数截断
+    "threshold_percentile": 97.5,
+}
+
 # === 帮助函数 ===
 def read_band(path, match_shape=None):
     if not os.path.exists(path): 
@@ -39,30 +61,97 @@ def read_band(path, match_shape=None):
             
         return data, src.transform, src.crs
 
-# === ⭐️ 核心改造点：封装成可调用的函数 ===
-def analyze_region(target_lat=37.11, target_lon=-119.74, radius_km=15.0):
+def read_band_window(path, window, ref_shape):
     """
-    供 API 调用的主函数。
-    返回: List[Dict] (包含受压树木的列表)
+    只读取参考网格 (10m) 上某个窗口对应的像素。
+    如果源文件分辨率不同 (例如 20m 的 B11)，窗口会换算到源网格的浮点坐标，
+    再用双线性插值输出到窗口大小，等价于整幅重采样后再裁剪。
+    启用解码缓存时直接从缓存的 memmap 中切片，不再解码 JP2。
     """
-    print(f"🚀 [Core Engine] 启动分析: Lat={target_lat}, Lon={target_lon}, Radius={radius_km}km")
+    if not os.path.exists(path):
+        print(f"❌ 警告: 找不到文件 {path}")
+        return None
 
-    # 1. 加载数据
-    nir_may, transform, crs = read_band(MAY_NIR)
-    # 如果主文件读不到，直接返回空列表
-    if nir_may is None: return []
+    if band_cache.ENABLED:
+        band = band_cache.load_band(path, target_shape=ref_shape)
+        return np.array(band[window.toslices()], dtype='float32')
+
+    with rasterio.open(path) as src:
+        from rasterio.enums import Resampling
+        out_shape = (int(window.height), int(window.width))
+        if (src.height, src.width) == tuple(ref_shape):
+            data = src.read(1, window=window).astype('float32')
+        else:
+            scale_y = src.height / ref_shape[0]
+            scale_x = src.width / ref_shape[1]
+            src_window = Window(window.col_off * scale_x, window.row_off * scale_y,
+                                window.width * scale_x, window.height * scale_y)
+            data = src.read(1, window=src_window, out_shape=out_shape,
+                            resampling=Resampling.bilinear).astype('float32')
+
+        if band_cache.needs_scaling(data, src.dtypes[0]):
+            data = data / 10000.0
 
-    swir_may, _, _ = read_band(MAY_SWIR, match_shape=nir_may.shape)
-    red_may, _, _  = read_band(MAY_RED, match_shape=nir_may.shape)
-    nir_oct, _, _ = read_band(OCT_NIR)
-    swir_oct, _, _ = read_band(OCT_SWIR, match_shape=nir_may.shape)
-    red_oct, _, _ = read_band(OCT_RED, match_shape=nir_may.shape)
+        return data
 
-    if red_may is None or red_oct is None:
-        print("❌ 错误: 缺少必要的波段文件")
-        return []
+def roi_window(transform, crs, shape, target_lat, target_lon, radius_km):
+    """
+    把 (lat, lon, radius) 换算成参考网格上的外接矩形窗口。
+    返回: (window, center_row, center_col, radius_px)，圆心为整幅影像的行列坐标；
+    ROI 与影像不相交时 window 为 None。
+    """
+    center_x_list, center_y_list = warp_transform({'init': 'EPSG:4326'}, crs, [target_lon], [target_lat])
+    # 注意: ~transform * (x, y) 返回的是 (col, row)。历史版本的地理围栏就是按这个顺序
+    # 套到 ogrid 上的，为了保证结果与旧输出逐像素一致，这里沿用同样的轴顺序。
+    center_row, center_col = ~transform * (center_x_list[0], center_y_list[0])
+    center_row, center_col = int(center_row), int(center_col)
+    # 将 km 转为像素距离 (Sentinel-2 10m 分辨率)
+    radius_px = (radius_km * 1000) / 10.0
+
+    height, width = shape
+    row_start = max(0, int(np.ceil(center_row - radius_px)))
+    row_stop = min(height, int(np.floor(center_row + radius_px)) + 1)
+    col_start = max(0, int(np.ceil(center_col - radius_px)))
+    col_stop = min(width, int(np.floor(center_col + radius_px)) + 1)
+    if row_start >= row_stop or col_start >= col_stop:
+        return None, center_row, center_col, radius_px
+
+    window = Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+    return window, center_row, center_col, radius_px
+
+def roi_mask_for_window(window, center_row, center_col, radius_px):
+    """在窗口内生成圆形 ROI 掩膜 (坐标仍以整幅影像为基准)"""
+    Y, X = np.ogrid[int(window.row_off):int(window.row_off + window.height),
+                    int(window.col_off):int(window.col_off + window.width)]
+    dist_from_center = np.sqrt((X - center_col)**2 + (Y - center_row)**2)
+    return dist_from_center <= radius_px
+
+def reference_grid():
+    """读取参考波段 (5月 B08) 的网格信息: (transform, crs, shape)，缺文件时返回 None"""
+    if not os.path.exists(MAY_NIR):
+        print(f"❌ 警告: 找不到文件 {MAY_NIR}")
+        return None
+    with rasterio.open(MAY_NIR) as ref:
+        return ref.transform, ref.crs, (ref.height, ref.width)
+
+def compute_block(window, ref_shape, center_row, center_col, radius_px, filters=None):
+    """
+    在一个窗口内完成读波段 -> 指数计算 -> 地物过滤 -> ΔNDWI。
+    返回: (delta_ndwi, valid_range_mask)，缺少波段时返回 (None, None)。
+    """
+    f = DEFAULT_FILTERS if filters is None else {**DEFAULT_FILTERS, **filters}
+
+    nir_may = read_band_window(MAY_NIR, window, ref_shape)
+    swir_may = read_band_window(MAY_SWIR, window, ref_shape)
+    red_may = read_band_window(MAY_RED, window, ref_shape)
+    nir_oct = read_band_window(OCT_NIR, window, ref_shape)
+    swir_oct = read_band_window(OCT_SWIR, window, ref_shape)
+    red_oct = read_band_window(OCT_RED, window, ref_shape)
 
-    # 2. 计算指标
+    if any(b is None for b in (nir_may, swir_may, red_may, nir_oct, swir_oct, red_oct)):
+        return None, None
+
+    # 1. 计算指标
     with np.errstate(divide='ignore', invalid='ignore'):
         ndwi_may = (nir_may - swir_may) / (nir_may + swir_may)
         ndvi_may = (nir_may - red_may) / (nir_may + red_may)
@@ -75,75 +164,153 @@ def analyze_region(target_lat=37.11, target_lon=-119.74, radius_km=15.0):
         ndwi_oct = np.nan_to_num(ndwi_oct, nan=-1)
         ndvi_oct = np.nan_to_num(ndvi_oct, nan=-1)
 
-    # 3. 地理围栏 (使用传入的 lat, lon, radius)
-    center_x_list, center_y_list = warp_transform({'init': 'EPSG:4326'}, crs, [target_lon], [target_lat])
-    center_row, center_col = ~transform * (center_x_list[0], center_y_list[0])
-    center_row, center_col = int(center_row), int(center_col)
-    
-    height, width = ndwi_may.shape
-    Y, X = np.ogrid[:height, :width]
-    dist_from_center = np.sqrt((X - center_col)**2 + (Y - center_row)**2)
-    # 将 km 转为像素距离 (Sentinel-2 10m 分辨率)
-    roi_mask = dist_from_center <= ((radius_km * 1000) / 10.0)
-
-    # 4. 应用过滤器 (保持你调教好的完美参数)
-    is_vegetation = (ndvi_may > 0.45) & (red_may < 0.18)
-    structure_exists = (ndvi_oct > 0.30)
-    not_water = (ndwi_may < 0.25)
-    not_sand_ndwi = (ndwi_may > 0.0) 
-    not_bright_soil = (swir_may < 0.25)
+    # 2. 地理围栏
+    roi_mask = roi_mask_for_window(window, center_row, center_col, radius_px)
+
+    # 3. 应用过滤器
+    is_vegetation = (ndvi_may > f["veg_ndvi_min"]) & (red_may < f["veg_red_max"])
+    structure_exists = (ndvi_oct > f["structure_ndvi_min"])
+    not_water = (ndwi_may < f["water_ndwi_max"])
+    not_sand_ndwi = (ndwi_may > f["sand_ndwi_min"])
+    not_bright_soil = (swir_may < f["soil_swir_max"])
     
     candidate_mask = roi_mask & is_vegetation & structure_exists & not_water & not_sand_ndwi & not_bright_soil
     
-    # 5. 计算压力
+    # 4. 计算压力
     delta_ndwi = ndwi_may - ndwi_oct
-    valid_range_mask = candidate_mask & (delta_ndwi > 0.05) & (delta_ndwi < 0.40)
-    valid_deltas = delta_ndwi[valid_range_mask]
+    valid_range_mask = candidate_mask & (delta_ndwi > f["delta_min"]) & (delta_ndwi < f["delta_max"])
+    return delta_ndwi, valid_range_mask
+
+def final_threshold(mean_val, std_val, filters=None):
+    """动态阈值: mean + 2σ，并限制在 [floor, cap] 之间"""
+    f = DEFAULT_FILTERS if filters is None else {**DEFAULT_FILTERS, **filters}
+    dynamic_threshold = mean_val + (2 * std_val)
+    threshold = max(dynamic_threshold, f["threshold_floor"])
+    return min(threshold, f["threshold_cap"])
+
+def new_delta_stats(filters=None):
+    """创建 ΔNDWI 的流式统计累加器；分位数模式下附带有效区间上的直方图"""
+    f = DEFAULT_FILTERS if filters is None else {**DEFAULT_FILTERS, **filters}
+    if f["threshold_method"] == "percentile":
+        return RunningStats(hist_range=(f["delta_min"], f["delta_max"]))
+    return RunningStats()
+
+def threshold_from_stats(stats, filters=None):
+    """根据累加好的统计量给出最终阈值"""
+    f = DEFAULT_FILTERS if filters is None else {**DEFAULT_FILTERS, **filters}
+    if f["threshold_method"] == "percentile":
+        cutoff = stats.quantile(f["threshold_percentile"] / 100.0)
+        return min(max(cutoff, f["threshold_floor"]), f["threshold_cap"])
+    return final_threshold(stats.mean, stats.std, filters)
+
+def warm_band_cache(ref_shape):
+    """预先把六个波段写入解码缓存，避免多个进程同时解码同一景影像"""
+    if not band_cache.ENABLED:
+        return
+    for path in (MAY_NIR, MAY_SWIR, MAY_RED, OCT_NIR, OCT_SWIR, OCT_RED):
+        band_cache.load_band(path, target_shape=ref_shape)
+
+def pack_outbreak_pixels(rows, cols, scores, transform, crs):
+    """把风险像素的行列号向量化地转换成经纬度，打包成列式结果"""
+    if len(rows) == 0:
+        return OutbreakPixels.empty()
+
+    # 像素中心坐标 (与 rasterio.transform.xy(offset='center') 相同)，直接用仿射变换做数组运算
+    xs, ys = transform * (np.asarray(cols) + 0.5, np.asarray(rows) + 0.5)
+    lons, lats = warp_transform(crs, {'init': 'EPSG:4326'}, xs, ys)
+
+    return OutbreakPixels(
+        latitude=np.round(np.asarray(lats, dtype=np.float64), 6),
+        longitude=np.round(np.asarray(lons, dtype=np.float64), 6),
+        stress_score=np.round(np.asarray(scores, dtype=np.float64), 4),
+        row=rows,
+        col=cols,
+    )
+
+# === ⭐️ 核心改造点：封装成可调用的函数 ===
+def analyze_region(target_lat=37.11, target_lon=-119.74, radius_km=15.0, filters=None):
+    """
+    供 API 调用的主函数。
+    返回: OutbreakPixels (列式结果，可按 List[Dict] 方式访问；to_list() 得到真正的列表)
+    """
+    print(f"🚀 [Core Engine] 启动分析: Lat={target_lat}, Lon={target_lon}, Radius={radius_km}km")
+
+    # 1. 先用参考波段的元数据把 ROI 换算成窗口，只读取窗口内的像素
+    grid = reference_grid()
+    # 如果主文件读不到，直接返回空列表
+    if grid is None: return OutbreakPixels.empty()
+    transform, crs, ref_shape = grid
+
+    window, center_row, center_col, radius_px = roi_window(
+        transform, crs, ref_shape, target_lat, target_lon, radius_km)
+    if window is None:
+        print("⚠️ ROI 不在影像范围内。")
+        return OutbreakPixels.empty()
+
+    # 2. 读取 + 过滤 + 计算压力 (只在窗口内)
+    delta_ndwi, valid_range_mask = compute_block(
+        window, ref_shape, center_row, center_col, radius_px, filters)
+    if delta_ndwi is None:
+        print("❌ 错误: 缺少必要的波段文件")
+        return OutbreakPixels.empty()
+
+    # 流式统计: 直接在掩膜上累加，不生成 valid_deltas 副本
+    stats = new_delta_stats(filters)
+    stats.update(delta_ndwi, valid_range_mask)
     
-    results_list = []
+    results_list = OutbreakPixels.empty()
 
-    if valid_deltas.size > 0:
-        mean_val = np.nanmean(valid_deltas)
-        std_val = np.nanstd(valid_deltas)
-        
+    if stats.count > 0:
         # 阈值逻辑
-        dynamic_threshold = mean_val + (2 * std_val)
-        final_threshold = max(dynamic_threshold, 0.08)
-        final_threshold = min(final_threshold, 0.3)
+        threshold = threshold_from_stats(stats, filters)
         
-        outbreak_mask = valid_range_mask & (delta_ndwi > final_threshold)
+        outbreak_mask = valid_range_mask & (delta_ndwi > threshold)
         rows, cols = np.where(outbreak_mask)
         
         # 坐标转换与结果打包
-        if len(rows) > 0:
-            xs, ys = rasterio.transform.xy(transform, rows, cols, offset='center')
-            lons, lats = warp_transform(crs, {'init': 'EPSG:4326'}, xs, ys)
-            
-            for r, c, lon, lat in zip(rows, cols, lons, lats):
-                # 构造符合 JSON 格式的字典
-                results_list.append({
-                    "latitude": round(lat, 6),
-                    "longitude": round(lon, 6),
-                    "stress_score": round(float(delta_ndwi[r, c]), 4),
-                    "condition": "Water Stressed"
-                })
+        scores = delta_ndwi[rows, cols]
+        rows = rows + int(window.row_off)
+        cols = cols + int(window.col_off)
+        results_list = pack_outbreak_pixels(rows, cols, scores, transform, crs)
 
     print(f"✅ 分析完成，发现 {len(results_list)} 个风险点。")
     return results_list
 
-# === 保持脚本可独立运行 (方便调试) ===
+def analyze_patches(target_lat=37.11, target_lon=-119.74, radius_km=15.0, filters=None, pixels=None):
+    """
+    把风险像素聚合成连通的虫害斑块 (8 邻域)，每个斑块只输出一条记录。
+    pixels 可以直接传入 analyze_region / analyze_region_tiled 的结果，避免重复计算。
+    返回: List[Dict] (按面积从大到小)
+    """
+    if pixels is None:
+        pixels = analyze_region(target_lat, target_lon, radius_km, filters)
+    grid = reference_grid()
+    if grid is None or len(pixels) == 0:
+        return []
+    transform, crs, _ = grid
+    patches = extract_patches(pixels.row, pixels.col, pixels.stress_score, transform, crs)
+    print(f"🧩 {len(pixels)} 个风险像素聚合为 {len(patches)} 个斑块。")
+    return patches
+
+# === 保持脚本可独立运行 (方便调试): 在项目根目录执行 python -m src.analysis.detect_outbreak ===
 if __name__ == "__main__":
     # 手动运行时，还是把结果存成 CSV
     results = analyze_region()
     
     if results:
         print("🔄 [手动模式] 正在导出 CSV...")
-        df = pd.DataFrame(results)
+        df = results.to_frame()
         # 将 key 转换为 CSV 友好的列名
         df.columns = ["Latitude", "Longitude", "Stress_Score", "Condition"]
         csv_path = os.path.join(OUT_DIR, "PineGuard_Local_Outbreak.csv")
         df.to_csv(csv_path, index=False)
         print(f"📄 CSV 已保存: {csv_path}")
         print(df.head())
+
+        patches = analyze_patches(pixels=results)
+        patch_df = pd.DataFrame(patches)
+        patch_path = os.path.join(OUT_DIR, "PineGuard_Local_Patches.csv")
+        patch_df.to_csv(patch_path, index=False)
+        print(f"📄 斑块 CSV 已保存: {patch_path}")
     else:
         print("✅ 森林健康，无风险点。")
\ No newline at end of file
@@ -0,0 +1,118 @@
+import numpy as np
+
+# === 向量化的地理计算 ===
+# 所有函数都接受标量或 NumPy 数组 (按广播规则)，替代 iterrows / max(dict) 之类的逐点 Python 循环。
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_M):
+    """两点间大圆距离 (米)"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    return haversine(lat1, lon1, lat2, lon2) / 1000.0
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """从点 1 指向点 2 的初始方位角 (度，正北为 0，顺时针 0-360)"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    y = np.sin(dlambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def max_extent(lat, lon, center_lat, center_lon):
+    """离中心最远的点: 返回 (距离米, 下标)；没有点时返回 (0.0, None)"""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    if lat.size == 0:
+        return 0.0, None
+    dist = haversine(center_lat, center_lon, lat, lon)
+    i = int(np.argmax(dist))
+    return float(dist[i]), i
+
+
+def bounding_box(lat, lon):
+    """[min_lat, min_lon, max_lat, max_lon]；没有点时返回 None"""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    if lat.size == 0:
+        return None
+    return [float(lat.min()), float(lon.min()), float(lat.max()), float(lon.max())]
+
+
+def local_xy(lat, lon, lat0, lon0):
+    """以 (lat0, lon0) 为原点的等距圆柱投影 (米)，在几十公里范围内足够精确；返回 (x, y)"""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    x = np.radians(lon - lon0) * np.cos(np.radians(lat0)) * EARTH_RADIUS_M
+    y = np.radians(lat - lat0) * EARTH_RADIUS_M
+    return x, y
+
+
+def convex_hull(lat, lon):
+    """
+    凸包顶点下标 (逆时针) 以及面积 (平方米)。
+    点数不足 3 或全部共线时返回 (全部去重下标, 0.0)。
+    """
+    from scipy.spatial import ConvexHull, QhullError
+
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    if lat.size < 3:
+        return np.arange(lat.size), 0.0
+    x, y = local_xy(lat, lon, float(lat.mean()), float(lon.mean()))
+    try:
+        hull = ConvexHull(np.column_stack([x, y]))
+    except QhullError:
+        return np.unique(np.column_stack([lat, lon]), axis=0, return_index=True)[1], 0.0
+    # 二维情况下 volume 就是面积
+    return hull.vertices, float(hull.volume)
+
+
+def top_k(scores, k):
+    """分数最高的 k 个下标 (降序)，O(n) 选择 + 只对 k 个排序"""
+    scores = np.asarray(scores)
+    k = min(int(k), scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def hotspots(lat, lon, scores, k=1):
+    """前 k 个热点，[{latitude, longitude, stress_score}, ...]"""
+    idx = top_k(scores, k)
+    lat, lon, scores = np.asarray(lat), np.asarray(lon), np.asarray(scores)
+    return [{"latitude": float(lat[i]), "longitude": float(lon[i]), "stress_score": float(scores[i])} for i in idx]
+
+
+def weighted_centroid(lat, lon, weights=None):
+    """球面加权质心 (在单位球上平均三维向量)；没有点或权重和为 0 时返回 None"""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    if lat.size == 0:
+        return None
+    w = np.ones_like(lat) if weights is None else np.asarray(weights, dtype=np.float64)
+    if not w.sum() > 0:
+        return None
+    cos_lat = np.cos(lat)
+    x, y, z = (np.dot(w, cos_lat * np.cos(lon)), np.dot(w, cos_lat * np.sin(lon)), np.dot(w, np.sin(lat)))
+    return float(np.degrees(np.arctan2(z, np.hypot(x, y)))), float(np.degrees(np.arctan2(y, x)))
+
+
+def summarize(lat, lon, scores, k=5):
+    """一组点的空间摘要: 数量、外包框、加权质心、最远点、凸包面积、前 k 个热点"""
+    lat, lon, scores = (np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64),
+                        np.asarray(scores, dtype=np.float64))
+    centroid = weighted_centroid(lat, lon, scores)
+    summary = {"count": int(lat.size), "bbox": bounding_box(lat, lon), "weighted_centroid": centroid,
+               "max_extent_km": 0.0, "max_extent_bearing": None, "hull_area_km2": 0.0,
+               "hotspots": hotspots(lat, lon, scores, k)}
+    if centroid is not None:
+        dist, i = max_extent(lat, lon, *centroid)
+        summary["max_extent_km"] = dist / 1000.0
+        summary["max_extent_bearing"] = float(bearing(centroid[0], centroid[1], lat[i], lon[i]))
+        summary["hull_area_km2"] = convex_hull(lat, lon)[1] / 1e6
+    return summary
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+
+from src.analysis import detect_outbreak as core
+from src.analysis import tiled_engine
+from src.analysis.results import OutbreakPixels
+from src.analysis.streaming_stats import RunningStats
+from src.processing import band_cache
+
+# === 分块结果缓存 ===
+# 每个 ROI 块按 "六个波段的块内容哈希 + 过滤参数 + ROI" 建键，缓存块内的有效 ΔNDWI 像素和统计量。
+# 新的 10 月影像到达后，5 月波段和大部分块的键不变，只需重算内容发生变化的块。
+BLOCK_CACHE_DIR = os.getenv("PINEGUARD_BLOCK_CACHE_DIR", os.path.join(core.BASE_DIR, "data", "cache", "blocks"))
+BLOCK_CACHE_MAX_MB = float(os.getenv("PINEGUARD_BLOCK_CACHE_MB", "2048"))
+HASH_INDEX = "band_hashes.json"
+
+
+def _band_paths():
+    return (core.MAY_NIR, core.MAY_SWIR, core.MAY_RED, core.OCT_NIR, core.OCT_SWIR, core.OCT_RED)
+
+
+def _window_tag(window):
+    return f"{int(window.row_off)},{int(window.col_off)},{int(window.height)},{int(window.width)}"
+
+
+def _block_content_hash(path, window, ref_shape, hash_index):
+    """
+    某个波段在某个块内的内容哈希。
+    以解码缓存键 (路径 + mtime + 大小 + 形状) 为前缀记在索引里，文件没变就不用重新读块数据。
+    未命中时只读取这个块 (read_band_window)，不会解码整景影像。
+    """
+    index_key = f"{band_cache.cache_key(path, ref_shape)}:{_window_tag(window)}"
+    if index_key not in hash_index:
+        block = np.ascontiguousarray(core.read_band_window(path, window, ref_shape))
+        hash_index[index_key] = hashlib.blake2b(block.tobytes(), digest_size=16).hexdigest()
+    return hash_index[index_key]
+
+
+def block_key(window, ref_shape, roi, filters, hash_index):
+    """块缓存键: 六个波段的块内容哈希 + ROI 几何 + 过滤参数"""
+    f = core.DEFAULT_FILTERS if filters is None else {**core.DEFAULT_FILTERS, **filters}
+    h = hashlib.blake2b(digest_size=16)
+    for path in _band_paths():
+        h.update(_block_content_hash(path, window, ref_shape, hash_index).encode("ascii"))
+    h.update(json.dumps({"window": _window_tag(window), "roi": roi, "filters": f}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _compute_entry(task):
+    """重算一个块，把有效像素 (全局行列号 + ΔNDWI) 与流式统计量写入 .npz"""
+    window, ref_shape, center_row, center_col, radius_px, filters, path = task
+    delta_ndwi, valid_range_mask = core.compute_block(
+        window, ref_shape, center_row, center_col, radius_px, filters)
+    if delta_ndwi is None:
+        return None
+    stats = core.new_delta_stats(filters).update(delta_ndwi, valid_range_mask)
+    rows, cols = np.where(valid_range_mask)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f,
+                 rows=(rows + int(window.row_off)).astype(np.int32),
+                 cols=(cols + int(window.col_off)).astype(np.int32),
+                 deltas=delta_ndwi[rows, cols].astype(np.float32),
+                 stats=np.array(json.dumps(stats.state())))
+    os.replace(tmp_path, path)
+    return path
+
+
+def analyze_region_incremental(target_lat=37.11, target_lon=-119.74, radius_km=15.0, filters=None,
+                               block_size=tiled_engine.DEFAULT_BLOCK_SIZE, workers=None,
+                               cache_dir=BLOCK_CACHE_DIR):
+    """
+    与 analyze_region 结果一致的增量版本: 只重算输入或参数发生变化的块，
+    其余块直接读取缓存；全局阈值由各块缓存的统计量合并得到。
+    """
+    print(f"🚀 [Incremental] 启动分析: Lat={target_lat}, Lon={target_lon}, Radius={radius_km}km")
+
+    grid = core.reference_grid()
+    if grid is None:
+        return OutbreakPixels.empty()
+    transform, crs, ref_shape = grid
+
+    roi_win, center_row, center_col, radius_px = core.roi_window(
+        transform, crs, ref_shape, target_lat, target_lon, radius_km)
+    if roi_win is None:
+        print("⚠️ ROI 不在影像范围内。")
+        return OutbreakPixels.empty()
+    if any(not os.path.exists(p) for p in _band_paths()):
+        print("❌ 错误: 缺少必要的波段文件")
+        return OutbreakPixels.empty()
+
+    with rasterio.open(core.MAY_NIR) as ref:
+        tile_h, tile_w = ref.block_shapes[0]
+    block_shape = (tiled_engine._aligned_block_size(tile_h, block_size),
+                   tiled_engine._aligned_block_size(tile_w, block_size))
+    windows = tiled_engine.block_windows(roi_win, ref_shape, block_shape, center_row, center_col, radius_px)
+
+    # 1. 计算每个块的键，找出需要重算的块
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, HASH_INDEX)
+    hash_index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            hash_index = json.load(f)
+
+    core.warm_band_cache(ref_shape)
+    roi = [center_row, center_col, radius_px]
+    paths = [os.path.join(cache_dir, block_key(w, ref_shape, roi, filters, hash_index) + ".npz") for w in windows]
+    # 丢掉源文件已经变化 (路径 + mtime + 大小不再匹配) 的哈希，避免索引无限增长
+    live_prefixes = {band_cache.cache_key(p, ref_shape) for p in _band_paths()}
+    hash_index = {k: v for k, v in hash_index.items() if k.split(":", 1)[0] in live_prefixes}
+    with open(index_path, "w") as f:
+        json.dump(hash_index, f)
+
+    stale = [(w, p) for w, p in zip(windows, paths) if not os.path.exists(p)]
+    print(f"🧩 {len(windows)} 个块，其中 {len(stale)} 个需要重算")
+    if stale:
+        tasks = [(w, ref_shape, center_row, center_col, radius_px, filters, p) for w, p in stale]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            if any(result is None for result in pool.map(_compute_entry, tasks)):
+                print("❌ 错误: 缺少必要的波段文件")
+                return OutbreakPixels.empty()
+
+    # 2. 合并各块统计量得到全局阈值
+    stats = core.new_delta_stats(filters)
+    for p in paths:
+        os.utime(p)  # 记录最近使用时间
+        with np.load(p) as entry:
+            stats.merge(RunningStats.from_state(json.loads(str(entry["stats"]))))
+
+    if stats.count == 0:
+        print("✅ 分析完成，发现 0 个风险点。")
+        return OutbreakPixels.empty()
+    threshold = core.threshold_from_stats(stats, filters)
+
+    # 3. 用全局阈值筛选缓存里的有效像素
+    rows, cols, scores = [], [], []
+    for p in paths:
+        with np.load(p) as entry:
+            hit = entry["deltas"] > threshold
+            rows.append(entry["rows"][hit])
+            cols.append(entry["cols"][hit])
+            scores.append(entry["deltas"][hit])
+
+    results_list = core.pack_outbreak_pixels(np.concatenate(rows), np.concatenate(cols),
+                                             np.concatenate(scores), transform, crs)
+    band_cache.evict(cache_dir, BLOCK_CACHE_MAX_MB, suffix=".npz")
+    print(f"✅ 分析完成，发现 {len(results_list)} 个风险点。")
+    return results_list
+
+
+if __name__ == "__main__":
+    results = analyze_region_incremental()
+    print(results[:5])
@@ -0,0 +1,143 @@
+import numpy as np
+from rasterio.warp import transform as warp_transform
+from scipy import ndimage
+
+# 分块大小 (像素)。只为当前块分配布尔掩膜，整景也不会生成全幅 label 图
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def _neighbour_offsets(connectivity):
+    """跨块边界需要检查的邻居方向 (另一半方向是它们的反向，无需重复检查)"""
+    if connectivity == 4:
+        return [(1, 0), (0, 1)]
+    return [(1, -1), (1, 0), (1, 1), (0, 1)]
+
+
+def label_pixels(rows, cols, block_size=DEFAULT_BLOCK_SIZE, connectivity=8):
+    """
+    对稀疏的风险像素做连通域标记。
+    每个块内用 ndimage.label 标记，再用并查集合并跨越块边界的连通域。
+    返回: 与 rows/cols 等长的斑块编号 (0..n-1) 以及斑块数量 n。
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    if rows.size == 0:
+        return np.zeros(0, dtype=np.int64), 0
+
+    lr = rows - rows.min()
+    lc = cols - cols.min()
+    width = int(lc.max()) + 1
+    n_block_cols = (width + block_size - 1) // block_size
+    block_id = (lr // block_size) * n_block_cols + (lc // block_size)
+    structure = ndimage.generate_binary_structure(2, 2 if connectivity == 8 else 1)
+
+    # 1. 块内标记
+    order = np.argsort(block_id, kind="stable")
+    sorted_blocks = block_id[order]
+    starts = np.flatnonzero(np.r_[True, sorted_blocks[1:] != sorted_blocks[:-1]])
+    ends = np.r_[starts[1:], sorted_blocks.size]
+
+    pixel_label = np.zeros(rows.size, dtype=np.int64)
+    next_label = 0
+    for start, end in zip(starts, ends):
+        idx = order[start:end]
+        b = int(sorted_blocks[start])
+        r_base = (b // n_block_cols) * block_size
+        c_base = (b % n_block_cols) * block_size
+        br = lr[idx] - r_base
+        bc = lc[idx] - c_base
+        mask = np.zeros((int(br.max()) + 1, int(bc.max()) + 1), dtype=bool)
+        mask[br, bc] = True
+        labels, n = ndimage.label(mask, structure=structure)
+        pixel_label[idx] = labels[br, bc] - 1 + next_label
+        next_label += n
+
+    # 2. 跨块边界合并: 只检查位于块边缘的像素
+    keys = lr * width + lc
+    key_order = np.argsort(keys)
+    sorted_keys = keys[key_order]
+    on_edge = np.isin(lr % block_size, (0, block_size - 1)) | np.isin(lc % block_size, (0, block_size - 1))
+    edge_idx = np.flatnonzero(on_edge)
+
+    parent = np.arange(next_label)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for dr, dc in _neighbour_offsets(connectivity):
+        nr = lr[edge_idx] + dr
+        nc = lc[edge_idx] + dc
+        inside = (nr >= 0) & (nc >= 0) & (nc < width)
+        src = edge_idx[inside]
+        nkeys = nr[inside] * width + nc[inside]
+        pos = np.searchsorted(sorted_keys, nkeys)
+        pos = np.minimum(pos, sorted_keys.size - 1)
+        hit = sorted_keys[pos] == nkeys
+        dst = key_order[pos[hit]]
+        src = src[hit]
+        cross = block_id[src] != block_id[dst]
+        for a, b in zip(pixel_label[src[cross]], pixel_label[dst[cross]]):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+    # 3. 压缩成连续编号
+    roots = np.array([find(x) for x in range(next_label)], dtype=np.int64)
+    _, patch_id = np.unique(roots[pixel_label], return_inverse=True)
+    return patch_id.ravel(), int(patch_id.max()) + 1
+
+
+def extract_patches(rows, cols, scores, transform, crs, block_size=DEFAULT_BLOCK_SIZE, connectivity=8):
+    """
+    把风险像素聚合成连通斑块，每个斑块一条记录:
+    质心经纬度、像素数/面积、最大与平均压力值、经纬度外包框。按面积从大到小排序。
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    patch_id, n = label_pixels(rows, cols, block_size, connectivity)
+    if n == 0:
+        return []
+
+    count = np.bincount(patch_id, minlength=n)
+    mean_stress = np.bincount(patch_id, weights=scores, minlength=n) / count
+    centroid_row = np.bincount(patch_id, weights=rows, minlength=n) / count
+    centroid_col = np.bincount(patch_id, weights=cols, minlength=n) / count
+    max_stress = np.full(n, -np.inf)
+    np.maximum.at(max_stress, patch_id, scores)
+    min_row = np.full(n, np.iinfo(np.int64).max)
+    min_col = np.full(n, np.iinfo(np.int64).max)
+    max_row = np.full(n, -1)
+    max_col = np.full(n, -1)
+    np.minimum.at(min_row, patch_id, rows)
+    np.minimum.at(min_col, patch_id, cols)
+    np.maximum.at(max_row, patch_id, rows)
+    np.maximum.at(max_col, patch_id, cols)
+
+    # 质心取像素中心；外包框取像素外边缘的四个角
+    cx, cy = transform * (centroid_col + 0.5, centroid_row + 0.5)
+    corner_cols = np.concatenate([min_col, max_col + 1, min_col, max_col + 1])
+    corner_rows = np.concatenate([min_row, min_row, max_row + 1, max_row + 1])
+    kx, ky = transform * (corner_cols, corner_rows)
+    lons, lats = warp_transform(crs, {'init': 'EPSG:4326'},
+                                np.concatenate([cx, kx]), np.concatenate([cy, ky]))
+    lons = np.asarray(lons).reshape(5, n)
+    lats = np.asarray(lats).reshape(5, n)
+    pixel_area = abs(transform.a * transform.e - transform.b * transform.d)
+
+    patches = []
+    for i in np.argsort(-count, kind="stable"):
+        patches.append({
+            "latitude": round(float(lats[0, i]), 6),
+            "longitude": round(float(lons[0, i]), 6),
+            "pixel_count": int(count[i]),
+            "area_m2": round(float(count[i] * pixel_area), 1),
+            "max_stress": round(float(max_stress[i]), 4),
+            "mean_stress": round(float(mean_stress[i]), 4),
+            "bbox": [round(float(lats[1:, i].min()), 6), round(float(lons[1:, i].min()), 6),
+                     round(float(lats[1:, i].max()), 6), round(float(lons[1:, i].max()), 6)],
+        })
+    return patches
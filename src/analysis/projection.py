@@ -0,0 +1,221 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.processing import point_store
+
+# === 战略预测 (2026-2045) ===
+# 在历年 outbreak_count 上一次性拟合趋势 (线性 / 指数 / Logistic)，对所有预测年份做一次向量化预测并给出预测区间；
+# 再用每年独立的 Generator 流批量生成预测点位，结果写成与观测数据相同格式的列式存储，供 app 和 API 直接读取。
+PROJECTION_DIR = os.path.join(point_store.DATA_DIR, "projection")
+SUMMARY_FILE = "summary.json"
+PROJ_YEARS = range(2026, 2046)
+MODELS = ("linear", "exponential", "logistic")
+CONFIDENCE = 0.95
+DEFAULT_SEED = 2026
+CENTER = (37.1174, -119.6043)
+# 与原来的预测逻辑一致: 扩散范围逐年扩大，分数均匀分布在 0.4-0.9
+BASE_SPREAD = 0.08
+SPREAD_PER_YEAR = 0.005
+SCORE_RANGE = (0.4, 0.9)
+# 年份减去该值后再拟合，避免 1984-2045 这样的大数值让 Logistic 拟合病态
+YEAR_ORIGIN = 2000
+
+
+def _t_quantile(dof, confidence=CONFIDENCE):
+    from scipy.stats import t
+    return float(t.ppf(0.5 + confidence / 2, max(dof, 1)))
+
+
+class TrendFit:
+    """拟合结果: predict(years) 返回 (均值, 下界, 上界)，全部是数组"""
+
+    def __init__(self, model, params, predict_fn, aic):
+        self.model = model
+        self.params = params
+        self._predict = predict_fn
+        self.aic = aic
+
+    def predict(self, years):
+        mean, lower, upper = self._predict(np.asarray(years, dtype=np.float64) - YEAR_ORIGIN)
+        return mean, np.maximum(lower, 0.0), upper
+
+
+def _ols(x, y):
+    """一元最小二乘 + 预测区间"""
+    n = x.size
+    x_mean = x.mean()
+    sxx = np.sum((x - x_mean) ** 2)
+    slope = np.sum((x - x_mean) * (y - y.mean())) / sxx
+    intercept = y.mean() - slope * x_mean
+    resid = y - (intercept + slope * x)
+    dof = n - 2
+    s2 = float(np.sum(resid ** 2) / max(dof, 1))
+    tq = _t_quantile(dof)
+
+    def predict(xp):
+        mean = intercept + slope * xp
+        half = tq * np.sqrt(s2 * (1 + 1 / n + (xp - x_mean) ** 2 / sxx))
+        return mean, mean - half, mean + half
+
+    return {"intercept": float(intercept), "slope": float(slope), "sigma": float(np.sqrt(s2))}, predict, resid
+
+
+def _aic(resid, k):
+    n = resid.size
+    return float(n * np.log(max(np.sum(resid ** 2) / n, 1e-12)) + 2 * k)
+
+
+def fit_linear(years, counts):
+    x = np.asarray(years, dtype=np.float64) - YEAR_ORIGIN
+    params, predict, resid = _ols(x, np.asarray(counts, dtype=np.float64))
+    return TrendFit("linear", params, predict, _aic(resid, 2))
+
+
+def fit_exponential(years, counts):
+    """对 log(count) 做线性拟合，区间在对数空间计算后再取指数"""
+    x = np.asarray(years, dtype=np.float64) - YEAR_ORIGIN
+    y = np.asarray(counts, dtype=np.float64)
+    params, log_predict, _ = _ols(x, np.log(np.maximum(y, 1.0)))
+
+    def predict(xp):
+        mean, lower, upper = log_predict(xp)
+        return np.exp(mean), np.exp(lower), np.exp(upper)
+
+    params["growth_rate"] = float(np.expm1(params["slope"]))
+    # AIC 在原始计数空间计算，才能与其他模型比较
+    return TrendFit("exponential", params, predict, _aic(y - predict(x)[0], 2))
+
+
+def _logistic(x, k, r, x0):
+    return k / (1.0 + np.exp(-r * (x - x0)))
+
+
+def fit_logistic(years, counts):
+    """K / (1 + exp(-r (t - t0)))，区间由参数协方差 (delta 方法) 加残差方差得到"""
+    from scipy.optimize import curve_fit
+
+    x = np.asarray(years, dtype=np.float64) - YEAR_ORIGIN
+    y = np.asarray(counts, dtype=np.float64)
+    p0 = [max(y.max() * 2, 1.0), 0.2, float(np.median(x))]
+    bounds = ([max(y.max(), 1e-6), 1e-4, x.min() - 100], [max(y.max(), 1.0) * 100, 5.0, x.max() + 200])
+    popt, pcov = curve_fit(_logistic, x, y, p0=p0, bounds=bounds, maxfev=20000)
+    resid = y - _logistic(x, *popt)
+    dof = x.size - 3
+    s2 = float(np.sum(resid ** 2) / max(dof, 1))
+    tq = _t_quantile(dof)
+
+    def predict(xp):
+        mean = _logistic(xp, *popt)
+        # 数值雅可比 (n_pred x 3)
+        eps = np.maximum(np.abs(popt) * 1e-6, 1e-8)
+        jac = np.stack([(_logistic(xp, *(popt + np.eye(3)[i] * eps[i])) - mean) / eps[i] for i in range(3)], axis=-1)
+        var = np.einsum("ij,jk,ik->i", jac, pcov, jac) + s2
+        half = tq * np.sqrt(var)
+        return mean, mean - half, mean + half
+
+    params = {"capacity": float(popt[0]), "rate": float(popt[1]), "midpoint_year": float(popt[2] + YEAR_ORIGIN),
+              "sigma": float(np.sqrt(s2))}
+    return TrendFit("logistic", params, predict, _aic(resid, 3))
+
+
+FITTERS = {"linear": fit_linear, "exponential": fit_exponential, "logistic": fit_logistic}
+
+
+def fit_trend(years, counts, model="linear"):
+    """model 为 linear / exponential / logistic，或 auto (按 AIC 选最优)"""
+    if model == "auto":
+        fits = []
+        for name in MODELS:
+            try:
+                fits.append(FITTERS[name](years, counts))
+            except (RuntimeError, ValueError):
+                continue
+        return min(fits, key=lambda f: f.aic)
+    if model not in FITTERS:
+        raise ValueError(f"未知的预测模型: {model} (可选 {', '.join(MODELS)}, auto)")
+    return FITTERS[model](years, counts)
+
+
+def generate_fields(years, counts, seed=DEFAULT_SEED, center=CENTER):
+    """
+    为每个预测年份生成点位。每年使用独立的 Generator 流 (SeedSequence([seed, year]))，
+    因此任意一年的结果与其他年份的点数无关、可单独复现。返回四列数组 (year, lat, lon, score)。
+    """
+    years = np.asarray(years, dtype=np.int64)
+    counts = np.maximum(np.asarray(counts, dtype=np.int64), 0)
+    total = int(counts.sum())
+    # 每年一次性抽取 [lat, lon, score] 三列均匀数，然后整体做仿射变换
+    uniform = np.empty((total, 3), dtype=np.float64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    for year, start, stop in zip(years.tolist(), offsets[:-1].tolist(), offsets[1:].tolist()):
+        np.random.default_rng([seed, year]).random(out=uniform[start:stop])
+    year_col = np.repeat(years, counts)
+    spread = BASE_SPREAD + (year_col - 2025) * SPREAD_PER_YEAR
+    lat = center[0] + (2 * uniform[:, 0] - 1) * spread
+    lon = center[1] + (2 * uniform[:, 1] - 1) * spread
+    score = SCORE_RANGE[0] + uniform[:, 2] * (SCORE_RANGE[1] - SCORE_RANGE[0])
+    return year_col, lat, lon, score
+
+
+def _summary_path(out_dir):
+    return os.path.join(out_dir, SUMMARY_FILE)
+
+
+def build_projection(store=None, model="linear", seed=DEFAULT_SEED, years=PROJ_YEARS, out_dir=PROJECTION_DIR):
+    """拟合 + 批量生成，写出 out_dir/{model}/summary.json 与 out_dir/{model}/points 列式存储"""
+    store = store if store is not None else point_store.open_store()
+    if store is None:
+        return None
+    hist_years = np.array(sorted(store.years), dtype=np.int64)
+    hist_counts = np.array([store.outbreak_count(y) for y in hist_years], dtype=np.float64)
+    fit = fit_trend(hist_years, hist_counts, model)
+    years = np.asarray(list(years), dtype=np.int64)
+    mean, lower, upper = fit.predict(years)
+    counts = np.maximum(mean, 0).astype(np.int64)
+
+    model_dir = os.path.join(out_dir, model)
+    year_col, lat, lon, score = generate_fields(years, counts, seed)
+    point_store.write_store(year_col, lat, lon, score, os.path.join(model_dir, "points"),
+                            counts={int(y): int(c) for y, c in zip(years, counts)})
+    summary = {
+        "source": list(store.signature), "model": model, "fitted_model": fit.model, "seed": seed,
+        "params": fit.params, "aic": fit.aic, "confidence": CONFIDENCE,
+        "years": years.tolist(), "count": counts.tolist(),
+        "expected": mean.tolist(), "lower": lower.tolist(), "upper": upper.tolist(),
+    }
+    # 与 write_store 一样每个写入者用唯一的临时文件，并发重建时不会互相覆盖
+    fd, tmp_path = tempfile.mkstemp(prefix=SUMMARY_FILE + ".", suffix=".tmp", dir=model_dir)
+    with os.fdopen(fd, "w") as f:
+        json.dump(summary, f)
+    os.chmod(tmp_path, 0o644)       # mkstemp 默认 0600
+    os.replace(tmp_path, _summary_path(model_dir))
+    print(f"🔮 预测完成 ({fit.model}): {years[0]}-{years[-1]}，共 {int(counts.sum())} 个预测点")
+    return summary
+
+
+def load_projection(store=None, model="linear", seed=DEFAULT_SEED, out_dir=PROJECTION_DIR):
+    """
+    读取缓存的预测结果 (summary, PointStore)；观测数据、模型或种子变化时自动重建。
+    没有观测数据时返回 (None, None)。
+    """
+    store = store if store is not None else point_store.open_store()
+    if store is None:
+        return None, None
+    model_dir = os.path.join(out_dir, model)
+    summary = None
+    if os.path.exists(_summary_path(model_dir)):
+        with open(_summary_path(model_dir), "r") as f:
+            summary = json.load(f)
+    if (summary is None or summary.get("source") != list(store.signature) or summary.get("seed") != seed
+            or not os.path.exists(os.path.join(model_dir, "points", point_store.MANIFEST))):
+        summary = build_projection(store, model, seed, out_dir=out_dir)
+    return summary, point_store.PointStore(os.path.join(model_dir, "points"))
+
+
+if __name__ == "__main__":
+    for name in MODELS:
+        s, _ = load_projection(model=name)
+        print(f"{name}: 2045 -> {s['count'][-1]} ({s['lower'][-1]:.0f} - {s['upper'][-1]:.0f})")
@@ -0,0 +1,67 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+DEFAULT_CONDITION = "Water Stressed"
+
+
+class OutbreakPixels(Sequence):
+    """
+    analyze_region 的列式结果: latitude / longitude / stress_score / row / col 各为一列 NumPy 数组。
+    同时保留旧接口: 按下标访问或迭代时才临时生成 {"latitude", "longitude", "stress_score", "condition"} 字典。
+    """
+
+    def __init__(self, latitude, longitude, stress_score, row, col, condition=DEFAULT_CONDITION):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.stress_score = np.asarray(stress_score, dtype=np.float64)
+        self.row = np.asarray(row, dtype=np.int32)
+        self.col = np.asarray(col, dtype=np.int32)
+        self.condition = condition
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [])
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return OutbreakPixels(self.latitude[index], self.longitude[index], self.stress_score[index],
+                                  self.row[index], self.col[index], self.condition)
+        return {
+            "latitude": float(self.latitude[index]),
+            "longitude": float(self.longitude[index]),
+            "stress_score": float(self.stress_score[index]),
+            "condition": self.condition,
+        }
+
+    def __repr__(self):
+        return f"OutbreakPixels(n={len(self)})"
+
+    def columns(self, include_pixel=False):
+        """以 dict 形式返回各列数组"""
+        cols = {"latitude": self.latitude, "longitude": self.longitude, "stress_score": self.stress_score}
+        if include_pixel:
+            cols.update(row=self.row, col=self.col)
+        return cols
+
+    def to_list(self):
+        """一次性展开成 List[Dict] (用于 JSON 序列化)"""
+        return [
+            {"latitude": lat, "longitude": lon, "stress_score": score, "condition": self.condition}
+            for lat, lon, score in zip(self.latitude.tolist(), self.longitude.tolist(), self.stress_score.tolist())
+        ]
+
+    def to_frame(self, include_pixel=False):
+        """转换为 pandas DataFrame"""
+        import pandas as pd
+        df = pd.DataFrame(self.columns(include_pixel))
+        df.insert(3, "condition", self.condition)
+        return df
+
+    def to_arrow(self, include_pixel=False):
+        """转换为 pyarrow.Table (需要安装 pyarrow)"""
+        import pyarrow as pa
+        return pa.table(self.columns(include_pixel))
@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+
+from src.analysis import geo
+from src.processing import point_store
+
+# === 风险密度栅格 ===
+# 每个年份在固定经纬网格上计算 stress_score 加权的核密度:
+# 先把点按权重装箱成二维直方图 (O(点数))，再与高斯核做 FFT 卷积 (O(格网 log 格网))，与点数无关。
+# 全部年份存成一个压缩的三维数组 (year, lat, lon)，app 直接把某一年渲染成图片叠加层，API 按坐标 O(1) 查值。
+# 网格范围取自数据本身 (全部年份的经纬度范围再向外留出核的截断半径)，与栅格一起保存。
+RISK_PATH = os.path.join(point_store.DATA_DIR, "risk_surface.npz")
+CENTER = (37.1174, -119.6043)
+# 没有数据时使用的默认范围
+HALF_EXTENT_DEG = 0.3
+CELL_DEG = 0.0025               # 约 280 m
+MAX_CELLS = 2048                # 单边最多的格子数，范围过大时自动放粗分辨率
+BANDWIDTH_KM = 1.5
+KERNEL_SIGMAS = 3               # 核截断在 3 个标准差
+BOUNDS = (CENTER[0] - HALF_EXTENT_DEG, CENTER[1] - HALF_EXTENT_DEG,
+          CENTER[0] + HALF_EXTENT_DEG, CENTER[1] + HALF_EXTENT_DEG)
+
+
+def data_bounds(latitude, longitude, cell_deg=CELL_DEG, bandwidth_km=BANDWIDTH_KM):
+    """
+    覆盖全部点的网格范围与分辨率 (bounds, cell_deg)：经纬度范围向外扩展 KERNEL_SIGMAS 个带宽，
+    并对齐到格子边界；单边超过 MAX_CELLS 时按比例放粗分辨率。没有点时返回默认范围。
+    """
+    lat, lon = np.asarray(latitude, dtype=np.float64), np.asarray(longitude, dtype=np.float64)
+    if lat.size == 0:
+        return BOUNDS, cell_deg
+    min_lat, max_lat, min_lon, max_lon = float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max())
+    pad_lat = np.degrees(KERNEL_SIGMAS * bandwidth_km * 1000.0 / geo.EARTH_RADIUS_M)
+    cos_lat = max(np.cos(np.radians(max(abs(min_lat), abs(max_lat)))), 1e-6)
+    pad_lon = pad_lat / cos_lat
+    span = max(max_lat - min_lat + 2 * pad_lat, max_lon - min_lon + 2 * pad_lon)
+    cell_deg = max(cell_deg, span / MAX_CELLS)
+    snap = lambda v, fn: float(fn(v / cell_deg) * cell_deg)
+    bounds = (snap(min_lat - pad_lat, np.floor), snap(min_lon - pad_lon, np.floor),
+              snap(max_lat + pad_lat, np.ceil), snap(max_lon + pad_lon, np.ceil))
+    return bounds, cell_deg
+
+
+def grid_shape(bounds=BOUNDS, cell_deg=CELL_DEG):
+    """(行数, 列数)，行对应纬度 (从南到北)，列对应经度 (从西到东)"""
+    return (int(round((bounds[2] - bounds[0]) / cell_deg)), int(round((bounds[3] - bounds[1]) / cell_deg)))
+
+
+def cell_size_km(bounds=BOUNDS, cell_deg=CELL_DEG):
+    """网格中心纬度处单元格的 (南北, 东西) 边长 (km)"""
+    lat0 = np.radians((bounds[0] + bounds[2]) / 2)
+    dy = np.radians(cell_deg) * geo.EARTH_RADIUS_M / 1000.0
+    return dy, dy * np.cos(lat0)
+
+
+def gaussian_kernel(bandwidth_km=BANDWIDTH_KM, bounds=BOUNDS, cell_deg=CELL_DEG):
+    """按单元格实际边长缩放的二维高斯核，积分为 1 (单位 1/km²)"""
+    dy, dx = cell_size_km(bounds, cell_deg)
+    ry = max(1, int(np.ceil(KERNEL_SIGMAS * bandwidth_km / dy)))
+    rx = max(1, int(np.ceil(KERNEL_SIGMAS * bandwidth_km / dx)))
+    y = np.arange(-ry, ry + 1) * dy
+    x = np.arange(-rx, rx + 1) * dx
+    kernel = np.exp(-0.5 * (y[:, None] ** 2 + x[None, :] ** 2) / bandwidth_km ** 2)
+    return kernel / (kernel.sum() * dy * dx)
+
+
+def density(lat, lon, score, bounds=BOUNDS, cell_deg=CELL_DEG, kernel=None):
+    """一组点的加权核密度 (单位: stress_score / km²)，形状为 grid_shape()"""
+    from scipy.signal import fftconvolve
+
+    shape = grid_shape(bounds, cell_deg)
+    hist, _, _ = np.histogram2d(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64),
+                                bins=shape, range=[[bounds[0], bounds[2]], [bounds[1], bounds[3]]],
+                                weights=np.asarray(score, dtype=np.float64))
+    if not hist.any():
+        return np.zeros(shape, dtype=np.float32)
+    kernel = gaussian_kernel(bounds=bounds, cell_deg=cell_deg) if kernel is None else kernel
+    # FFT 卷积会带来 ~1e-17 的负值噪声
+    return np.maximum(fftconvolve(hist, kernel, mode="same"), 0.0).astype(np.float32)
+
+
+class RiskSurface:
+    """多年份密度栅格: grids[i] 对应 years[i]，bounds = (min_lat, min_lon, max_lat, max_lon)"""
+
+    def __init__(self, years, grids, bounds=BOUNDS, cell_deg=CELL_DEG, bandwidth_km=BANDWIDTH_KM, signature=None):
+        self.years = [int(y) for y in years]
+        self.grids = grids
+        self.bounds = tuple(float(b) for b in bounds)
+        self.cell_deg = float(cell_deg)
+        self.bandwidth_km = float(bandwidth_km)
+        self.signature = signature
+        self._year_pos = {y: i for i, y in enumerate(self.years)}
+        # 全部年份共用一个最大值做归一化，年份之间的颜色可以直接比较
+        self.max_density = float(grids.max()) if grids.size else 0.0
+
+    def __contains__(self, year):
+        return int(year) in self._year_pos
+
+    def grid(self, year):
+        return self.grids[self._year_pos[int(year)]]
+
+    def cell(self, lat, lon):
+        """坐标所在的 (行, 列)；落在网格外时返回 None"""
+        row = int(np.floor((lat - self.bounds[0]) / self.cell_deg))
+        col = int(np.floor((lon - self.bounds[1]) / self.cell_deg))
+        rows, cols = self.grids.shape[1:]
+        if not (0 <= row < rows and 0 <= col < cols):
+            return None
+        return row, col
+
+    def value_at(self, lat, lon, year):
+        """(密度, 0-1 归一化风险)；年份不存在时抛 KeyError，坐标在网格外时密度为 0"""
+        grid = self.grid(year)
+        cell = self.cell(lat, lon)
+        value = float(grid[cell]) if cell is not None else 0.0
+        return value, (value / self.max_density if self.max_density > 0 else 0.0)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, years=np.asarray(self.years, dtype=np.int16), grids=self.grids,
+                            bounds=np.asarray(self.bounds), cell_deg=self.cell_deg,
+                            bandwidth_km=self.bandwidth_km, signature=np.asarray(self.signature or []))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["years"], f["grids"], f["bounds"], float(f["cell_deg"]), float(f["bandwidth_km"]),
+                       f["signature"].tolist())
+
+
+def build_surfaces(store=None, path=RISK_PATH, bounds=None, cell_deg=CELL_DEG):
+    """为 store 中的每个年份计算密度栅格并写入 path；bounds 为 None 时由 data_bounds 按数据范围确定"""
+    store = store if store is not None else point_store.open_store()
+    if store is None:
+        return None
+    if bounds is None:
+        bounds, cell_deg = data_bounds(store.latitude, store.longitude, cell_deg)
+    years = sorted(store.years)
+    kernel = gaussian_kernel(bounds=bounds, cell_deg=cell_deg)
+    grids = np.zeros((len(years),) + grid_shape(bounds, cell_deg), dtype=np.float32)
+    for i, y in enumerate(years):
+        cols = store.year_columns(y)
+        grids[i] = density(cols["latitude"], cols["longitude"], cols["stress_score"], bounds, cell_deg, kernel)
+    surface = RiskSurface(years, grids, bounds, cell_deg, BANDWIDTH_KM, list(store.signature))
+    surface.save(path)
+    print(f"🗺️ 风险栅格: {len(years)} 个年份, 网格 {grids.shape[1]}x{grids.shape[2]} -> {path}")
+    return surface
+
+
+def load_surfaces(store=None, path=RISK_PATH):
+    """读取缓存的栅格；store 的数据签名变化 (或文件不存在) 时重新计算"""
+    store = store if store is not None else point_store.open_store()
+    if store is None:
+        return None
+    if os.path.exists(path):
+        try:
+            surface = RiskSurface.load(path)
+            bounds, cell_deg = data_bounds(store.latitude, store.longitude)
+            if (surface.signature == list(store.signature) and surface.bounds == bounds
+                    and surface.cell_deg == cell_deg and surface.bandwidth_km == BANDWIDTH_KM):
+                return surface
+        except (OSError, ValueError, KeyError):
+            pass
+    return build_surfaces(store, path)
+
+
+if __name__ == "__main__":
+    s = load_surfaces()
+    for y in s.years[::10]:
+        print(f"{y}: 中心风险 {s.value_at(CENTER[0], CENTER[1], y)[1]:.3f}")
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from src.analysis import geo
+from src.processing import point_store
+
+# === 扩散速度分析 ===
+# 对相邻两个观测年份的点集做比较:
+# - 前沿速度: 每个新点到上一年最近点的距离 (KD 树最近邻，O(n log n))，取 P90 作为前沿，中位数作为整体
+# - 回转半径 (按 stress_score 加权) 与凸包等效半径的逐年增长
+# 结果按 "本年 + 上一年的数据哈希" 缓存到 data/processed/velocity.json，追加新年份时只重算受影响的年份。
+VELOCITY_PATH = os.path.join(point_store.DATA_DIR, "velocity.json")
+CACHE_VERSION = 1
+FRONT_PERCENTILE = 90
+
+
+def radius_of_gyration_km(lat, lon, weights=None):
+    """加权回转半径 (km)：各点到加权质心距离平方的加权均值再开方"""
+    centroid = geo.weighted_centroid(lat, lon, weights)
+    if centroid is None:
+        return 0.0
+    d = geo.haversine_km(centroid[0], centroid[1], lat, lon)
+    w = np.ones_like(d) if weights is None else np.asarray(weights, dtype=np.float64)
+    return float(np.sqrt(np.dot(w, d ** 2) / w.sum()))
+
+
+def nearest_prior_km(lat, lon, prior_lat, prior_lon):
+    """每个新点到上一年点集的最近距离 (km)"""
+    from scipy.spatial import cKDTree
+
+    lat0, lon0 = float(np.mean(prior_lat)), float(np.mean(prior_lon))
+    tree = cKDTree(np.column_stack(geo.local_xy(prior_lat, prior_lon, lat0, lon0)))
+    dist, _ = tree.query(np.column_stack(geo.local_xy(lat, lon, lat0, lon0)), k=1)
+    return dist / 1000.0
+
+
+def year_metrics(lat, lon, score, prior=None, dt=1, prior_metrics=None):
+    """
+    单个年份的扩散指标。prior 为上一观测年份的 (lat, lon, score)，dt 为间隔年数；
+    prior_metrics 为上一年份已经算好的指标 (省略时现算)。
+    没有上一年份 (或任一年份没有点) 时速度为 0。
+    """
+    lat, lon, score = (np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64),
+                       np.asarray(score, dtype=np.float64))
+    rg = radius_of_gyration_km(lat, lon, score)
+    hull_area = geo.convex_hull(lat, lon)[1] / 1e6 if lat.size >= 3 else 0.0
+    metrics = {
+        "count": int(lat.size),
+        "radius_of_gyration_km": rg,
+        "hull_area_km2": hull_area,
+        "hull_radius_km": float(np.sqrt(hull_area / np.pi)),
+        "front_velocity_km_yr": 0.0,
+        "median_velocity_km_yr": 0.0,
+        "gyration_growth_km_yr": 0.0,
+        "hull_growth_km_yr": 0.0,
+    }
+    if prior is None or lat.size == 0 or len(prior[0]) == 0:
+        return metrics
+    dist = nearest_prior_km(lat, lon, prior[0], prior[1])
+    prior_metrics = prior_metrics or year_metrics(*prior)
+    metrics.update(
+        front_velocity_km_yr=float(np.percentile(dist, FRONT_PERCENTILE)) / dt,
+        median_velocity_km_yr=float(np.median(dist)) / dt,
+        gyration_growth_km_yr=(rg - prior_metrics["radius_of_gyration_km"]) / dt,
+        hull_growth_km_yr=(metrics["hull_radius_km"] - prior_metrics["hull_radius_km"]) / dt,
+    )
+    return metrics
+
+
+def _columns_hash(cols):
+    """与行顺序无关的内容哈希 (重写存储时同一年份内的排序可能改变)"""
+    order = np.lexsort((cols["stress_score"], cols["longitude"], cols["latitude"]))
+    h = hashlib.blake2b(digest_size=16)
+    for name in ("latitude", "longitude", "stress_score"):
+        h.update(np.ascontiguousarray(np.asarray(cols[name], dtype=np.float64)[order]).tobytes())
+    return h.hexdigest()
+
+
+def _load_cache(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") == CACHE_VERSION:
+                return cache
+        except (OSError, ValueError):
+            pass
+    return {"version": CACHE_VERSION, "years": {}}
+
+
+def compute_velocity(store=None, cache_path=VELOCITY_PATH):
+    """
+    全部观测年份的扩散指标 {year: metrics}。
+    只重算 "本年或上一年数据发生变化" 的年份，其余直接读缓存。
+    """
+    store = store if store is not None else point_store.open_store()
+    if store is None:
+        return {}
+    cache = _load_cache(cache_path)
+    cached = cache["years"]
+    years = sorted(store.years)
+    hashes = {y: _columns_hash(store.year_columns(y)) for y in years}
+
+    results, recomputed = {}, 0
+    for i, y in enumerate(years):
+        prior_year = years[i - 1] if i else None
+        key = f"{hashes[y]}:{hashes[prior_year] if prior_year is not None else '-'}"
+        entry = cached.get(str(y))
+        if entry is None or entry.get("key") != key:
+            cols = store.year_columns(y)
+            prior = None
+            if prior_year is not None:
+                p = store.year_columns(prior_year)
+                prior = (p["latitude"], p["longitude"], p["stress_score"])
+            metrics = year_metrics(cols["latitude"], cols["longitude"], cols["stress_score"], prior,
+                                   dt=(y - prior_year) if prior_year is not None else 1,
+                                   prior_metrics=results.get(prior_year))
+            entry = {"key": key, "prior_year": prior_year, **metrics}
+            recomputed += 1
+        results[y] = entry
+
+    if recomputed or set(cached) != {str(y) for y in years}:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "years": {str(y): e for y, e in results.items()}}, f)
+        os.replace(tmp_path, cache_path)
+        print(f"📐 扩散速度: 重算 {recomputed} / {len(years)} 个年份")
+    return results
+
+
+if __name__ == "__main__":
+    for year, m in compute_velocity().items():
+        print(f"{year}: front {m['front_velocity_km_yr']:.2f} km/yr, Rg {m['radius_of_gyration_km']:.2f} km")
@@ -0,0 +1,125 @@
+import numpy as np
+
+# update() 每段处理的元素数 (约 8 MB 的 float64 临时数组)
+CHUNK_ELEMENTS = 1 << 20
+
+
+class RunningStats:
+    """
+    流式统计量累加器 (Welford / Chan 并行合并)。
+    逐块喂入数据即可得到全局均值与标准差，不需要把所有像素拷贝成一个大数组；
+    多个进程各自累加后可以直接 merge。
+    传入 hist_range 时额外维护一个定宽直方图，用于近似分位数。
+    """
+
+    def __init__(self, hist_range=None, bins=4096):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.hist_range = None if hist_range is None else (float(hist_range[0]), float(hist_range[1]))
+        self.hist = None if hist_range is None else np.zeros(bins, dtype=np.int64)
+
+    def update(self, values, mask=None):
+        """
+        累加一块数据；mask 为 True 的位置才参与统计。
+        按行分段处理 (每段约 CHUNK_ELEMENTS 个元素)，临时数组的大小与输入无关。
+        """
+        values = np.asarray(values)
+        if values.ndim == 0:
+            values = values.reshape(1)
+        if mask is not None:
+            mask = np.broadcast_to(np.asarray(mask, dtype=bool), values.shape)
+        row_size = max(1, values.size // max(1, values.shape[0]))
+        step = max(1, CHUNK_ELEMENTS // row_size)
+        for start in range(0, values.shape[0], step):
+            chunk = values[start:start + step]
+            self._update_chunk(chunk, ~np.isnan(chunk) if mask is None else mask[start:start + step])
+        return self
+
+    def _update_chunk(self, values, mask):
+        n = int(np.count_nonzero(mask))
+        if n == 0:
+            return
+        block_mean = float(np.sum(values, where=mask, dtype=np.float64)) / n
+        deviation = np.subtract(values, block_mean, dtype=np.float64)
+        np.square(deviation, out=deviation)
+        block_m2 = float(np.sum(deviation, where=mask))
+
+        if self.hist is not None:
+            lo, hi = self.hist_range
+            bins = len(self.hist)
+            idx = ((values[mask] - lo) * (bins / (hi - lo))).astype(np.int64)
+            np.clip(idx, 0, bins - 1, out=idx)
+            self.hist += np.bincount(idx, minlength=bins)
+
+        self._combine(n, block_mean, block_m2)
+
+    def merge(self, other):
+        """合并另一个累加器 (例如来自其他进程的分块结果)"""
+        if other.count == 0:
+            return self
+        if other.hist is not None:
+            if self.hist is None:
+                self.hist_range = other.hist_range
+                self.hist = other.hist.copy()
+            else:
+                self.hist += other.hist
+        self._combine(other.count, other.mean, other.m2)
+        return self
+
+    def state(self):
+        """导出为可持久化的 dict (用于分块结果缓存)"""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "hist_range": self.hist_range,
+            "hist": None if self.hist is None else self.hist.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """从 state() 的结果恢复累加器"""
+        stats = cls()
+        stats.count = int(state["count"])
+        stats.mean = float(state["mean"])
+        stats.m2 = float(state["m2"])
+        if state.get("hist") is not None:
+            stats.hist_range = tuple(state["hist_range"])
+            stats.hist = np.asarray(state["hist"], dtype=np.int64)
+        return stats
+
+    def _combine(self, n_b, mean_b, m2_b):
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * n_a * n_b / n
+        self.count = n
+
+    @property
+    def variance(self):
+        """总体方差 (ddof=0，与 np.nanstd 一致)"""
+        return self.m2 / self.count if self.count else float("nan")
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance))
+
+    def quantile(self, q):
+        """基于直方图的近似分位数 (q 取 0-1)，误差不超过一个 bin 宽"""
+        if self.hist is None:
+            raise ValueError("quantile() 需要在创建时指定 hist_range")
+        total = int(self.hist.sum())
+        if total == 0:
+            return float("nan")
+        lo, hi = self.hist_range
+        width = (hi - lo) / len(self.hist)
+        cumulative = np.cumsum(self.hist)
+        target = q * total
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        i = min(i, len(self.hist) - 1)
+        below = cumulative[i - 1] if i > 0 else 0
+        inside = self.hist[i]
+        frac = (target - below) / inside if inside else 0.0
+        return lo + (i + frac) * width
@@ -0,0 +1,130 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from src.analysis import detect_outbreak as core
+from src.analysis.results import OutbreakPixels
+
+# 默认块大小 (像素)。会向上取整到 JP2 内部瓦片大小的整数倍
+DEFAULT_BLOCK_SIZE = 2048
+
+
+def _aligned_block_size(tile_size, block_size):
+    """把块大小对齐到 JP2 内部瓦片 (例如 S2 的 1024x1024)"""
+    if tile_size <= 0:
+        return block_size
+    return max(1, int(np.ceil(block_size / tile_size))) * tile_size
+
+
+def block_windows(roi_win, ref_shape, block_shape, center_row, center_col, radius_px):
+    """
+    把 ROI 窗口切成与全局瓦片网格对齐的块。
+    完全落在圆形 ROI 之外的块直接跳过，不产生任何 I/O。
+    """
+    height, width = ref_shape
+    block_h, block_w = block_shape
+    row0, col0 = int(roi_win.row_off), int(roi_win.col_off)
+    row1, col1 = row0 + int(roi_win.height), col0 + int(roi_win.width)
+
+    windows = []
+    for r in range((row0 // block_h) * block_h, row1, block_h):
+        for c in range((col0 // block_w) * block_w, col1, block_w):
+            r_start, r_stop = max(r, row0), min(r + block_h, row1, height)
+            c_start, c_stop = max(c, col0), min(c + block_w, col1, width)
+            if r_start >= r_stop or c_start >= c_stop:
+                continue
+            # 块内离圆心最近的点也在半径外 -> 跳过
+            near_r = min(max(center_row, r_start), r_stop - 1)
+            near_c = min(max(center_col, c_start), c_stop - 1)
+            if (near_r - center_row) ** 2 + (near_c - center_col) ** 2 > radius_px ** 2:
+                continue
+            windows.append(Window(c_start, r_start, c_stop - c_start, r_stop - r_start))
+    return windows
+
+
+def _block_stats(task):
+    """第一遍: 只返回块内有效 ΔNDWI 的流式统计量，不保留像素"""
+    window, ref_shape, center_row, center_col, radius_px, filters = task
+    delta_ndwi, valid_range_mask = core.compute_block(
+        window, ref_shape, center_row, center_col, radius_px, filters)
+    if delta_ndwi is None:
+        return None
+    return core.new_delta_stats(filters).update(delta_ndwi, valid_range_mask)
+
+
+def _block_outbreaks(task):
+    """第二遍: 用全局阈值筛出块内的风险像素 (返回整幅影像的行列号)"""
+    window, ref_shape, center_row, center_col, radius_px, filters, threshold = task
+    delta_ndwi, valid_range_mask = core.compute_block(
+        window, ref_shape, center_row, center_col, radius_px, filters)
+    if delta_ndwi is None:
+        return None
+    rows, cols = np.where(valid_range_mask & (delta_ndwi > threshold))
+    scores = delta_ndwi[rows, cols]
+    return (rows + int(window.row_off)).astype(np.int32), (cols + int(window.col_off)).astype(np.int32), scores
+
+
+def analyze_region_tiled(target_lat=37.11, target_lon=-119.74, radius_km=15.0,
+                         block_size=DEFAULT_BLOCK_SIZE, workers=None, filters=None):
+    """
+    analyze_region 的分块 + 多进程版本，适合大半径或整景扫描。
+    峰值内存约为 块大小 x 进程数，返回格式与 analyze_region 相同。
+    """
+    print(f"🚀 [Tiled Engine] 启动分析: Lat={target_lat}, Lon={target_lon}, Radius={radius_km}km")
+
+    grid = core.reference_grid()
+    if grid is None:
+        return OutbreakPixels.empty()
+    transform, crs, ref_shape = grid
+
+    roi_win, center_row, center_col, radius_px = core.roi_window(
+        transform, crs, ref_shape, target_lat, target_lon, radius_km)
+    if roi_win is None:
+        print("⚠️ ROI 不在影像范围内。")
+        return OutbreakPixels.empty()
+
+    with rasterio.open(core.MAY_NIR) as ref:
+        tile_h, tile_w = ref.block_shapes[0]
+    block_shape = (_aligned_block_size(tile_h, block_size), _aligned_block_size(tile_w, block_size))
+    windows = block_windows(roi_win, ref_shape, block_shape, center_row, center_col, radius_px)
+    workers = workers or os.cpu_count() or 1
+    print(f"🧩 {len(windows)} 个块 ({block_shape[0]}x{block_shape[1]})，{workers} 个进程")
+
+    core.warm_band_cache(ref_shape)
+    base = (ref_shape, center_row, center_col, radius_px, filters)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 第一遍: 汇总全局统计量
+        stats = core.new_delta_stats(filters)
+        for part in pool.map(_block_stats, [(w,) + base for w in windows]):
+            if part is None:
+                print("❌ 错误: 缺少必要的波段文件")
+                return OutbreakPixels.empty()
+            stats.merge(part)
+
+        if stats.count == 0:
+            print("✅ 分析完成，发现 0 个风险点。")
+            return OutbreakPixels.empty()
+
+        threshold = core.threshold_from_stats(stats, filters)
+
+        # 第二遍: 输出风险像素
+        rows, cols, scores = [], [], []
+        for part in pool.map(_block_outbreaks, [(w,) + base + (threshold,) for w in windows]):
+            rows.append(part[0])
+            cols.append(part[1])
+            scores.append(part[2])
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    scores = np.concatenate(scores)
+    results_list = core.pack_outbreak_pixels(rows, cols, scores, transform, crs)
+    print(f"✅ 分析完成，发现 {len(results_list)} 个风险点。")
+    return results_list
+
+
+if __name__ == "__main__":
+    results = analyze_region_tiled()
+    print(results[:5])
@@ -0,0 +1,215 @@
+import glob
+import json
+import os
+import re
+from datetime import date as Date
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import Affine, array_bounds
+from rasterio.windows import Window
+
+from src.analysis import detect_outbreak as core
+
+# === 路径配置 ===
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMG_DIR = os.path.join(BASE_DIR, "data", "images")
+CUBE_DIR = os.path.join(BASE_DIR, "data", "cube")
+
+# 指数以 int16 存储: value * SCALE，无效值为 NODATA
+SCALE = 10000.0
+NODATA = -32768
+INDICES = ("ndvi", "ndwi")
+BLOCK_ROWS = 1024
+
+SCENE_PATTERN = re.compile(r"SJER_(\d{4}-\d{2}-\d{2})_(B04|B08|B11)_(10m|20m)\.jp2$")
+BAND_KEYS = {"B04": "red", "B08": "nir", "B11": "swir"}
+
+
+def discover_scenes(img_dir=IMG_DIR):
+    """扫描 batch_downloader 提取出的 SJER_{date}_Bxx 文件，返回 {date: {red, nir, swir}} (只保留三个波段齐全的日期)"""
+    scenes = {}
+    for path in glob.glob(os.path.join(img_dir, "SJER_*_B*_*.jp2")):
+        m = SCENE_PATTERN.search(os.path.basename(path))
+        if m:
+            scenes.setdefault(m.group(1), {})[BAND_KEYS[m.group(2)]] = path
+    return {d: bands for d, bands in sorted(scenes.items()) if len(bands) == 3}
+
+
+def _encode(values):
+    """float 指数 -> 缩放后的 int16 (NaN/inf 写成 NODATA)"""
+    out = np.full(values.shape, NODATA, dtype=np.int16)
+    ok = np.isfinite(values)
+    out[ok] = np.rint(np.clip(values[ok], -1.0, 1.0) * SCALE).astype(np.int16)
+    return out
+
+
+class IndexCube:
+    """
+    NDVI / NDWI 的时序数据立方体 (time x y x x)。
+    每个日期每个指数单独一个 int16 .npy 文件 (时间维上天然分块)，manifest.json 记录日期与地理参考。
+    追加新影像只写入新的日期切片，不会重算历史。
+    """
+
+    def __init__(self, cube_dir=CUBE_DIR):
+        self.cube_dir = cube_dir
+        self.manifest_path = os.path.join(cube_dir, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"dates": [], "shape": None, "transform": None, "crs": None,
+                             "scale": SCALE, "nodata": NODATA}
+
+    @property
+    def dates(self):
+        return list(self.manifest["dates"])
+
+    @property
+    def shape(self):
+        return tuple(self.manifest["shape"]) if self.manifest["shape"] else None
+
+    def _slice_path(self, index, acq_date):
+        return os.path.join(self.cube_dir, f"{index}_{acq_date}.npy")
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def append(self, acq_date, red_path, nir_path, swir_path, block_rows=BLOCK_ROWS):
+        """追加一个日期；已存在的日期直接跳过。返回是否真的写入了新数据"""
+        if acq_date in self.manifest["dates"]:
+            print(f"⏩ 已在数据立方体中: {acq_date}")
+            return False
+        if any(not os.path.exists(p) for p in (red_path, nir_path, swir_path)):
+            print(f"❌ 缺少波段文件，跳过 {acq_date}")
+            return False
+
+        if self.shape is None:
+            with rasterio.open(nir_path) as ref:
+                self.manifest["shape"] = [ref.height, ref.width]
+                self.manifest["transform"] = list(ref.transform)[:6]
+                self.manifest["crs"] = ref.crs.to_wkt()
+        elif not self._same_grid(nir_path, red_path, swir_path):
+            return False
+        shape = self.shape
+
+        os.makedirs(self.cube_dir, exist_ok=True)
+        outputs = {index: np.lib.format.open_memmap(self._slice_path(index, acq_date) + ".tmp",
+                                                     mode="w+", dtype=np.int16, shape=shape)
+                   for index in INDICES}
+        # 分块计算，临时数组只有 block_rows 行
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for r in range(0, shape[0], block_rows):
+                rows = slice(r, min(r + block_rows, shape[0]))
+                # 每次只读取这一行块 (B11 在窗口内重采样到 10m)，不会把整景解码进内存
+                window = Window(0, r, shape[1], rows.stop - r)
+                n, red_b, swir_b = (core.read_band_window(p, window, shape) for p in (nir_path, red_path, swir_path))
+                outputs["ndvi"][rows] = _encode((n - red_b) / (n + red_b))
+                outputs["ndwi"][rows] = _encode((n - swir_b) / (n + swir_b))
+        for index, arr in outputs.items():
+            arr.flush()
+            os.replace(self._slice_path(index, acq_date) + ".tmp", self._slice_path(index, acq_date))
+
+        self.manifest["dates"] = sorted(self.manifest["dates"] + [acq_date])
+        self._save_manifest()
+        print(f"✨ 已追加到数据立方体: {acq_date}")
+        return True
+
+    def _same_grid(self, nir_path, red_path, swir_path):
+        """新影像必须与立方体在同一网格上: NIR 的仿射变换与 CRS 完全一致，RED / SWIR 覆盖同一范围"""
+        transform = Affine(*self.manifest["transform"])
+        crs = CRS.from_wkt(self.manifest["crs"])
+        bounds = array_bounds(self.shape[0], self.shape[1], transform)
+        tolerance = abs(transform.a) / 2
+        for path in (nir_path, red_path, swir_path):
+            with rasterio.open(path) as src:
+                same = src.crs == crs and np.allclose(tuple(src.bounds), bounds, atol=tolerance)
+                if path == nir_path:
+                    same = same and src.transform.almost_equals(transform) and (src.height, src.width) == self.shape
+            if not same:
+                print(f"❌ {os.path.basename(path)} 与数据立方体的网格 (CRS / 仿射变换 / 范围) 不一致，拒绝追加")
+                return False
+        return True
+
+    def read(self, index, rows=slice(None)):
+        """读取某个指数在若干行上的全部时相，返回 float32 (T, r, W)，无效值为 NaN"""
+        slices = [np.load(self._slice_path(index, d), mmap_mode="r")[rows] for d in self.dates]
+        stack = np.stack(slices).astype(np.float32)
+        stack[stack == NODATA] = np.nan
+        stack /= SCALE
+        return stack
+
+    def trend_stats(self, index="ndwi", block_rows=256, out_dir=None):
+        """
+        按行块向量化计算逐像素的时序统计，结果写成 float32 memmap:
+        slope (每年变化量, 最小二乘)、max_drop (相对此前峰值的最大跌幅)、
+        net_change (最后一期 - 第一期)、valid_count (有效时相数)。
+        """
+        dates = self.dates
+        if len(dates) < 2:
+            print("⚠️ 至少需要两个日期才能计算趋势。")
+            return None
+
+        out_dir = out_dir or self.cube_dir
+        shape = self.shape
+        t0 = Date.fromisoformat(dates[0])
+        t = np.array([(Date.fromisoformat(d) - t0).days / 365.25 for d in dates], dtype=np.float32)
+        t = t[:, None, None]
+
+        names = ("slope", "max_drop", "net_change", "valid_count")
+        outputs = {name: np.lib.format.open_memmap(os.path.join(out_dir, f"trend_{index}_{name}.npy"),
+                                                    mode="w+", dtype=np.float32, shape=shape)
+                   for name in names}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for r in range(0, shape[0], block_rows):
+                rows = slice(r, min(r + block_rows, shape[0]))
+                y = self.read(index, rows)
+                valid = ~np.isnan(y)
+                n = valid.sum(axis=0)
+
+                # 带缺测的最小二乘斜率
+                t_mean = np.where(valid, t, 0).sum(axis=0) / n
+                y_mean = np.nansum(y, axis=0) / n
+                dt = np.where(valid, t - t_mean, 0)
+                dy = np.where(valid, y - y_mean, 0)
+                outputs["slope"][rows] = (dt * dy).sum(axis=0) / (dt * dt).sum(axis=0)
+
+                # 相对历史峰值的最大跌幅
+                running_peak = np.fmax.accumulate(y, axis=0)
+                outputs["max_drop"][rows] = np.nanmax(np.where(valid, running_peak - y, np.nan), axis=0)
+
+                # 首末有效期之差
+                first = np.argmax(valid, axis=0)
+                last = y.shape[0] - 1 - np.argmax(valid[::-1], axis=0)
+                y_first = np.take_along_axis(y, first[None], axis=0)[0]
+                y_last = np.take_along_axis(y, last[None], axis=0)[0]
+                outputs["net_change"][rows] = y_last - y_first
+                outputs["valid_count"][rows] = n
+
+        for arr in outputs.values():
+            arr.flush()
+        return outputs
+
+
+def build_cube(cube_dir=CUBE_DIR, img_dir=IMG_DIR):
+    """把 img_dir 里所有齐全的日期增量追加进数据立方体"""
+    cube = IndexCube(cube_dir)
+    scenes = discover_scenes(img_dir)
+    added = 0
+    for acq_date, bands in scenes.items():
+        if cube.append(acq_date, bands["red"], bands["nir"], bands["swir"]):
+            added += 1
+    print(f"📦 数据立方体共 {len(cube.dates)} 个日期 (本次新增 {added} 个)")
+    return cube
+
+
+if __name__ == "__main__":
+    cube = build_cube()
+    stats = cube.trend_stats("ndwi")
+    if stats is not None:
+        print(f"📉 最大 NDWI 跌幅均值: {np.nanmean(stats['max_drop']):.4f}")
@@ -4,6 +4,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 
+from src.processing import band_cache
+
 # === 路径配置 ===
 IMG_DIR = "data/images"
 OUT_DIR = "data/outputs"
@@ -21,6 +23,7 @@ OCT_RED = os.path.join(IMG_DIR, "SJER_B04_10m.jp2") # 10月红光波段 (请确
 TARGET_LAT = 37.135799
 TARGET_LON = -119.752751
 WINDOW_SIZE = 40 # 查看周围 40x40 像素 (约400x400米)
+BRIGHTNESS = 4000.0 # 4000是一个经验亮度值
 
 def get_crop(nir_path, red_path, swir_path, label):
     """读取并裁剪出目标点周围的小图"""
@@ -41,12 +44,19 @@ def get_crop(nir_path, red_path, swir_path, label):
         c_end = c_start + WINDOW_SIZE
         
         window = rasterio.windows.Window(c_start, r_start, WINDOW_SIZE, WINDOW_SIZE)
-        
+
         # 3. 读取数据 (归一化到 0-1)
-        nir = src.read(1, window=window).astype('float32') / 4000.0 # 4000是一个经验亮度值
-        
-    with rasterio.open(red_path) as src:
-        red = src.read(1, window=window).astype('float32') / 4000.0
+        if not band_cache.ENABLED:
+            nir = src.read(1, window=window).astype('float32') / BRIGHTNESS
+
+    if band_cache.ENABLED:
+        # 缓存里是 ÷10000 后的反射率，换算回经验亮度尺度即可，无需重新解码 JP2
+        rows, cols = window.toslices()
+        nir = np.array(band_cache.load_band(nir_path)[rows, cols]) * (10000.0 / BRIGHTNESS)
+        red = np.array(band_cache.load_band(red_path)[rows, cols]) * (10000.0 / BRIGHTNESS)
+    else:
+        with rasterio.open(red_path) as src:
+            red = src.read(1, window=window).astype('float32') / BRIGHTNESS
         
     # 构建假彩色图像 (NIR, Red, Green_substitute)
     # 通常假彩色标准是: R=NIR, G=Red, B=Green
@@ -0,0 +1,200 @@
+import gzip
+import io
+import struct
+import zlib
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# === /analyze/{year} 的响应格式 ===
+# json:    原有的 JSON 文档
+# ndjson:  第一行是 {"year", "outbreak_count"}，之后每行一个点，分块流式输出
+# packed:  小端二进制: 24 字节头 + latitude(f8[n]) + longitude(f8[n]) + stress_score(f4[n])
+# arrow / parquet: 需要 pyarrow，年份和计数写在 schema metadata 里
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "packed": "application/vnd.pineguard.points",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+PACKED_MAGIC = b"PGPT"
+PACKED_VERSION = 1
+# magic, version, year, outbreak_count, n_points, reserved
+PACKED_HEADER = struct.Struct("<4sIiIII")
+NDJSON_CHUNK_ROWS = 10000
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def available_formats():
+    formats = ["json", "ndjson", "packed"]
+    if pa is not None:
+        formats += ["arrow", "parquet"]
+    return formats
+
+
+def available_encodings():
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def _parse_accept(header):
+    """解析 Accept / Accept-Encoding，返回 [(值, q)]，保持原顺序"""
+    items = []
+    for part in (header or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for f in fields[1:]:
+            if f.startswith("q="):
+                try:
+                    q = float(f[2:])
+                except ValueError:
+                    q = 0.0
+        items.append((fields[0].lower(), q))
+    return items
+
+
+def negotiate_format(accept, requested=None):
+    """?format= 优先，其次按 Accept 的 q 值选择；没有可用格式时返回 None (406)"""
+    formats = available_formats()
+    if requested:
+        return requested if requested in formats else None
+    if not accept:
+        return "json"
+    by_media = {MEDIA_TYPES[f]: f for f in formats}
+    best, best_q = None, 0.0
+    for media, q in _parse_accept(accept):
+        if media in ("*/*", "application/*"):
+            fmt = "json"
+        elif media == "application/octet-stream":
+            fmt = "packed"
+        else:
+            fmt = by_media.get(media)
+        if fmt is not None and q > best_q:
+            best, best_q = fmt, q
+    return best
+
+
+def negotiate_encoding(accept_encoding):
+    """按 Accept-Encoding 选择压缩方式 (同等 q 值时 zstd 优先)，None 表示不压缩"""
+    accepted = dict(_parse_accept(accept_encoding))
+    best, best_q = None, 0.0
+    for enc in available_encodings():
+        q = accepted.get(enc, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def variant_etag(etag, fmt, encoding):
+    """同一份数据的不同表示需要不同的 ETag"""
+    return f'{etag[:-1]}-{fmt}-{encoding or "identity"}"'
+
+
+# --- 编码器: entry 需要 key / outbreak_count / latitude / longitude / stress_score ---
+def _location_lines(entry, start, stop):
+    return [f'{{"latitude":{a!r},"longitude":{o!r},"stress_score":{s!r}}}'
+            for a, o, s in zip(entry.latitude[start:stop].tolist(), entry.longitude[start:stop].tolist(),
+                               entry.stress_score[start:stop].tolist())]
+
+
+def encode_json(entry):
+    """与 json.dumps(doc, separators=(",", ":")) 逐字节一致，但不构造中间 dict"""
+    head = f'{{"year":"{entry.key}","outbreak_count":{int(entry.outbreak_count)},"locations":['
+    return (head + ",".join(_location_lines(entry, 0, len(entry.latitude))) + "]}").encode("utf-8")
+
+
+def iter_ndjson(entry, chunk_rows=NDJSON_CHUNK_ROWS):
+    yield f'{{"year":"{entry.key}","outbreak_count":{int(entry.outbreak_count)}}}\n'.encode("utf-8")
+    for start in range(0, len(entry.latitude), chunk_rows):
+        lines = _location_lines(entry, start, start + chunk_rows)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def encode_packed(entry):
+    n = len(entry.latitude)
+    year = int(entry.key) if entry.key.isdigit() else 0
+    return b"".join([
+        PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, year, int(entry.outbreak_count), n, 0),
+        np.asarray(entry.latitude, dtype="<f8").tobytes(),
+        np.asarray(entry.longitude, dtype="<f8").tobytes(),
+        np.asarray(entry.stress_score, dtype="<f4").tobytes(),
+    ])
+
+
+def decode_packed(body):
+    """客户端解码 packed 格式，返回 (year, outbreak_count, latitude, longitude, stress_score)"""
+    magic, version, year, count, n, _ = PACKED_HEADER.unpack_from(body)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION:
+        raise ValueError("不是 PineGuard packed 格式")
+    offset = PACKED_HEADER.size
+    lat = np.frombuffer(body, dtype="<f8", count=n, offset=offset)
+    lon = np.frombuffer(body, dtype="<f8", count=n, offset=offset + 8 * n)
+    score = np.frombuffer(body, dtype="<f4", count=n, offset=offset + 16 * n)
+    return year, count, lat, lon, score
+
+
+def _arrow_table(entry):
+    table = pa.table({
+        "latitude": pa.array(np.asarray(entry.latitude, dtype=np.float64)),
+        "longitude": pa.array(np.asarray(entry.longitude, dtype=np.float64)),
+        "stress_score": pa.array(np.asarray(entry.stress_score, dtype=np.float64)),
+    })
+    return table.replace_schema_metadata({"year": entry.key, "outbreak_count": str(entry.outbreak_count)})
+
+
+def encode_arrow(entry):
+    table = _arrow_table(entry)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_parquet(entry):
+    buf = io.BytesIO()
+    pq.write_table(_arrow_table(entry), buf, compression="zstd")
+    return buf.getvalue()
+
+
+ENCODERS = {"json": encode_json, "packed": encode_packed, "arrow": encode_arrow, "parquet": encode_parquet}
+
+
+# --- 压缩 ---
+def compress(body, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    return body
+
+
+def iter_compress(chunks, encoding):
+    """流式压缩 (NDJSON 用)，每个输入块压缩后立即刷出"""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(flush_block)
+        yield compressor.flush()
+        return
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
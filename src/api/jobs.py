@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.analysis import detect_outbreak as core
+from src.analysis.results import OutbreakPixels
+
+# === 按需分析任务队列 ===
+# analyze_region 是几十秒级的栅格计算，放到独立的进程池里跑，HTTP 处理函数只负责提交和查询。
+MAX_WORKERS = int(os.getenv("PINEGUARD_ANALYSIS_WORKERS", "2"))
+MAX_PENDING = 16          # 排队 + 运行中的任务上限，超过后拒绝新任务
+RESULT_CACHE_SIZE = 32    # LRU 结果缓存条数
+MAX_JOBS = 256            # 保留的任务记录数 (只淘汰已结束的任务)
+WORKER_NICE = 10          # 分析进程降低优先级，避免拖慢轻量接口
+
+
+class QueueFull(Exception):
+    pass
+
+
+def scene_fingerprint():
+    """六个输入波段的 (文件名, mtime, 大小)；影像被替换后缓存键随之改变"""
+    parts = []
+    for path in (core.MAY_NIR, core.MAY_SWIR, core.MAY_RED, core.OCT_NIR, core.OCT_SWIR, core.OCT_RED):
+        try:
+            st = os.stat(path)
+            parts.append((os.path.basename(path), st.st_mtime_ns, st.st_size))
+        except OSError:
+            parts.append((os.path.basename(path), None, None))
+    return tuple(parts)
+
+
+def request_key(lat, lon, radius_km, filters=None):
+    """结果缓存 / 去重用的键: 位置 + 半径 + 影像指纹 + 完整过滤参数"""
+    f = core.DEFAULT_FILTERS if filters is None else {**core.DEFAULT_FILTERS, **filters}
+    return (round(float(lat), 6), round(float(lon), 6), round(float(radius_km), 4),
+            scene_fingerprint(), json.dumps(f, sort_keys=True))
+
+
+def _lower_priority():
+    try:
+        os.nice(WORKER_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _run_analysis(lat, lon, radius_km, filters):
+    """在工作进程里执行；只返回列数组，减少跨进程传输"""
+    pixels = core.analyze_region(lat, lon, radius_km, filters)
+    return pixels.columns(include_pixel=True)
+
+
+class Job:
+    def __init__(self, key, params):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.created = time.time()
+        self.finished = None
+        self.error = None
+        self.result = None
+        self.future = None
+        self.pool = None
+
+    def describe(self):
+        info = {"job_id": self.id, "status": self.status, "params": self.params, "created": self.created}
+        if self.finished is not None:
+            info["finished"] = self.finished
+            info["elapsed_s"] = round(self.finished - self.created, 3)
+        if self.result is not None:
+            info["count"] = len(self.result)
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobQueue:
+    """
+    有界进程池 + 任务表 + LRU 结果缓存。
+    - 相同参数的任务在运行中时直接复用同一个任务 (去重)
+    - 已完成的结果按 request_key 缓存，重复查询立即返回
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, cache_size=RESULT_CACHE_SIZE):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.jobs = OrderedDict()
+        self.inflight = {}
+        self.results = OrderedDict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_lower_priority)
+        return self._pool
+
+    def _reset_pool(self, pool):
+        """某个工作进程异常退出 (例如大半径分析被 OOM 杀掉) 后进程池不可再用，丢弃并在下次提交时重建"""
+        if self._pool is pool and pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _submit(self, *args):
+        pool = self._executor()
+        try:
+            return pool.submit(_run_analysis, *args)
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            return self._executor().submit(_run_analysis, *args)
+
+    def _remember(self, job):
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_JOBS:
+            old_id = next((i for i, j in self.jobs.items() if j.status in ("done", "failed")), None)
+            if old_id is None:
+                break
+            del self.jobs[old_id]
+
+    def submit(self, lat, lon, radius_km, filters=None):
+        key = request_key(lat, lon, radius_km, filters)
+        params = {"lat": lat, "lon": lon, "radius_km": radius_km, "filters": filters}
+        with self._lock:
+            if key in self.inflight:
+                return self.jobs[self.inflight[key]]
+
+            job = Job(key, params)
+            if key in self.results:
+                self.results.move_to_end(key)
+                job.result = self.results[key]
+                job.status = "done"
+                job.finished = job.created
+                self._remember(job)
+                return job
+
+            if len(self.inflight) >= self.max_pending:
+                raise QueueFull(f"{len(self.inflight)} analysis jobs already pending")
+            job.future = self._submit(lat, lon, radius_km, filters)
+            job.pool = self._pool
+            self.inflight[key] = job.id
+            self._remember(job)
+        job.future.add_done_callback(lambda future, job=job: self._finish(job, future))
+        return job
+
+    def _finish(self, job, future):
+        with self._lock:
+            self.inflight.pop(job.key, None)
+            job.finished = time.time()
+            try:
+                cols = future.result()
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+                if isinstance(e, BrokenProcessPool):
+                    self._reset_pool(job.pool)
+                return
+            job.result = OutbreakPixels(cols["latitude"], cols["longitude"], cols["stress_score"],
+                                        cols["row"], cols["col"])
+            job.status = "done"
+            self.results[job.key] = job.result
+            self.results.move_to_end(job.key)
+            while len(self.results) > self.cache_size:
+                self.results.popitem(last=False)
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "queued" and job.future is not None and job.future.running():
+            job.status = "running"
+        return job
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
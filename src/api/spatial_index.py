@@ -0,0 +1,95 @@
+import numpy as np
+
+from src.analysis import geo
+
+EARTH_RADIUS_KM = geo.EARTH_RADIUS_M / 1000.0
+# 每个网格单元的目标点数；单元越小候选越少，但空单元越多
+TARGET_PER_CELL = 16
+MAX_CELLS_PER_SIDE = 4096
+
+
+class GridIndex:
+    """
+    均匀网格空间索引。
+    所有点按网格单元 (行优先) 排序后连续存放，offsets[c]:offsets[c+1] 即单元 c 内的点；
+    同一网格行里相邻单元在数组中也相邻，所以一个 bbox 只需要每个网格行一次切片。
+    """
+
+    def __init__(self, year, latitude, longitude, stress_score):
+        year = np.asarray(year, dtype=np.int32)
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        stress_score = np.asarray(stress_score, dtype=np.float64)
+        n = len(latitude)
+
+        if n:
+            self.lat0, self.lon0 = float(latitude.min()), float(longitude.min())
+            span = max(float(latitude.max()) - self.lat0, float(longitude.max()) - self.lon0, 1e-6)
+        else:
+            self.lat0, self.lon0, span = 0.0, 0.0, 1.0
+        side = int(np.clip(np.sqrt(max(n, 1) / TARGET_PER_CELL), 1, MAX_CELLS_PER_SIDE))
+        self.cell = span / side * (1 + 1e-9)
+        self.n_rows = self.n_cols = side
+
+        cells = self._cell_row(latitude) * self.n_cols + self._cell_col(longitude)
+        order = np.argsort(cells, kind="stable")
+        self.year = year[order]
+        self.latitude = latitude[order]
+        self.longitude = longitude[order]
+        self.stress_score = stress_score[order]
+        self.offsets = np.searchsorted(cells[order], np.arange(self.n_rows * self.n_cols + 1))
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def _cell_row(self, lat):
+        return np.clip(((np.asarray(lat) - self.lat0) // self.cell).astype(np.int64), 0, self.n_rows - 1)
+
+    def _cell_col(self, lon):
+        return np.clip(((np.asarray(lon) - self.lon0) // self.cell).astype(np.int64), 0, self.n_cols - 1)
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """bbox 覆盖到的网格单元里的点 (下标数组)，还需要精确过滤"""
+        if not len(self) or max_lat < self.lat0 or max_lon < self.lon0:
+            return np.empty(0, dtype=np.int64)
+        r0, r1 = int(self._cell_row(min_lat)), int(self._cell_row(max_lat))
+        c0, c1 = int(self._cell_col(min_lon)), int(self._cell_col(max_lon))
+        if min_lat > self.lat0 + self.cell * self.n_rows or min_lon > self.lon0 + self.cell * self.n_cols:
+            return np.empty(0, dtype=np.int64)
+        slices = [np.arange(self.offsets[r * self.n_cols + c0], self.offsets[r * self.n_cols + c1 + 1])
+                  for r in range(r0, r1 + 1)]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def _filter_years(self, idx, start_year, end_year):
+        if start_year is not None:
+            idx = idx[self.year[idx] >= start_year]
+        if end_year is not None:
+            idx = idx[self.year[idx] <= end_year]
+        return idx
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon, start_year=None, end_year=None):
+        """返回落在 bbox 内 (含边界) 且年份在 [start_year, end_year] 内的点下标"""
+        idx = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        lat, lon = self.latitude[idx], self.longitude[idx]
+        idx = idx[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+        return self._filter_years(idx, start_year, end_year)
+
+    def query_radius(self, lat, lon, radius_km, start_year=None, end_year=None):
+        """返回距 (lat, lon) 不超过 radius_km 的点下标及对应距离"""
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = np.cos(np.radians(min(abs(lat) + dlat, 89.9)))
+        dlon = min(dlat / cos_lat, 180.0)
+        idx = self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        idx = self._filter_years(idx, start_year, end_year)
+        dist = geo.haversine_km(lat, lon, self.latitude[idx], self.longitude[idx])
+        keep = dist <= radius_km
+        return idx[keep], dist[keep]
+
+    def records(self, idx, distance_km=None):
+        """把查询结果转成 JSON 友好的记录列表"""
+        out = [{"year": int(y), "latitude": float(a), "longitude": float(o), "stress_score": float(s)}
+               for y, a, o, s in zip(self.year[idx], self.latitude[idx], self.longitude[idx], self.stress_score[idx])]
+        if distance_km is not None:
+            for rec, d in zip(out, distance_km):
+                rec["distance_km"] = round(float(d), 4)
+        return out
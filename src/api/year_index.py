@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import formatdate
+
+from src.api import formats
+from src.api.spatial_index import GridIndex
+from src.processing import point_store
+
+DATA_DIR = "data/processed"
+# 统计接口覆盖的年份范围 (与原接口一致)
+STATS_YEARS = range(1984, 2026)
+
+
+def encode_json(payload):
+    """与 FastAPI JSONResponse 相同的紧凑编码"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class CachedBody:
+    """预先序列化好的响应体 + 校验头"""
+
+    def __init__(self, body, mtime, etag=None):
+        self.body = body
+        self.etag = etag or '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.mtime = mtime
+        self.last_modified = formatdate(mtime, usegmt=True)
+
+
+class YearEntry:
+    """列式存储里某一年的视图；各种格式的响应体在第一次请求时编码并缓存"""
+
+    def __init__(self, store, year):
+        self.key = str(year)
+        self.outbreak_count = store.outbreak_count(year)
+        cols = store.year_columns(year)
+        self.latitude = cols["latitude"]
+        self.longitude = cols["longitude"]
+        self.stress_score = cols["stress_score"]
+        self.mtime = store.mtime
+        # ETag 只取决于存储版本和年份，命中 304 时不需要序列化
+        tag = hashlib.blake2b(f"{store.signature}:{year}".encode("ascii"), digest_size=12).hexdigest()
+        self.etag = f'"{tag}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self._encoded = {}
+
+    def encoded(self, fmt="json", encoding=None):
+        """某种格式 + 压缩方式的响应体，第一次请求时编码并缓存"""
+        body = self._encoded.get((fmt, encoding))
+        if body is None:
+            raw = self._encoded.get((fmt, None))
+            if raw is None:
+                raw = self._encoded[(fmt, None)] = formats.ENCODERS[fmt](self)
+            body = self._encoded[(fmt, encoding)] = formats.compress(raw, encoding)
+        return body
+
+    @property
+    def body(self):
+        return self.encoded("json")
+
+
+class YearIndex:
+    """
+    data/processed 的内存索引: 启动时打开列式点存储 (mmap)，建立每年的摘要和坐标视图。
+    存储缺失或兼容 JSON 被外部改动时会自动重建；最多每 check_interval 秒检查一次。
+    """
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=1.0, store_dir=None):
+        self.data_dir = data_dir
+        self.store_dir = store_dir or os.path.join(data_dir, "points")
+        self.check_interval = check_interval
+        self.store = None
+        self.entries = {}
+        self.version = 0
+        self.stats = None
+        self._spatial = None
+        self._spatial_version = -1
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """检查存储签名；只有存储变化时才重建年份视图"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return self.version
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval:
+                return self.version
+            try:
+                store = point_store.open_store(self.data_dir, self.store_dir)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ 无法加载列式存储 {self.store_dir}: {e}")
+                store = self.store
+            signature = store.signature if store is not None else None
+            if self.stats is None or signature != (self.store.signature if self.store is not None else None):
+                self.store = store
+                self.entries = {str(y): YearEntry(store, y) for y in store.years} if store is not None else {}
+                self.stats = self._build_stats()
+                self.version += 1
+            self._last_check = time.monotonic()
+        return self.version
+
+    def _build_stats(self):
+        stats = [{"year": year, "outbreak_count": self.entries[str(year)].outbreak_count}
+                 for year in STATS_YEARS if str(year) in self.entries]
+        return CachedBody(encode_json(stats), self.store.mtime if self.store is not None else time.time())
+
+    def get(self, key):
+        self.refresh()
+        return self.entries.get(key)
+
+    def annual_stats(self):
+        self.refresh()
+        return self.stats
+
+    def spatial(self):
+        """覆盖全部年份的空间索引；数据版本变化后重建一次"""
+        version = self.refresh()
+        with self._lock:
+            if self._spatial is None or self._spatial_version != version:
+                store = self.store
+                if store is None:
+                    self._spatial = GridIndex([], [], [], [])
+                else:
+                    self._spatial = GridIndex(store.year, store.latitude, store.longitude, store.stress_score)
+                self._spatial_version = version
+            return self._spatial
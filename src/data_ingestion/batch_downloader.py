@@ -4,6 +4,9 @@ import requests
 import zipfile
 from dotenv import load_dotenv
 
+from src.data_ingestion.download_manager import DownloadManager
+from src.data_ingestion.zip_bands import extract_bands, extract_remote_bands
+
 # 加载环境变量
 load_dotenv()
 
@@ -62,69 +65,57 @@ def download_baseline_data():
     zip_name = f"SJER_{p_date}.zip"
     zip_path = os.path.join(RAW_DIR, zip_name)
     
-    if os.path.exists(zip_path):
-        print(f"📦 文件已存在: {zip_path}")
-    else:
-        token = get_access_token()
-        if not token:
-            return
-
-        print(f"📥 开始下载 (修正 URL 版)...")
-        headers = {"Authorization": f"Bearer {token}"}
-        
-        # 👇 核心修复：加上了 /odata
-        url = f"https://zipper.dataspace.copernicus.eu/odata/v1/Products({p_id})/$value"
-        
-        try:
-            with requests.get(url, headers=headers, stream=True) as r:
-                if r.status_code == 200:
-                    total_size = int(r.headers.get('content-length', 0))
-                    downloaded = 0
-                    print(f"   文件大小: {total_size / (1024*1024):.2f} MB")
-                    
-                    with open(zip_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=1024*1024): 
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if downloaded % (50 * 1024 * 1024) < 1024*1024: 
-                                    print(f"   ... {downloaded // (1024*1024)} MB / {total_size // (1024*1024)} MB")
-                    print("✅ 下载完成！")
-                else:
-                    print(f"❌ 下载失败 (HTTP {r.status_code})")
-                    print(f"   服务器返回: {r.text[:200]}") # 打印错误详情
-                    return
-        except Exception as e:
-            print(f"❌ 下载中断: {e}")
-            if os.path.exists(zip_path):
-                os.remove(zip_path) # 删除坏文件
-            return
-
-    # 解压提取
+    # 多连接 + 断点续传 + 校验和
+    manager = DownloadManager(raw_dir=RAW_DIR, token_provider=get_access_token)
+    if manager.download(baseline_prod, zip_path) is None:
+        return
+
+    # 解压提取 (流式拷贝，不把整个波段读进内存)
     print(f"🔓 提取波段中...")
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            count = 0
-            for band, res in TARGET_BANDS.items():
-                match = [f for f in all_files if f"{res}/" in f and f"_{band}_{res[1:]}.jp2" in f]
-                if match:
-                    target_name = f"SJER_{p_date}_{band}_{res[1:]}.jp2"
-                    target_path = os.path.join(IMG_DIR, target_name)
-                    if not os.path.exists(target_path):
-                        with zip_ref.open(match[0]) as source, open(target_path, 'wb') as target:
-                            target.write(source.read())
-                        print(f"   ✨ 已提取: {target_name}")
-                        count += 1
-                    else:
-                        print(f"   ⏩ 已存在: {target_name}")
-                        count += 1
-            
-            if count == 0:
-                print("⚠️  警告: ZIP 包里没找到对应的波段文件！可能是 Level-1C 格式而非 Level-2A。")
+        extracted = extract_bands(zip_path, TARGET_BANDS, IMG_DIR, f"SJER_{p_date}_{{band}}_{{res}}.jp2",
+                                  overwrite=False)
+        if not extracted:
+            print("⚠️  警告: ZIP 包里没找到对应的波段文件！可能是 Level-1C 格式而非 Level-2A。")
 
     except zipfile.BadZipFile:
         print("❌ ZIP 文件损坏。")
 
+def fetch_baseline_bands_remote():
+    """
+    不下载整个 ZIP: 通过 Range 请求读取远程 ZIP 的中央目录，只拉取 B04/B08/B11 三个成员。
+    """
+    if not os.path.exists(SEARCH_RESULTS):
+        print("❌ 找不到 search_results.json")
+        return {}
+
+    with open(SEARCH_RESULTS, 'r') as f:
+        products = json.load(f)
+
+    baseline_prod = products[0]
+    p_date = baseline_prod['date']
+    manager = DownloadManager(raw_dir=RAW_DIR, token_provider=get_access_token)
+    url = manager.url_template.format(id=baseline_prod['id'])
+    print(f"🎯 远程提取: {p_date} (ID: {baseline_prod['id']})")
+    try:
+        return extract_remote_bands(url, manager._get, TARGET_BANDS, IMG_DIR,
+                                    f"SJER_{p_date}_{{band}}_{{res}}.jp2", overwrite=False)
+    except (IOError, zipfile.BadZipFile) as e:
+        print(f"❌ 远程提取失败: {e}")
+        return {}
+
+def download_all_products():
+    """并行下载 search_results.json 中的全部产品 (共享连接池，支持断点续传)"""
+    if not os.path.exists(SEARCH_RESULTS):
+        print("❌ 找不到 search_results.json")
+        return {}
+
+    with open(SEARCH_RESULTS, 'r') as f:
+        products = json.load(f)
+
+    print(f"🎯 共 {len(products)} 个产品待下载")
+    manager = DownloadManager(raw_dir=RAW_DIR, token_provider=get_access_token)
+    return manager.download_all(products)
+
 if __name__ == "__main__":
     download_baseline_data()
\ No newline at end of file
@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date, timedelta
+
+from src.data_ingestion.download_manager import make_session
+
+# === 目录检索配置 ===
+CATALOGUE_URL = "https://catalogue.dataspace.copernicus.eu/odata/v1/Products"
+INDEX_PATH = "data/catalogue_index.sqlite"
+PAGE_SIZE = 100
+MAX_WORKERS = 8
+PRODUCT_TYPE = "S2MSI2A"
+# 产品入库到目录可检索之间的延迟；最近这几天 (以及未来日期) 不算作已覆盖，下次搜索还会重新查询
+PUBLICATION_LATENCY_DAYS = 3
+
+
+def build_filter(aoi, start_date, end_date, max_cloud, product_type=PRODUCT_TYPE):
+    """OData 查询条件；aoi 为 WKT 几何 (例如 POINT(-119.74 37.11))，日期区间为 [start, end)"""
+    return (
+        f"Collection/Name eq 'SENTINEL-2' and "
+        f"Attributes/OData.CSC.StringAttribute/any(att:att/Name eq 'productType' and att/Value eq '{product_type}') and "
+        f"OData.CSC.Intersects(area=geography'SRID=4326;{aoi}') and "
+        f"ContentDate/Start ge {start_date}T00:00:00.000Z and "
+        f"ContentDate/Start lt {end_date}T00:00:00.000Z and "
+        f"Attributes/OData.CSC.DoubleAttribute/any(att:att/Name eq 'cloudCover' and att/Value lt {max_cloud})"
+    )
+
+
+def parse_product(p):
+    """把目录返回的产品记录压缩成本地索引需要的字段"""
+    cloud = None
+    for att in p.get('Attributes') or []:
+        if att.get('Name') == 'cloudCover':
+            cloud = att.get('Value')
+    checksum = None
+    for item in p.get('Checksum') or []:
+        if item.get('Algorithm', '').upper() == 'MD5' and item.get('Value'):
+            checksum = {"algorithm": "MD5", "value": item['Value']}
+    return {
+        "id": p['Id'],
+        "date": p['ContentDate']['Start'].split('T')[0],
+        "cloud_cover": cloud,
+        "size": p.get('ContentLength'),
+        "checksum": checksum,
+    }
+
+
+def fetch_window(session, aoi, start_date, end_date, max_cloud, base_url=CATALOGUE_URL, page_size=PAGE_SIZE):
+    """查询一个 AOI + 日期区间，沿着 @odata.nextLink 翻完所有页"""
+    params = {
+        "$filter": build_filter(aoi, start_date, end_date, max_cloud),
+        "$top": page_size,
+        "$orderby": "ContentDate/Start asc",
+        "$expand": "Attributes",
+    }
+    url = base_url
+    products = []
+    while url:
+        r = session.get(url, params=params, timeout=60)
+        if r.status_code != 200:
+            raise IOError(f"搜索失败 (HTTP {r.status_code}): {r.text[:200]}")
+        data = r.json()
+        products.extend(parse_product(p) for p in data.get('value', []))
+        # nextLink 已经带上了全部查询参数
+        url, params = data.get('@odata.nextLink'), None
+    return products
+
+
+def subtract_ranges(start_date, end_date, covered):
+    """[start, end) 减去已覆盖的区间列表，返回仍需联网查询的区间"""
+    missing = []
+    cursor = start_date
+    for c_start, c_end in sorted(covered):
+        if c_end <= cursor or c_start >= end_date:
+            continue
+        if c_start > cursor:
+            missing.append((cursor, c_start))
+        cursor = max(cursor, c_end)
+        if cursor >= end_date:
+            break
+    if cursor < end_date:
+        missing.append((cursor, end_date))
+    return missing
+
+
+class CatalogueIndex:
+    """
+    本地 SQLite 目录索引。
+    coverage 表记录每个 AOI 在哪些日期区间、以多大的云量上限查过；重复或重叠的搜索直接在本地回答，
+    只有缺失的日期区间才会发到网络上。
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                id TEXT PRIMARY KEY, date TEXT NOT NULL, cloud_cover REAL, size INTEGER, checksum TEXT);
+            CREATE TABLE IF NOT EXISTS aoi_products (
+                aoi TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (aoi, id));
+            CREATE TABLE IF NOT EXISTS coverage (
+                aoi TEXT NOT NULL, max_cloud REAL NOT NULL, start_date TEXT NOT NULL, end_date TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_products_date ON products (date);
+            CREATE INDEX IF NOT EXISTS idx_coverage_aoi ON coverage (aoi);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def missing_ranges(self, aoi, start_date, end_date, max_cloud):
+        """用更宽松 (云量上限不低于本次) 的历史查询覆盖本次查询，返回缺口"""
+        rows = self.conn.execute(
+            "SELECT start_date, end_date FROM coverage WHERE aoi = ? AND max_cloud >= ? "
+            "AND start_date < ? AND end_date > ?", (aoi, max_cloud, end_date, start_date)).fetchall()
+        return subtract_ranges(start_date, end_date, rows)
+
+    def record(self, aoi, start_date, end_date, max_cloud, products, today=None):
+        """
+        写入产品并记录覆盖区间。覆盖区间的右端点截断到 today - PUBLICATION_LATENCY_DAYS，
+        否则窗口中尚未发布的日期会被当成已查询，之后发布的影像永远不会被取到。
+        """
+        today = today or Date.today()
+        covered_end = min(end_date, (today - timedelta(days=PUBLICATION_LATENCY_DAYS)).isoformat())
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO products (id, date, cloud_cover, size, checksum) VALUES (?, ?, ?, ?, ?)",
+                [(p["id"], p["date"], p["cloud_cover"], p["size"],
+                  json.dumps(p["checksum"]) if p["checksum"] else None) for p in products])
+            self.conn.executemany("INSERT OR IGNORE INTO aoi_products (aoi, id) VALUES (?, ?)",
+                                  [(aoi, p["id"]) for p in products])
+            if covered_end > start_date:
+                self.conn.execute("INSERT INTO coverage (aoi, max_cloud, start_date, end_date) VALUES (?, ?, ?, ?)",
+                                  (aoi, max_cloud, start_date, covered_end))
+
+    def query(self, aoi, start_date, end_date, max_cloud):
+        rows = self.conn.execute(
+            "SELECT p.id, p.date, p.cloud_cover, p.size, p.checksum FROM products p "
+            "JOIN aoi_products a ON a.id = p.id "
+            "WHERE a.aoi = ? AND p.date >= ? AND p.date < ? AND (p.cloud_cover IS NULL OR p.cloud_cover < ?) "
+            "ORDER BY p.date, p.id", (aoi, start_date, end_date, max_cloud)).fetchall()
+        return [{"id": r[0], "date": r[1], "cloud_cover": r[2], "size": r[3],
+                 "checksum": json.loads(r[4]) if r[4] else None} for r in rows]
+
+    def search_many(self, aois, windows, max_cloud=5.0, base_url=CATALOGUE_URL, workers=MAX_WORKERS, session=None):
+        """
+        并发检索多个 AOI x 日期窗口。
+        aois: WKT 列表；windows: [(start, end), ...] (ISO 日期，左闭右开)。
+        返回 {(aoi, start, end): [product, ...]}。
+        """
+        tasks = []
+        for aoi in aois:
+            for start_date, end_date in windows:
+                for gap in self.missing_ranges(aoi, start_date, end_date, max_cloud):
+                    tasks.append((aoi,) + gap)
+
+        if tasks:
+            print(f"🌐 {len(tasks)} 个缺失区间需要联网查询 (其余由本地索引回答)")
+            session = session or make_session(workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = list(pool.map(
+                    lambda t: fetch_window(session, t[0], t[1], t[2], max_cloud, base_url), tasks))
+            # SQLite 连接只在当前线程写入
+            for (aoi, start_date, end_date), products in zip(tasks, fetched):
+                self.record(aoi, start_date, end_date, max_cloud, products)
+
+        return {(aoi, s, e): self.query(aoi, s, e, max_cloud) for aoi in aois for s, e in windows}
+
+    def search(self, aoi, start_date, end_date, max_cloud=5.0, **kwargs):
+        return self.search_many([aoi], [(start_date, end_date)], max_cloud, **kwargs)[(aoi, start_date, end_date)]
+
+
+def season_windows(years, start_md="05-01", end_md="11-30"):
+    """多年回填用的季节窗口，例如每年 5/1 - 11/30 (右端点为次日，保持左闭右开)"""
+    windows = []
+    for year in years:
+        end = Date.fromisoformat(f"{year}-{end_md}") + timedelta(days=1)
+        windows.append((f"{year}-{start_md}", end.isoformat()))
+    return windows
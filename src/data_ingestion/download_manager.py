@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# === 下载配置 ===
+DOWNLOAD_URL = "https://zipper.dataspace.copernicus.eu/odata/v1/Products({id})/$value"
+RAW_DIR = "data/raw"
+PART_SIZE = 32 * 1024 * 1024      # 每个 Range 分片的大小
+CHUNK_SIZE = 1024 * 1024          # 流式写盘的块大小
+CONNECTIONS_PER_PRODUCT = 4       # 单个产品的并发连接数
+MAX_PARALLEL_PRODUCTS = 2         # 同时下载的产品数
+
+
+def make_session(pool_size):
+    """带连接池和自动重试的共享 Session"""
+    session = requests.Session()
+    retry = Retry(total=5, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(["GET", "HEAD"]))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def file_checksum(path, algorithm="md5"):
+    """流式计算文件摘要"""
+    h = hashlib.new(algorithm.lower().replace("-", ""))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DownloadManager:
+    """
+    多连接、可断点续传的产品下载器。
+    - 单个产品按 Range 分片，多连接并发下载
+    - 多个产品并行下载，共享同一个连接池
+    - 进度记录在旁路清单 <zip>.part.json 中，中断后从已完成的分片继续
+    - 下载完成后与目录服务提供的校验和比对
+    token_provider 为返回 Access Token 的函数 (遇到 401 会重新获取一次)；本地测试服务器可传 None。
+    """
+
+    def __init__(self, url_template=DOWNLOAD_URL, raw_dir=RAW_DIR, token_provider=None,
+                 connections=CONNECTIONS_PER_PRODUCT, max_products=MAX_PARALLEL_PRODUCTS,
+                 part_size=PART_SIZE, session=None):
+        self.url_template = url_template
+        self.raw_dir = raw_dir
+        self.token_provider = token_provider
+        self.connections = connections
+        self.max_products = max_products
+        self.part_size = part_size
+        self.session = session or make_session(connections * max_products)
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    # --- 认证 ---
+    def _headers(self, extra=None, refresh=False):
+        headers = dict(extra or {})
+        if self.token_provider is not None:
+            with self._token_lock:
+                if refresh or self._token is None:
+                    self._token = self.token_provider()
+            if self._token:
+                headers["Authorization"] = f"Bearer {self._token}"
+        return headers
+
+    def _get(self, url, extra_headers=None, stream=True):
+        r = self.session.get(url, headers=self._headers(extra_headers), stream=stream, timeout=60)
+        if r.status_code == 401 and self.token_provider is not None:
+            r.close()
+            r = self.session.get(url, headers=self._headers(extra_headers, refresh=True), stream=stream, timeout=60)
+        return r
+
+    # --- 清单 ---
+    @staticmethod
+    def _load_manifest(path):
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+        return None
+
+    @staticmethod
+    def _save_manifest(path, manifest):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def _probe(self, url):
+        """用 bytes=0-0 探测总大小以及是否支持 Range"""
+        with self._get(url, {"Range": "bytes=0-0"}) as r:
+            if r.status_code == 206 and "/" in r.headers.get("Content-Range", ""):
+                total = int(r.headers["Content-Range"].rsplit("/", 1)[1])
+                return total, True, r.headers.get("ETag")
+            if r.status_code == 200:
+                return int(r.headers.get("Content-Length", 0)), False, r.headers.get("ETag")
+            print(f"❌ 下载失败 (HTTP {r.status_code})")
+            print(f"   服务器返回: {r.text[:200]}")
+            return None, False, None
+
+    def _fetch_part(self, url, part_path, start, end):
+        """下载 [start, end] 字节并写入 .part 文件的对应位置"""
+        with self._get(url, {"Range": f"bytes={start}-{end}"}) as r:
+            if r.status_code != 206:
+                raise IOError(f"Range 请求失败 (HTTP {r.status_code})")
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                written = 0
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+        if written != end - start + 1:
+            raise IOError(f"分片不完整: {written} / {end - start + 1} 字节")
+
+    def _fetch_single(self, url, part_path):
+        """服务器不支持 Range 时的单连接下载"""
+        with self._get(url) as r:
+            if r.status_code != 200:
+                raise IOError(f"下载失败 (HTTP {r.status_code})")
+            with open(part_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+
+    def fetch(self, url, dest_path, checksum=None):
+        """
+        下载 url 到 dest_path (可断点续传)。
+        checksum: {"algorithm": "MD5", "value": "..."}，为 None 时跳过校验。成功返回 dest_path，否则返回 None。
+        """
+        if os.path.exists(dest_path):
+            print(f"📦 文件已存在: {dest_path}")
+            return dest_path
+
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        part_path = dest_path + ".part"
+        manifest_path = dest_path + ".part.json"
+
+        try:
+            total, ranged, etag = self._probe(url)
+        except (IOError, requests.RequestException) as e:
+            print(f"❌ 无法连接下载服务器: {e}")
+            return None
+        if total is None:
+            return None
+
+        manifest = self._load_manifest(manifest_path)
+        if (manifest is None or not os.path.exists(part_path) or manifest.get("size") != total
+                or manifest.get("etag") != etag or manifest.get("part_size") != self.part_size):
+            manifest = {"url": url, "size": total, "etag": etag, "part_size": self.part_size, "done": []}
+            with open(part_path, "wb") as f:
+                f.truncate(total)
+            self._save_manifest(manifest_path, manifest)
+        elif manifest["done"]:
+            print(f"⏯️ 断点续传: 已完成 {len(manifest['done'])} 个分片")
+
+        print(f"📥 开始下载: {os.path.basename(dest_path)} ({total / (1024*1024):.2f} MB)")
+        try:
+            if ranged and total > 0:
+                parts = [(i, start, min(start + self.part_size, total) - 1)
+                         for i, start in enumerate(range(0, total, self.part_size))]
+                todo = [p for p in parts if p[0] not in set(manifest["done"])]
+                lock = threading.Lock()
+
+                def run(part):
+                    index, start, end = part
+                    self._fetch_part(url, part_path, start, end)
+                    with lock:
+                        manifest["done"].append(index)
+                        self._save_manifest(manifest_path, manifest)
+                        done_mb = len(manifest["done"]) * self.part_size // (1024*1024)
+                        print(f"   ... {min(done_mb, total // (1024*1024))} MB / {total // (1024*1024)} MB")
+
+                with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                    list(pool.map(run, todo))
+            else:
+                self._fetch_single(url, part_path)
+        except (IOError, requests.RequestException) as e:
+            # 保留 .part 和清单，下次从已完成的分片继续
+            print(f"❌ 下载中断: {e}")
+            return None
+
+        if checksum and checksum.get("value"):
+            actual = file_checksum(part_path, checksum.get("algorithm", "MD5"))
+            if actual.lower() != checksum["value"].lower():
+                print(f"❌ 校验失败: {actual} != {checksum['value']}，已删除坏文件")
+                os.remove(part_path)
+                os.remove(manifest_path)
+                return None
+            print("🔏 校验通过")
+
+        os.replace(part_path, dest_path)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        print(f"✅ 下载完成: {dest_path}")
+        return dest_path
+
+    def download(self, product, dest_path=None):
+        """
+        下载 search_results.json 中的一个产品 ({id, date, checksum?})。
+        默认文件名带上产品 id: 同一天的相邻瓦片并行下载时不会写到同一个 .part / .part.json。
+        """
+        url = product.get("url") or self.url_template.format(id=product["id"])
+        dest_path = dest_path or os.path.join(self.raw_dir, f"SJER_{product['date']}_{product['id']}.zip")
+        return self.fetch(url, dest_path, product.get("checksum"))
+
+    def download_all(self, products):
+        """并行下载多个产品，返回 {product_id: 本地路径或 None}"""
+        with ThreadPoolExecutor(max_workers=self.max_products) as pool:
+            paths = list(pool.map(self.download, products))
+        return {p["id"]: path for p, path in zip(products, paths)}
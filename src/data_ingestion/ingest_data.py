@@ -2,6 +2,9 @@ import os
 import requests
 import zipfile
 
+from src.data_ingestion.download_manager import DownloadManager
+from src.data_ingestion.zip_bands import extract_bands as extract_zip_bands
+
 # 1. 配置参数
 # 这是你之前成功下载的 2024-10-12 数据链接
 DATA_URL = "https://zipper.dataspace.copernicus.eu/v1/Products(1190457d-60a3-4835-80da-33161c699912)/$value"
@@ -25,38 +28,21 @@ def download_data():
     print(f"📥 正在启动全量下载 (约 1.1GB)...")
     # 注意：在实际工程中，这里通常需要 CDSE 的 Access Token
     # 如果链接失效，脚本会报错，届时需更新 Token
-    response = requests.get(DATA_URL, stream=True)
-    if response.status_code == 200:
-        with open(ZIP_PATH, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+    # 多连接分片下载；中断后再次运行会从 .part.json 记录的进度继续
+    if DownloadManager(raw_dir=RAW_DIR).fetch(DATA_URL, ZIP_PATH):
         print(f"✅ ZIP 包已下载至: {ZIP_PATH}")
     else:
-        print(f"❌ 下载失败，状态码: {response.status_code}。请检查 Token 是否过期。")
+        print(f"❌ 下载失败。请检查 Token 是否过期。")
 
 def extract_bands():
-    os.makedirs(IMG_DIR, exist_ok=True)
     print(f"🔓 正在扫描 ZIP 内部结构并提取核心波段...")
 
-    with zipfile.ZipFile(ZIP_PATH, 'r') as zip_ref:
-        all_files = zip_ref.namelist()
-        
-        for band, res_folder in TARGET_BANDS.items():
-            # 搜索匹配特定波段和分辨率路径的文件
-            # 例如搜索包含 'IMG_DATA/R10m/' 和 '_B04_10m.jp2' 的路径
-            match = [f for f in all_files if f"{res_folder}/" in f and f"_{band}_{res_folder[1:]}.jp2" in f]
-            
-            if match:
-                source_path = match[0]
-                # 统一重命名为简单格式：SJER_Bxx_xxm.jp2
-                target_name = f"SJER_{band}_{res_folder[1:]}.jp2"
-                target_path = os.path.join(IMG_DIR, target_name)
-                
-                with zip_ref.open(source_path) as source, open(target_path, 'wb') as target:
-                    target.write(source.read())
-                print(f"✨ 已提取 {band}: {target_name}")
-            else:
-                print(f"⚠️ 未找到波段 {band} 在文件夹 {res_folder} 中。")
+    # 一次遍历目录找到全部目标波段，按 4MB 分块流式写出
+    # 统一重命名为简单格式：SJER_Bxx_xxm.jp2
+    extracted = extract_zip_bands(ZIP_PATH, TARGET_BANDS, IMG_DIR, "SJER_{band}_{res}.jp2")
+    for band, res_folder in TARGET_BANDS.items():
+        if band not in extracted:
+            print(f"⚠️ 未找到波段 {band} 在文件夹 {res_folder} 中。")
 
 if __name__ == "__main__":
     # 执行下载（如果已存在则跳过）
@@ -0,0 +1,140 @@
+import io
+import os
+import re
+import shutil
+import zipfile
+from collections import OrderedDict
+
+# 流式解压时每次拷贝的字节数 (JP2 波段最大约 130MB，不再整块读入内存)
+COPY_CHUNK = 4 * 1024 * 1024
+# 远程读取 ZIP 时每个 Range 请求的块大小与缓存块数
+REMOTE_BLOCK = 8 * 1024 * 1024
+REMOTE_CACHE_BLOCKS = 4
+
+# SAFE 包内的波段路径，例如 .../IMG_DATA/R10m/T11SKA_20241012T183301_B04_10m.jp2
+MEMBER_PATTERN = re.compile(r"(R\d+m)/[^/]*_(B\d{2}|B8A)_(\d+m)\.jp2$")
+
+
+def match_band_members(names, target_bands):
+    """
+    一次遍历 ZIP 目录，找出目标波段对应的成员名。
+    target_bands: {"B04": "R10m", ...}；返回 {"B04": member_name, ...} (找不到的波段不出现)
+    """
+    wanted = {(band, res): band for band, res in target_bands.items()}
+    found = {}
+    for name in names:
+        m = MEMBER_PATTERN.search(name)
+        if not m:
+            continue
+        res_folder, band, res = m.groups()
+        if res_folder[1:] != res:
+            continue
+        key = (band, res_folder)
+        if key in wanted and band not in found:
+            found[band] = name
+    return found
+
+
+def extract_bands(zip_source, target_bands, img_dir, name_template, overwrite=True):
+    """
+    从 ZIP (本地路径或任意可 seek 的文件对象) 中流式提取目标波段。
+    name_template 例如 "SJER_{band}_{res}.jp2"，res 为 "10m"/"20m"。
+    返回 {band: 目标路径}，只包含 ZIP 里确实存在的波段。
+    """
+    os.makedirs(img_dir, exist_ok=True)
+    extracted = {}
+    with zipfile.ZipFile(zip_source, 'r') as zip_ref:
+        members = match_band_members(zip_ref.namelist(), target_bands)
+        for band, member in members.items():
+            res = target_bands[band][1:]
+            target_name = name_template.format(band=band, res=res)
+            target_path = os.path.join(img_dir, target_name)
+            extracted[band] = target_path
+            if os.path.exists(target_path) and not overwrite:
+                print(f"   ⏩ 已存在: {target_name}")
+                continue
+            tmp_path = target_path + ".tmp"
+            with zip_ref.open(member) as source, open(tmp_path, 'wb') as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK)
+            os.replace(tmp_path, target_path)
+            print(f"   ✨ 已提取 {band}: {target_name}")
+    return extracted
+
+
+class HttpRangeFile(io.RawIOBase):
+    """
+    把远程 ZIP 包装成可 seek 的只读文件，所有读取都通过 HTTP Range 请求完成。
+    zipfile 先读取末尾的中央目录，再按偏移读取需要的成员，其余部分完全不会下载。
+    get: (url, headers) -> requests.Response，可以传入 DownloadManager._get 以复用连接池和认证。
+    """
+
+    def __init__(self, url, get, block_size=REMOTE_BLOCK, cache_blocks=REMOTE_CACHE_BLOCKS):
+        super().__init__()
+        self.url = url
+        self._get = get
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self._blocks = OrderedDict()
+        self._pos = 0
+        self.bytes_fetched = 0
+        with self._get(url, {"Range": "bytes=0-0"}) as r:
+            if r.status_code != 206 or "/" not in r.headers.get("Content-Range", ""):
+                raise IOError(f"服务器不支持 Range 请求 (HTTP {r.status_code})")
+            self.size = int(r.headers["Content-Range"].rsplit("/", 1)[1])
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def _block(self, index):
+        if index in self._blocks:
+            self._blocks.move_to_end(index)
+            return self._blocks[index]
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        with self._get(self.url, {"Range": f"bytes={start}-{end}"}) as r:
+            if r.status_code != 206:
+                raise IOError(f"Range 请求失败 (HTTP {r.status_code})")
+            data = r.content
+        self.bytes_fetched += len(data)
+        self._blocks[index] = data
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return data
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(view) and self._pos < self.size:
+            index, offset = divmod(self._pos, self.block_size)
+            data = self._block(index)
+            n = min(len(data) - offset, len(view) - written)
+            view[written:written + n] = data[offset:offset + n]
+            written += n
+            self._pos += n
+        return written
+
+
+def extract_remote_bands(url, get, target_bands, img_dir, name_template, overwrite=True):
+    """直接从远程 ZIP 中按需读取目标波段，不下载整个 SAFE 产品"""
+    with HttpRangeFile(url, get) as remote:
+        extracted = extract_bands(remote, target_bands, img_dir, name_template, overwrite)
+        share = remote.bytes_fetched / remote.size * 100 if remote.size else 0.0
+        print(f"📡 远程提取完成: 实际下载 {remote.bytes_fetched / (1024*1024):.1f} MB "
+              f"/ {remote.size / (1024*1024):.1f} MB ({share:.1f}%)")
+    return extracted
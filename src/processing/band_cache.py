@@ -0,0 +1,102 @@
+import hashlib
+import os
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+
+# === 解码波段缓存 ===
+# JP2 解码 + B11 重采样是分析流程里最贵的一步，而同一景影像的结果永远不变。
+# 这里把解码、对齐、归一化 (÷10000) 之后的波段存成 .npy，之后用 mmap 直接映射页面。
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.getenv("PINEGUARD_BAND_CACHE_DIR", os.path.join(BASE_DIR, "data", "cache", "bands"))
+# 缓存总大小上限 (MB)，超过后按最近使用时间淘汰。每个 10980x10980 波段约 480 MB
+CACHE_MAX_MB = float(os.getenv("PINEGUARD_BAND_CACHE_MB", "4096"))
+# 默认关闭: 第一次写缓存要解码整景影像，对只读一个窗口的分析反而更慢。
+# 反复分析同一景影像时设置 PINEGUARD_BAND_CACHE=1 开启
+ENABLED = os.getenv("PINEGUARD_BAND_CACHE", "0") == "1"
+
+
+def needs_scaling(data, dtype):
+    """判断是否需要把 DN 值归一化到 0-1 反射率"""
+    # 整型波段 (L2A 的 uint16) 一律按 DN 处理，这样窗口读取和整幅读取的判断一致
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        return True
+    return bool(data.size) and np.nanmax(data) > 1.0
+
+
+def cache_key(path, target_shape=None, resampling="bilinear"):
+    """缓存键: 源文件绝对路径 + mtime + 大小 + 目标形状 + 重采样方式"""
+    st = os.stat(path)
+    shape = "native" if target_shape is None else f"{target_shape[0]}x{target_shape[1]}"
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{shape}|{resampling}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _decode(path, target_shape, resampling):
+    """真正的解码 + 对齐 + 归一化"""
+    with rasterio.open(path) as src:
+        if target_shape is not None and (src.height, src.width) != tuple(target_shape):
+            data = src.read(1, out_shape=tuple(target_shape),
+                            resampling=getattr(Resampling, resampling)).astype('float32')
+        else:
+            data = src.read(1).astype('float32')
+        if needs_scaling(data, src.dtypes[0]):
+            data /= 10000.0
+        return data
+
+
+def evict(cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB, suffix=".npy"):
+    """按 LRU (文件 mtime 即最近访问时间) 淘汰，直到总大小不超过上限"""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(suffix):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(e[1] for e in entries)
+    limit = max_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def load_band(path, target_shape=None, resampling="bilinear", cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB):
+    """
+    返回对齐到 target_shape、已归一化的 float32 波段 (只读 memmap)。
+    命中缓存时不做任何解码；找不到源文件时返回 None。
+    """
+    if not os.path.exists(path):
+        print(f"❌ 警告: 找不到文件 {path}")
+        return None
+    if not ENABLED:
+        return _decode(path, target_shape, resampling)
+
+    cache_path = os.path.join(cache_dir, cache_key(path, target_shape, resampling) + ".npy")
+    if os.path.exists(cache_path):
+        os.utime(cache_path)  # 记录最近使用时间
+        return np.load(cache_path, mmap_mode='r')
+
+    data = _decode(path, target_shape, resampling)
+    os.makedirs(cache_dir, exist_ok=True)
+    # 先写临时文件再原子替换，多个进程同时写也不会读到半截文件
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp_path, cache_path)
+    print(f"💾 已缓存解码波段: {os.path.basename(path)}")
+    # 先映射再淘汰: 即使上限小于单个文件，已打开的映射依然有效
+    band = np.load(cache_path, mmap_mode='r')
+    evict(cache_dir, max_mb)
+    return band
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """清空全部缓存"""
+    evict(cache_dir, max_mb=0)
@@ -0,0 +1,240 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+# === 多年份列式点存储 ===
+# 所有年份的风险点放在同一个目录里，每列一个 .npy (可 mmap)，按 年份 -> 空间 (Z-order) 排序。
+# 每个年份切成若干行组，manifest.json 记录每组的行范围和 min/max 统计，读取时按年份/范围直接切片，
+# 不再解析 JSON。data/processed/stress_{year}.json 仍然作为兼容导出保留。
+DATA_DIR = "data/processed"
+STORE_DIR = os.path.join(DATA_DIR, "points")
+MANIFEST = "manifest.json"
+COLUMNS = {"year": np.int16, "latitude": np.float64, "longitude": np.float64, "stress_score": np.float64}
+GROUP_ROWS = 65536
+# 并发写入时替换目录的最多重试次数
+SWAP_ATTEMPTS = 16
+JSON_PATTERN = re.compile(r"^stress_(\d{4})\.json$")
+
+
+def _spread_bits(v):
+    """把 16 位整数的各位隔位展开 (Morton 编码用)"""
+    v = v.astype(np.uint32)
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def morton_codes(lat, lon, bounds):
+    """在 bounds=(min_lat, min_lon, max_lat, max_lon) 内量化到 16 位后交错，邻近的点编码也相近"""
+    min_lat, min_lon, max_lat, max_lon = bounds
+    qy = np.clip((lat - min_lat) / max(max_lat - min_lat, 1e-12) * 65535, 0, 65535).astype(np.uint32)
+    qx = np.clip((lon - min_lon) / max(max_lon - min_lon, 1e-12) * 65535, 0, 65535).astype(np.uint32)
+    return (_spread_bits(qy) << 1) | _spread_bits(qx)
+
+
+def json_sources(data_dir=DATA_DIR):
+    """兼容 JSON 文件的签名 {文件名: [mtime_ns, size]}，用来判断列式存储是否过期"""
+    sources = {}
+    if os.path.isdir(data_dir):
+        for entry in os.scandir(data_dir):
+            if JSON_PATTERN.match(entry.name):
+                st = entry.stat()
+                sources[entry.name] = [st.st_mtime_ns, st.st_size]
+    return sources
+
+
+def _write_manifest(store_dir, manifest):
+    tmp_path = os.path.join(store_dir, MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST))
+
+
+def write_store(year, latitude, longitude, stress_score, store_dir=STORE_DIR, counts=None, sources=None):
+    """
+    写出列式存储 (先写临时目录再整体替换，读者不会看到写了一半的数据)。
+    counts: {year: outbreak_count}，缺省为该年份的点数。
+    """
+    year = np.asarray(year, dtype=COLUMNS["year"])
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    stress_score = np.asarray(stress_score, dtype=np.float64)
+
+    bounds = ((float(latitude.min()), float(longitude.min()), float(latitude.max()), float(longitude.max()))
+              if len(latitude) else (0.0, 0.0, 0.0, 0.0))
+    order = np.lexsort((morton_codes(latitude, longitude, bounds), year))
+    columns = {"year": year[order], "latitude": latitude[order],
+               "longitude": longitude[order], "stress_score": stress_score[order]}
+
+    years, groups = {}, []
+    uniq, starts = np.unique(columns["year"], return_index=True)
+    stops = np.append(starts[1:], len(order))
+    for y, y_start, y_stop in zip(uniq.tolist(), starts.tolist(), stops.tolist()):
+        years[str(y)] = {"start": y_start, "stop": y_stop,
+                         "outbreak_count": int((counts or {}).get(y, y_stop - y_start))}
+        for g_start in range(y_start, y_stop, GROUP_ROWS):
+            g_stop = min(g_start + GROUP_ROWS, y_stop)
+            lat, lon = columns["latitude"][g_start:g_stop], columns["longitude"][g_start:g_stop]
+            score = columns["stress_score"][g_start:g_stop]
+            groups.append({"year": y, "start": g_start, "stop": g_stop,
+                           "min_lat": float(lat.min()), "max_lat": float(lat.max()),
+                           "min_lon": float(lon.min()), "max_lon": float(lon.max()),
+                           "min_score": float(score.min()), "max_score": float(score.max())})
+    # 没有点但有计数的年份也要记录
+    for y, count in (counts or {}).items():
+        years.setdefault(str(y), {"start": 0, "stop": 0, "outbreak_count": int(count)})
+
+    # 每个写入者使用自己唯一的临时目录和 old 目录，并发重建同一存储时不会删掉对方写了一半的文件
+    parent, name = os.path.split(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f"{name}.tmp-", dir=parent)
+    try:
+        os.chmod(tmp_dir, 0o755)        # mkdtemp 默认 0700
+        for col, values in columns.items():
+            np.save(os.path.join(tmp_dir, f"{col}.npy"), values)
+        _write_manifest(tmp_dir, {"rows": int(len(order)), "years": years, "groups": groups,
+                                  "sources": sources or {}})
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    old_dir = tempfile.mkdtemp(prefix=f"{name}.old-", dir=parent)
+    try:
+        for attempt in range(SWAP_ATTEMPTS):
+            try:
+                os.replace(store_dir, os.path.join(old_dir, str(attempt)))
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(tmp_dir, store_dir)
+                break
+            except OSError:
+                # 另一个写入者在两次 replace 之间放入了它的目录: 再移走一次后重试 (最后完成的写入生效)
+                if attempt == SWAP_ATTEMPTS - 1:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+    finally:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return store_dir
+
+
+class PointStore:
+    """只读打开列式存储；各列都是 mmap，按年份切片不会拷贝数据"""
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        manifest_path = os.path.join(store_dir, MANIFEST)
+        st = os.stat(manifest_path)
+        self.signature = (st.st_mtime_ns, st.st_size)
+        with open(manifest_path, "r") as f:
+            self.manifest = json.load(f)
+        self.years = {int(y): meta for y, meta in self.manifest["years"].items()}
+        self.groups = self.manifest["groups"]
+        for name in COLUMNS:
+            path = os.path.join(store_dir, f"{name}.npy")
+            # np.load 对空数组不能 mmap
+            setattr(self, name, np.load(path, mmap_mode="r") if self.manifest["rows"] else np.load(path))
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    @property
+    def mtime(self):
+        return self.signature[0] / 1e9
+
+    def year_slice(self, year):
+        meta = self.years.get(int(year))
+        return slice(meta["start"], meta["stop"]) if meta else slice(0, 0)
+
+    def outbreak_count(self, year):
+        meta = self.years.get(int(year))
+        return meta["outbreak_count"] if meta else 0
+
+    def year_columns(self, year):
+        """某一年的 {列名: 数组视图}"""
+        s = self.year_slice(year)
+        return {name: getattr(self, name)[s] for name in COLUMNS}
+
+    def group_slices(self, min_lat=-90.0, min_lon=-180.0, max_lat=90.0, max_lon=180.0,
+                     start_year=None, end_year=None):
+        """按行组的 min/max 统计跳过不可能命中的组，返回候选行范围"""
+        out = []
+        for g in self.groups:
+            if start_year is not None and g["year"] < start_year:
+                continue
+            if end_year is not None and g["year"] > end_year:
+                continue
+            if g["max_lat"] < min_lat or g["min_lat"] > max_lat or g["max_lon"] < min_lon or g["min_lon"] > max_lon:
+                continue
+            out.append(slice(g["start"], g["stop"]))
+        return out
+
+    def mark_sources(self, data_dir=DATA_DIR):
+        """兼容 JSON 重新导出后，记录它们的签名，避免被误判为需要重建"""
+        self.manifest["sources"] = json_sources(data_dir)
+        _write_manifest(self.store_dir, self.manifest)
+        st = os.stat(os.path.join(self.store_dir, MANIFEST))
+        self.signature = (st.st_mtime_ns, st.st_size)
+
+
+def build_from_json(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """从 stress_{year}.json 一次性构建列式存储"""
+    sources = json_sources(data_dir)
+    years, lats, lons, scores, counts = [], [], [], [], {}
+    for name in sorted(sources):
+        year = int(JSON_PATTERN.match(name).group(1))
+        with open(os.path.join(data_dir, name), "r") as f:
+            doc = json.load(f)
+        locations = doc.get("locations", [])
+        counts[year] = doc.get("outbreak_count", len(locations))
+        years.append(np.full(len(locations), year, dtype=COLUMNS["year"]))
+        lats.append(np.array([l["latitude"] for l in locations], dtype=np.float64))
+        lons.append(np.array([l["longitude"] for l in locations], dtype=np.float64))
+        scores.append(np.array([l["stress_score"] for l in locations], dtype=np.float64))
+    print(f"🗄️ 从 {len(sources)} 个 JSON 文件构建列式存储: {store_dir}")
+    return write_store(np.concatenate(years or [[]]), np.concatenate(lats or [[]]),
+                       np.concatenate(lons or [[]]), np.concatenate(scores or [[]]),
+                       store_dir, counts=counts, sources=sources)
+
+
+def is_stale(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """存储不存在，或兼容 JSON 在存储之外被改动过"""
+    manifest_path = os.path.join(store_dir, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return True
+    sources = json_sources(data_dir)
+    if not sources:
+        return False
+    with open(manifest_path, "r") as f:
+        return json.load(f).get("sources") != sources
+
+
+def open_store(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """打开列式存储；缺失或过期时先从 JSON 重建。没有任何数据时返回 None"""
+    if is_stale(data_dir, store_dir):
+        if not json_sources(data_dir):
+            return None
+        build_from_json(data_dir, store_dir)
+    return PointStore(store_dir)
+
+
+def export_json(store, data_dir=DATA_DIR, years=None):
+    """导出与旧版格式一致的 stress_{year}.json (兼容旧的读取方)"""
+    os.makedirs(data_dir, exist_ok=True)
+    for year in sorted(store.years) if years is None else years:
+        cols = store.year_columns(year)
+        result = {
+            "year": str(year),
+            "outbreak_count": store.outbreak_count(year),
+            "locations": [{"latitude": float(a), "longitude": float(o), "stress_score": float(s)}
+                          for a, o, s in zip(cols["latitude"], cols["longitude"], cols["stress_score"])],
+        }
+        with open(os.path.join(data_dir, f"stress_{year}.json"), "w") as f:
+            json.dump(result, f, indent=4)
+    store.mark_sources(data_dir)
@@ -1,5 +1,7 @@
 import rasterio
+import rasterio.shutil
 from rasterio.enums import Resampling
+from rasterio.windows import Window
 import numpy as np
 import os
 import matplotlib.pyplot as plt
@@ -13,46 +15,134 @@ B04_PATH = os.path.join(DATA_DIR, "SJER_B04_10m.jp2")  # Red
 B08_PATH = os.path.join(DATA_DIR, "SJER_B08_10m.jp2")  # NIR
 B11_PATH = os.path.join(DATA_DIR, "SJER_B11_20m.jp2")  # SWIR
 
-def load_and_align_band(target_meta, file_path):
-    """重采样并对齐波段"""
-    with rasterio.open(file_path) as src:
-        data = src.read(
-            out_shape=(target_meta['count'], target_meta['height'], target_meta['width']),
-            resampling=Resampling.bilinear
-        )
-        return data[0].astype('float32') / 10000.0
+# 输出格式
+# "cog":     分块 + DEFLATE 压缩 + 金字塔的 Cloud-Optimized GeoTIFF，int16 缩放编码 (value * 10000)
+# "float32": 旧版的整幅 float32 GeoTIFF
+OUTPUT_MODE = "cog"
+INDEX_SCALE = 10000.0
+INDEX_NODATA = -32768
+COG_BLOCK = 512
+COG_OVERVIEWS = [2, 4, 8, 16, 32]
+STRIP_ROWS = 1024  # 每次计算的行数 (COG_BLOCK 的整数倍)
+PREVIEW_MAX = 2048  # 可视化时读取的最大边长 (走金字塔，不读全幅)
 
-def process_eco_indices():
+def read_aligned_window(src, window, target_shape):
+    """读取目标网格上的一个窗口；分辨率不同的波段按浮点窗口双线性重采样"""
+    out_shape = (int(window.height), int(window.width))
+    if (src.height, src.width) == tuple(target_shape):
+        data = src.read(1, window=window)
+    else:
+        scale_y = src.height / target_shape[0]
+        scale_x = src.width / target_shape[1]
+        src_window = Window(window.col_off * scale_x, window.row_off * scale_y,
+                            window.width * scale_x, window.height * scale_y)
+        data = src.read(1, window=src_window, out_shape=out_shape, resampling=Resampling.bilinear)
+    data = data.astype('float32')
+    data /= 10000.0
+    return data
+
+def normalized_difference(a, b, out=None):
+    """(a - b) / (a + b)，复用缓冲区原地计算，避免整幅临时数组"""
+    den = np.add(a, b)
+    out = np.subtract(a, b, out=out)
+    np.divide(out, den, out=out)
+    return out
+
+def encode_index(values):
+    """float 指数 -> int16 缩放编码，无效值写成 nodata (原地修改 values)"""
+    invalid = ~np.isfinite(values)
+    np.clip(values, -1.0, 1.0, out=values)
+    np.multiply(values, INDEX_SCALE, out=values)
+    np.rint(values, out=values)
+    values[invalid] = INDEX_NODATA
+    return values.astype(np.int16)
+
+def _output_profile(meta_10m, output_mode):
+    profile = meta_10m.copy()
+    profile.update(count=1, driver='GTiff')
+    if output_mode == "cog":
+        profile.update(dtype=rasterio.int16, nodata=INDEX_NODATA, tiled=True,
+                       blockxsize=COG_BLOCK, blockysize=COG_BLOCK,
+                       compress='deflate', predictor=2, BIGTIFF='IF_SAFER')
+    else:
+        profile.update(dtype=rasterio.float32)
+    return profile
+
+def _finalize_cog(tmp_path, out_path):
+    """生成金字塔并重排成 COG 布局 (金字塔在前，便于按窗口/缩放级别远程读取)"""
+    with rasterio.open(tmp_path, 'r+') as dst:
+        dst.build_overviews(COG_OVERVIEWS, Resampling.average)
+        dst.update_tags(ns='rio_overview', resampling='average')
+    rasterio.shutil.copy(tmp_path, out_path, driver='GTiff', tiled=True,
+                         blockxsize=COG_BLOCK, blockysize=COG_BLOCK,
+                         compress='deflate', predictor=2, copy_src_overviews=True)
+    rasterio.shutil.delete(tmp_path)
+
+def read_preview(path):
+    """按金字塔读取缩略图用于出图，返回 float32 指数 (nodata 为 NaN)"""
+    with rasterio.open(path) as src:
+        factor = max(1, int(np.ceil(max(src.height, src.width) / PREVIEW_MAX)))
+        data = src.read(1, out_shape=(src.height // factor, src.width // factor),
+                        resampling=Resampling.average, masked=True)
+        data = data.astype('float32').filled(np.nan)
+        if src.dtypes[0] == 'int16':
+            data /= INDEX_SCALE
+        return data
+
+def process_eco_indices(output_mode=OUTPUT_MODE):
     print("🧪 启动 PineGuard 多维特征提取器 (优化显示版)...")
 
-    with rasterio.open(B04_PATH) as b04_src:
+    ndvi_path = os.path.join(OUTPUT_DIR, "SJER_NDVI.tif")
+    ndwi_path = os.path.join(OUTPUT_DIR, "SJER_NDWI.tif")
+    # COG 先写普通分块 GeoTIFF，建好金字塔后再拷贝成最终布局
+    tmp_suffix = ".tmp.tif" if output_mode == "cog" else ""
+
+    with rasterio.open(B04_PATH) as b04_src, rasterio.open(B08_PATH) as b08_src, \
+            rasterio.open(B11_PATH) as b11_src:
         meta_10m = b04_src.meta.copy()
-        red = b04_src.read(1).astype('float32') / 10000.0
-        nir = load_and_align_band(meta_10m, B08_PATH)
-        swir = load_and_align_band(meta_10m, B11_PATH)
-
-    # 2. 核心指数计算
-    print("🧮 计算物理指标...")
-    np.seterr(divide='ignore', invalid='ignore')
-    
-    # NDVI = (NIR - Red) / (NIR + Red)
-    ndvi = (nir - red) / (nir + red)
-    # NDWI = (NIR - SWIR) / (NIR + SWIR)
-    ndwi = (nir - swir) / (nir + swir)
-
-    # 清理无效值
-    ndvi = np.nan_to_num(ndvi, nan=0.0)
-    ndwi = np.nan_to_num(ndwi, nan=0.0)
+        shape = (b04_src.height, b04_src.width)
+        profile = _output_profile(meta_10m, output_mode)
+
+        # 2. 核心指数计算 (按条带分块，原地计算)
+        print("🧮 计算物理指标...")
+        with rasterio.open(ndvi_path + tmp_suffix, 'w', **profile) as ndvi_dst, \
+                rasterio.open(ndwi_path + tmp_suffix, 'w', **profile) as ndwi_dst, \
+                np.errstate(divide='ignore', invalid='ignore'):
+            if output_mode == "cog":
+                # 记录缩放系数，GDAL 读取时可自动还原为物理值
+                for dst in (ndvi_dst, ndwi_dst):
+                    dst.scales = (1.0 / INDEX_SCALE,)
+                    dst.offsets = (0.0,)
+
+            for row in range(0, shape[0], STRIP_ROWS):
+                window = Window(0, row, shape[1], min(STRIP_ROWS, shape[0] - row))
+                red = read_aligned_window(b04_src, window, shape)
+                nir = read_aligned_window(b08_src, window, shape)
+                swir = read_aligned_window(b11_src, window, shape)
+
+                # NDVI = (NIR - Red) / (NIR + Red)，结果直接写回 red 的缓冲区
+                ndvi = normalized_difference(nir, red, out=red)
+                # NDWI = (NIR - SWIR) / (NIR + SWIR)，结果写回 swir 的缓冲区
+                ndwi = normalized_difference(nir, swir, out=swir)
+
+                if output_mode == "cog":
+                    ndvi_dst.write(encode_index(ndvi), 1, window=window)
+                    ndwi_dst.write(encode_index(ndwi), 1, window=window)
+                else:
+                    # 清理无效值 (与旧版一致)
+                    ndvi_dst.write(np.nan_to_num(ndvi, nan=0.0, copy=False), 1, window=window)
+                    ndwi_dst.write(np.nan_to_num(ndwi, nan=0.0, copy=False), 1, window=window)
 
     # 3. 保存地理空间矩阵 (用于后续 AI 训练)
-    meta_10m.update(dtype=rasterio.float32, count=1, driver='GTiff')
-    with rasterio.open(os.path.join(OUTPUT_DIR, "SJER_NDVI.tif"), 'w', **meta_10m) as dst:
-        dst.write(ndvi, 1)
-    with rasterio.open(os.path.join(OUTPUT_DIR, "SJER_NDWI.tif"), 'w', **meta_10m) as dst:
-        dst.write(ndwi, 1)
+    if output_mode == "cog":
+        print("🗜️ 生成金字塔并转换为 COG...")
+        _finalize_cog(ndvi_path + tmp_suffix, ndvi_path)
+        _finalize_cog(ndwi_path + tmp_suffix, ndwi_path)
 
     # 4. 优化可视化 (针对 10 月加州干旱季进行拉伸)
     print("🖼️ 生成针对性风险对比图...")
+    ndvi = read_preview(ndvi_path)
+    ndwi = read_preview(ndwi_path)
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 8))
 
     # --- 左图：NDVI (植被活力) ---
@@ -72,4 +162,4 @@ def process_eco_indices():
     print(f"✅ 处理完成！请查看: {vis_path}")
 
 if __name__ == "__main__":
-    process_eco_indices()
\ No newline at end of file
+    process_eco_indices()
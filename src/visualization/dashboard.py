@@ -1,7 +1,9 @@
 import folium
 import pandas as pd
 import os
-import math
+
+from src.analysis import geo
+from src.visualization import layers
 
 # === 配置 ===
 CSV_PATH = "data/outputs/PineGuard_Local_Outbreak.csv"
@@ -12,28 +14,24 @@ CENTER_LAT = 37.11
 CENTER_LON = -119.74
 DEFAULT_RADIUS = 15000  # 默认分析半径 (米)
 
+# 弹窗模板，{score} / {lat} / {lon} 在点击时由前端填入
+POPUP_TEMPLATE = """
+<div style="font-family: Arial; width: 200px;">
+    <h4 style="margin: 0; color: orange;">⚠️ Water Stress Signal</h4>
+    <hr>
+    <b>Stress Score:</b> {score}<br>
+    <b>Status:</b> Needs Inspection<br>
+    <br>
+    <i>Lat: {lat}<br>Lon: {lon}</i>
+</div>
+"""
+
 def get_color(score):
     if score > 0.28:
         return 'red'
     else:
         return 'orange'
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    计算两点间的地球表面距离 (单位: 米)
-    用于自动计算最远的点离中心有多远
-    """
-    R = 6371000  # 地球半径 (米)
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    
-    a = math.sin(dphi / 2)**2 + \
-        math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
-
 def main():
     print("🗺️ 正在生成 [自动适配版] 压力分布图...")
     
@@ -44,12 +42,8 @@ def main():
     df = pd.read_csv(CSV_PATH)
     print(f"📊 加载了 {len(df)} 个受压点。")
 
-    # 1. 计算最大距离，决定圈要画多大
-    max_dist = 0
-    for _, row in df.iterrows():
-        dist = haversine_distance(CENTER_LAT, CENTER_LON, row['Latitude'], row['Longitude'])
-        if dist > max_dist:
-            max_dist = dist
+    # 1. 计算最大距离，决定圈要画多大 (向量化)
+    max_dist, _ = geo.max_extent(df['Latitude'].to_numpy(), df['Longitude'].to_numpy(), CENTER_LAT, CENTER_LON)
             
     print(f"📏 最远的点距离中心: {max_dist:.2f} 米")
     
@@ -88,34 +82,12 @@ def main():
         popup=f'Analysis Boundary (Auto-Fit: {visual_radius/1000:.1f}km)'
     ).add_to(m)
 
-    # 4. 撒点
+    # 4. 撒点 (单个数据驱动图层，点多时自动切换为 Canvas；弹窗点击时才生成)
     outbreak_group = folium.FeatureGroup(name="Stressed Trees")
-    
-    for _, row in df.iterrows():
-        lat = row['Latitude']
-        lon = row['Longitude']
-        score = row['Stress_Score']
-        
-        popup_html = f"""
-        <div style="font-family: Arial; width: 200px;">
-            <h4 style="margin: 0; color: orange;">⚠️ Water Stress Signal</h4>
-            <hr>
-            <b>Stress Score:</b> {score:.4f}<br>
-            <b>Status:</b> Needs Inspection<br>
-            <br>
-            <i>Lat: {lat}<br>Lon: {lon}</i>
-        </div>
-        """
-        
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=8,
-            color=get_color(score),
-            fill=True,
-            fill_color=get_color(score),
-            fill_opacity=0.9,
-            popup=folium.Popup(popup_html, max_width=300)
-        ).add_to(outbreak_group)
+    layers.add_point_layer(
+        outbreak_group, df['Latitude'].to_numpy(), df['Longitude'].to_numpy(), df['Stress_Score'].to_numpy(),
+        color='orange', color_steps=[(0.28, 'red')], radius=8, weight=3, fill_opacity=0.9,
+        popup_template=POPUP_TEMPLATE)
     
     outbreak_group.add_to(m)
     folium.LayerControl().add_to(m)
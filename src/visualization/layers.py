@@ -0,0 +1,164 @@
+import json
+
+import numpy as np
+from branca.element import Template
+from folium.map import Layer
+from folium.raster_layers import ImageOverlay
+from folium.plugins import FastMarkerCluster
+
+# === 大量点位的地图图层 ===
+# 逐点 folium.CircleMarker 会为每个点生成一段 JS (再加一段弹窗 HTML)，HTML 大小随点数线性增长，
+# 几千个点之后浏览器就很吃力。这里把所有点压成一个 [lat, lon, score] 数组，由一段 JS 统一创建图层:
+# - 点数不超过阈值: SVG 圆点 (与原来的 CircleMarker 外观一致)
+# - 超过阈值: 单个 Canvas 图层，或可选的聚合图层 (FastMarkerCluster)
+# 弹窗只在点击时由模板和数据生成，不再为每个点嵌入 HTML。
+MARKER_THRESHOLD = 2000
+MODES = ("auto", "svg", "canvas", "cluster")
+COORD_DECIMALS = 6
+SCORE_DECIMALS = 4
+
+_POPUP_JS = """
+    function(tpl, row) {
+        var values = {lat: row[0].toFixed(6), lon: row[1].toFixed(6), score: row[2].toFixed(4)};
+        return tpl.replace(/\\{(\\w+)\\}/g, function(m, k) { return k in values ? values[k] : m; });
+    }
+"""
+
+_COLOR_JS = """
+    function(base, steps, score) {
+        var c = base;
+        for (var i = 0; i < steps.length; i++) { if (score > steps[i][0]) { c = steps[i][1]; } }
+        return c;
+    }
+"""
+
+
+def pack_points(latitude, longitude, stress_score):
+    """三列 -> 四舍五入后的 [[lat, lon, score], ...]，控制嵌入页面的数据量"""
+    lat = np.round(np.asarray(latitude, dtype=np.float64), COORD_DECIMALS)
+    lon = np.round(np.asarray(longitude, dtype=np.float64), COORD_DECIMALS)
+    score = np.round(np.asarray(stress_score, dtype=np.float64), SCORE_DECIMALS)
+    return np.column_stack([lat, lon, score]).tolist()
+
+
+class PointLayer(Layer):
+    """一个图层画出全部点；renderer 为 "svg" 或 "canvas"，弹窗在点击时按模板生成"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data|tojson }};
+            var tpl = {{ this.popup_template|tojson }};
+            var steps = {{ this.color_steps|tojson }};
+            var popupFor = """ + _POPUP_JS + """;
+            var colorFor = """ + _COLOR_JS + """;
+            var renderer = {{ "L.canvas({padding: 0.5})" if this.renderer == "canvas" else "L.svg()" }};
+            var group = L.featureGroup();
+            for (var i = 0; i < data.length; i++) {
+                var row = data[i];
+                var color = colorFor({{ this.color|tojson }}, steps, row[2]);
+                var marker = L.circleMarker([row[0], row[1]], {
+                    renderer: renderer, radius: {{ this.radius }}, color: color, fillColor: color,
+                    fill: true, fillOpacity: {{ this.fill_opacity }}, weight: {{ this.weight }}
+                });
+                marker._pgRow = row;
+                group.addLayer(marker);
+            }
+            if (tpl) {
+                group.on('click', function(e) {
+                    L.popup({maxWidth: 300}).setLatLng(e.layer.getLatLng())
+                        .setContent(popupFor(tpl, e.layer._pgRow)).openOn(group._map);
+                });
+            }
+            return group;
+        })();
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, data, renderer="canvas", color="#3388ff", color_steps=None, radius=3, weight=1,
+                 fill_opacity=0.2, popup_template=None, name=None, overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "PointLayer"
+        self.data = data
+        self.renderer = renderer
+        self.color = color
+        self.color_steps = [list(s) for s in (color_steps or [])]
+        self.radius = radius
+        self.weight = weight
+        self.fill_opacity = fill_opacity
+        self.popup_template = popup_template
+
+
+def _cluster_callback(color, color_steps, radius, weight, fill_opacity, popup_template):
+    """FastMarkerCluster 的单点回调: 同样的圆点样式和按需生成的弹窗"""
+    return f"""
+        function (row) {{
+            var popupFor = {_POPUP_JS};
+            var colorFor = {_COLOR_JS};
+            var color = colorFor({json.dumps(color)}, {json.dumps(color_steps)}, row[2]);
+            var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {{
+                radius: {radius}, color: color, fillColor: color, fill: true,
+                fillOpacity: {fill_opacity}, weight: {weight}
+            }});
+            var tpl = {json.dumps(popup_template)};
+            if (tpl) {{ marker.bindPopup(function() {{ return popupFor(tpl, row); }}, {{maxWidth: 300}}); }}
+            return marker;
+        }}
+    """
+
+
+def resolve_mode(n_points, mode="auto", threshold=MARKER_THRESHOLD):
+    if mode not in MODES:
+        raise ValueError(f"未知的渲染模式: {mode} (可选 {', '.join(MODES)})")
+    if mode != "auto":
+        return mode
+    return "svg" if n_points <= threshold else "canvas"
+
+
+def add_point_layer(m, latitude, longitude, stress_score, mode="auto", threshold=MARKER_THRESHOLD,
+                    color="#3388ff", color_steps=None, radius=3, weight=1, fill_opacity=0.2,
+                    popup_template=None, name=None):
+    """
+    把一组点加到地图 (或 FeatureGroup) 上，按点数自动选择渲染方式。
+    color_steps: [(score 下限, 颜色), ...]，分数超过下限时使用对应颜色 (升序，后面的覆盖前面的)。
+    popup_template: 例如 "<b>Score:</b> {score}"，可用 {lat} / {lon} / {score}；None 表示不要弹窗。
+    """
+    data = pack_points(latitude, longitude, stress_score)
+    mode = resolve_mode(len(data), mode, threshold)
+    if mode == "cluster":
+        layer = FastMarkerCluster(data, name=name, callback=_cluster_callback(
+            color, [list(s) for s in (color_steps or [])], radius, weight, fill_opacity, popup_template))
+    else:
+        layer = PointLayer(data, renderer=mode, color=color, color_steps=color_steps, radius=radius,
+                           weight=weight, fill_opacity=fill_opacity, popup_template=popup_template, name=name)
+    layer.add_to(m)
+    return layer
+
+
+def colorize(values, gradient, min_opacity=0.3, max_opacity=0.8, floor=0.02):
+    """
+    0-1 的栅格 -> RGBA (uint8)，颜色按 gradient ({位置: '#RRGGBB'}，与 HeatMap 相同) 插值；
+    透明度随数值从 min_opacity 增长到 max_opacity，低于 floor 的单元格完全透明。
+    """
+    stops = sorted(gradient.items())
+    pos = np.array([p for p, _ in stops], dtype=np.float64)
+    rgb = np.array([[int(c.lstrip("#")[i:i + 2], 16) / 255.0 for i in (0, 2, 4)] for _, c in stops])
+    v = np.clip(np.asarray(values, dtype=np.float64), 0.0, 1.0)
+    out = np.empty(v.shape + (4,), dtype=np.float64)
+    for ch in range(3):
+        out[..., ch] = np.interp(v, pos, rgb[:, ch])
+    out[..., 3] = np.where(v >= floor, min_opacity + (max_opacity - min_opacity) * v, 0.0)
+    return (out * 255).round().astype(np.uint8)
+
+
+def add_risk_overlay(m, surface, year, gradient, name="Risk Surface", **kwargs):
+    """把预先算好的密度栅格 (risk_surface.RiskSurface) 的某一年作为图片叠加到地图上"""
+    scale = surface.max_density if surface.max_density > 0 else 1.0
+    image = colorize(surface.grid(year) / scale, gradient, **kwargs)
+    min_lat, min_lon, max_lat, max_lon = surface.bounds
+    # 第 0 行是最南端，所以 origin="lower"
+    layer = ImageOverlay(image, bounds=[[min_lat, min_lon], [max_lat, max_lon]], origin="lower",
+                         mercator_project=True, name=name)
+    layer.add_to(m)
+    return layer
@@ -0,0 +1,58 @@
+import folium
+from folium.plugins import HeatMapWithTime
+
+from src.visualization.layers import pack_points
+
+# === 客户端动画回放 ===
+# 所有年份的热力图帧一次性生成并随页面发送给浏览器，由 Leaflet.TimeDimension 在本地逐帧播放。
+# 播放过程中没有任何服务器往返，帧率与点数和服务器延迟无关。
+FRAME_FPS = 2.5           # 与旧版 0.4 秒/帧一致
+MAX_FPS = 10
+HEAT_RADIUS = 18
+MAX_OPACITY = 0.8
+MIN_OPACITY = 0.3
+
+
+def build_frames(year_columns):
+    """
+    year_columns: [(year, {"latitude", "longitude", "stress_score"} 列数组)]。
+    返回 (帧标签, 每帧的 [[lat, lon, weight], ...])。
+    """
+    labels = [str(year) for year, _ in year_columns]
+    frames = [pack_points(cols["latitude"], cols["longitude"], cols["stress_score"]) for _, cols in year_columns]
+    return labels, frames
+
+
+def playback_map(labels, frames, center, tiles, gradient, attr='PineGuard GIS', zoom_start=10,
+                 auto_play=True, fps=FRAME_FPS):
+    """带时间轴控件的热力图回放地图"""
+    m = folium.Map(location=center, zoom_start=zoom_start, tiles=tiles, attr=attr)
+    heat = HeatMapWithTime(
+        frames,
+        index=labels,
+        auto_play=auto_play,
+        display_index=True,
+        radius=HEAT_RADIUS,
+        gradient=gradient,
+        min_opacity=MIN_OPACITY,
+        max_opacity=MAX_OPACITY,
+        use_local_extrema=False,
+        speed_step=0.5,
+        min_speed=0.5,
+        max_speed=MAX_FPS,
+        position='bottomleft',
+    ).add_to(m)
+    # 插件默认 1 fps，这里改成与旧版播放速度一致
+    control = heat._control_name
+    m.get_root().script.add_child(folium.Element(
+        f"document.addEventListener('DOMContentLoaded', function() {{"
+        f" if (typeof {control} !== 'undefined' && {control}._player) {{"
+        f" {control}._player.setTransitionTime({int(1000 / fps)});"
+        f" if ({control}._sliderSpeed) {{ {control}._sliderSpeed.setValue({fps}); }}"
+        f" }} }});"))
+    return m
+
+
+def render_html(m):
+    """整页 HTML (只需生成一次，之后可以直接嵌入页面)"""
+    return m.get_root().render()
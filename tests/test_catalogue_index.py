@@ -0,0 +1,150 @@
+import json
+import re
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pytest
+import requests
+
+from src.data_ingestion.catalogue_index import PUBLICATION_LATENCY_DAYS, CatalogueIndex, fetch_window
+
+AOI = "POINT(-119.74 37.11)"
+
+
+def test_past_window_is_fully_covered(tmp_path):
+    index = CatalogueIndex(str(tmp_path / "index.sqlite"))
+    index.record(AOI, "2024-05-01", "2024-12-01", 5.0, [], today=date(2025, 1, 1))
+    assert index.missing_ranges(AOI, "2024-05-01", "2024-12-01", 5.0) == []
+    index.close()
+
+
+def test_window_ending_in_future_is_only_covered_up_to_latency(tmp_path):
+    index = CatalogueIndex(str(tmp_path / "index.sqlite"))
+    today = date(2025, 6, 10)
+    index.record(AOI, "2025-05-01", "2025-12-01", 5.0, [], today=today)
+    cutoff = date(2025, 6, 10 - PUBLICATION_LATENCY_DAYS).isoformat()
+    # 未发布的日期下次搜索时仍然要联网查询
+    assert index.missing_ranges(AOI, "2025-05-01", "2025-12-01", 5.0) == [(cutoff, "2025-12-01")]
+    index.close()
+
+
+def test_window_entirely_in_future_records_no_coverage(tmp_path):
+    index = CatalogueIndex(str(tmp_path / "index.sqlite"))
+    index.record(AOI, "2025-07-01", "2025-08-01", 5.0, [], today=date(2025, 6, 10))
+    assert index.missing_ranges(AOI, "2025-07-01", "2025-08-01", 5.0) == [("2025-07-01", "2025-08-01")]
+    index.close()
+
+
+# === 本地替身 OData 目录服务 ===
+AOI_B = "POINT(-119.60 37.20)"
+STUB_PAGE = 2
+FILTER_PATTERN = re.compile(r"SRID=4326;(?P<aoi>[^']+)'.*ContentDate/Start ge (?P<start>[\d-]+)T"
+                            r".*ContentDate/Start lt (?P<end>[\d-]+)T")
+
+
+def _stub_products():
+    """每个 AOI 在 2023-05-01 起每 10 天一景"""
+    products = []
+    for aoi in (AOI, AOI_B):
+        for i in range(20):
+            day = (date(2023, 5, 1) + timedelta(days=10 * i)).isoformat()
+            products.append({"aoi": aoi, "record": {
+                "Id": f"{aoi[6:13]}-{day}", "ContentDate": {"Start": f"{day}T18:49:21.024Z"},
+                "Attributes": [{"Name": "cloudCover", "Value": 1.5}], "ContentLength": 1024,
+                "Checksum": [{"Algorithm": "MD5", "Value": "0" * 32}]}})
+    return products
+
+
+class StubCatalogue(ThreadingHTTPServer):
+    """按 $filter 中的 AOI 与日期返回产品，每页 STUB_PAGE 条并给出 @odata.nextLink；记录每个请求"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _CatalogueHandler)
+        self.products = _stub_products()
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/odata/v1/Products"
+
+
+class _CatalogueHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        m = FILTER_PATTERN.search(query["$filter"][0])
+        aoi, start, end = m.group("aoi"), m.group("start"), m.group("end")
+        skip = int(query.get("$skip", ["0"])[0])
+        with self.server.lock:
+            self.server.requests.append((aoi, start, end, skip))
+        matches = [p["record"] for p in self.server.products
+                   if p["aoi"] == aoi and start <= p["record"]["ContentDate"]["Start"][:10] < end]
+        body = {"value": matches[skip:skip + STUB_PAGE]}
+        if skip + STUB_PAGE < len(matches):
+            next_query = {k: v[0] for k, v in query.items()}
+            next_query["$skip"] = skip + STUB_PAGE
+            body["@odata.nextLink"] = f"{self.server.url}?{urlencode(next_query)}"
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def catalogue():
+    srv = StubCatalogue()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _search(index, catalogue, aois, windows):
+    return index.search_many(aois, windows, base_url=catalogue.url, workers=4, session=requests.Session())
+
+
+def test_fetch_window_follows_next_link(catalogue):
+    products = fetch_window(requests.Session(), AOI, "2023-05-01", "2023-07-01", 5.0, base_url=catalogue.url)
+    # 2023-05-01 .. 2023-06-30 共 7 景，每页 2 条 -> 4 页
+    assert [p["date"] for p in products] == [(date(2023, 5, 1) + timedelta(days=10 * i)).isoformat()
+                                             for i in range(7)]
+    assert [r[3] for r in catalogue.requests] == [0, 2, 4, 6]
+    assert products[0]["checksum"] == {"algorithm": "MD5", "value": "0" * 32}
+
+
+def test_search_many_fans_out_over_aois_and_windows(tmp_path, catalogue):
+    index = CatalogueIndex(str(tmp_path / "index.sqlite"))
+    windows = [("2023-05-01", "2023-06-01"), ("2023-08-01", "2023-09-01")]
+    results = _search(index, catalogue, [AOI, AOI_B], windows)
+    first_pages = {r[:3] for r in catalogue.requests if r[3] == 0}
+    assert first_pages == {(aoi, s, e) for aoi in (AOI, AOI_B) for s, e in windows}
+    assert set(results) == {(aoi, s, e) for aoi in (AOI, AOI_B) for s, e in windows}
+    for (aoi, s, e), products in results.items():
+        assert products and all(s <= p["date"] < e and p["id"].startswith(aoi[6:13]) for p in products)
+    index.close()
+
+
+def test_repeated_and_overlapping_searches_only_fetch_missing_ranges(tmp_path, catalogue):
+    index = CatalogueIndex(str(tmp_path / "index.sqlite"))
+    first = _search(index, catalogue, [AOI], [("2023-05-01", "2023-07-01")])
+    sent = len(catalogue.requests)
+
+    # 完全相同的搜索由本地索引回答
+    assert _search(index, catalogue, [AOI], [("2023-05-01", "2023-07-01")]) == first
+    assert len(catalogue.requests) == sent
+
+    # 重叠的更大窗口只查询两端缺失的区间
+    wider = _search(index, catalogue, [AOI], [("2023-04-01", "2023-08-01")])[(AOI, "2023-04-01", "2023-08-01")]
+    assert {r[:3] for r in catalogue.requests[sent:] if r[3] == 0} == {
+        (AOI, "2023-04-01", "2023-05-01"), (AOI, "2023-07-01", "2023-08-01")}
+    assert [p["date"] for p in wider] == [(date(2023, 5, 1) + timedelta(days=10 * i)).isoformat()
+                                          for i in range(10)]
+    index.close()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.data_ingestion.download_manager import DownloadManager
+
+PAYLOAD = bytes(range(256)) * 40          # 10240 字节
+PART_SIZE = 1024
+ETAG = '"stand-in-v1"'
+
+
+class StandInServer(ThreadingHTTPServer):
+    """本地替身下载服务器: 支持 (或不支持) Range，记录收到的每个 Range 头"""
+
+    def __init__(self, ranged=True):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.ranged = ranged
+        self.ranges = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/product.zip"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        header = self.headers.get("Range")
+        with self.server.lock:
+            self.server.ranges.append(header)
+        if self.server.ranged and header:
+            start, end = (int(v) for v in header.split("=", 1)[1].split("-"))
+            end = min(end, len(PAYLOAD) - 1)
+            body = PAYLOAD[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(request):
+    srv = StandInServer(ranged=getattr(request, "param", True))
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _manager(tmp_path):
+    return DownloadManager(raw_dir=str(tmp_path), connections=4, max_products=1, part_size=PART_SIZE)
+
+
+def _md5(data):
+    return {"algorithm": "MD5", "value": hashlib.md5(data).hexdigest()}
+
+
+def test_multi_part_download(server, tmp_path):
+    dest = tmp_path / "product.zip"
+    assert _manager(tmp_path).fetch(server.url, str(dest), _md5(PAYLOAD)) == str(dest)
+    assert dest.read_bytes() == PAYLOAD
+    assert not os.path.exists(str(dest) + ".part.json")
+    # 一次探测 + 每个分片一个 Range 请求
+    part_ranges = [r for r in server.ranges if r != "bytes=0-0"]
+    assert len(part_ranges) == len(PAYLOAD) // PART_SIZE
+
+
+def test_resume_from_partial_manifest(server, tmp_path):
+    dest = tmp_path / "product.zip"
+    part_path = str(dest) + ".part"
+    done = [0, 1, 2, 5]
+    data = bytearray(len(PAYLOAD))
+    for i in done:
+        data[i * PART_SIZE:(i + 1) * PART_SIZE] = PAYLOAD[i * PART_SIZE:(i + 1) * PART_SIZE]
+    with open(part_path, "wb") as f:
+        f.write(data)
+    with open(part_path + ".json", "w") as f:
+        json.dump({"url": server.url, "size": len(PAYLOAD), "etag": ETAG, "part_size": PART_SIZE, "done": done}, f)
+
+    assert _manager(tmp_path).fetch(server.url, str(dest), _md5(PAYLOAD)) == str(dest)
+    assert dest.read_bytes() == PAYLOAD
+    fetched = {int(r.split("=")[1].split("-")[0]) // PART_SIZE for r in server.ranges if r != "bytes=0-0"}
+    assert fetched == set(range(len(PAYLOAD) // PART_SIZE)) - set(done)
+
+
+def test_md5_mismatch_discards_download(server, tmp_path):
+    dest = tmp_path / "product.zip"
+    assert _manager(tmp_path).fetch(server.url, str(dest), _md5(b"something else")) is None
+    assert not dest.exists()
+    assert not os.path.exists(str(dest) + ".part")
+    assert not os.path.exists(str(dest) + ".part.json")
+
+
+@pytest.mark.parametrize("server", [False], indirect=True)
+def test_server_without_range_support(server, tmp_path):
+    dest = tmp_path / "product.zip"
+    assert _manager(tmp_path).fetch(server.url, str(dest), _md5(PAYLOAD)) == str(dest)
+    assert dest.read_bytes() == PAYLOAD
+    # 探测请求之后只有一次不带 Range 的整体下载
+    assert server.ranges == ["bytes=0-0", None]
+
+
+def test_products_on_same_date_use_distinct_files(server, tmp_path):
+    products = [{"id": "tile-a", "date": "2024-05-10", "url": server.url, "checksum": _md5(PAYLOAD)},
+                {"id": "tile-b", "date": "2024-05-10", "url": server.url, "checksum": _md5(PAYLOAD)}]
+    manager = DownloadManager(raw_dir=str(tmp_path), connections=2, max_products=2, part_size=PART_SIZE)
+    paths = manager.download_all(products)
+    assert paths["tile-a"] != paths["tile-b"]
+    assert all(open(p, "rb").read() == PAYLOAD for p in paths.values())
+
+
+def test_unreachable_server_returns_none(tmp_path):
+    manager = DownloadManager(raw_dir=str(tmp_path), session=requests.Session())
+    assert manager.fetch("http://127.0.0.1:9/product.zip", str(tmp_path / "x.zip")) is None